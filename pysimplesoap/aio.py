@@ -0,0 +1,296 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Pythonic simple SOAP Client for asyncio (python 3.5+ only)"""
+
+
+import asyncio
+import logging
+import ssl
+import time
+import weakref
+from urllib.parse import urlsplit
+from urllib.error import HTTPError
+from io import BytesIO
+
+from . import __author__, __copyright__, __license__, __version__, TIMEOUT
+from .client import SoapClient
+
+log = logging.getLogger(__name__)
+
+
+class AsyncConnection(object):
+    """HTTP/1.1 connection (asyncio streams)"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def is_alive(self):
+        "Health check: not closed (by the peer)"
+        return not (self.writer.transport.is_closing() or self.reader.at_eof())
+
+    def close(self):
+        self.writer.close()
+
+    async def request(self, method, host, path, body, headers):
+        "Send the request, return the response headers, content and keep-alive"
+        lines = ['%s %s HTTP/1.1' % (method, path)]
+        names = set([k.lower() for k in headers])
+        if 'host' not in names:
+            lines.append('Host: %s' % host)
+        if 'content-length' not in names and body is not None:
+            lines.append('Content-Length: %d' % len(body))
+        lines.extend(['%s: %s' % (k, v) for k, v in headers.items()])
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionResetError('connection closed by the server')
+            version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            status = int(status)
+            response = await self.read_headers()
+            if status != 100:
+                break
+        response['status'] = str(status)
+
+        keep_alive = version == 'HTTP/1.1'
+        connection = response.get('connection', '').lower()
+        if 'close' in connection:
+            keep_alive = False
+        elif 'keep-alive' in connection:
+            keep_alive = True
+
+        if method == 'HEAD' or status in (204, 304):
+            content = b''
+        elif 'chunked' in response.get('transfer-encoding', '').lower():
+            content = await self.read_chunked()
+        elif 'content-length' in response:
+            content = await self.reader.readexactly(int(response['content-length']))
+        else:
+            # HTTP/1.0 style (content until the connection is closed):
+            content = await self.reader.read()
+            keep_alive = False
+        return response, content, keep_alive, reason
+
+    async def read_headers(self):
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, value = line.decode('latin-1').split(':', 1)
+            name, value = name.strip().lower(), value.strip()
+            if name in headers:
+                value = '%s, %s' % (headers[name], value)
+            headers[name] = value
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                await self.read_headers()   # trailers
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+class AsyncConnectionPool(object):
+    """Keep-alive connections to a host (at most maxsize at once)"""
+
+    def __init__(self, scheme, netloc, context=None, maxsize=10, idle_timeout=60):
+        parts = urlsplit('%s://%s' % (scheme, netloc))
+        self.host = parts.hostname
+        self.port = parts.port or (443 if scheme == 'https' else 80)
+        self.context = context if scheme == 'https' else None
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.idle = []              # (connection, last used time), oldest first
+        self.semaphore = asyncio.Semaphore(maxsize)
+
+    async def connect(self):
+        "Open a new connection to the host"
+        kwargs = {}
+        if self.context is not None:
+            kwargs['ssl'] = self.context
+            kwargs['server_hostname'] = self.host
+        reader, writer = await asyncio.open_connection(self.host, self.port, **kwargs)
+        return AsyncConnection(reader, writer)
+
+    async def get(self):
+        "Return an idle connection (or a new one) and if it was reused"
+        await self.semaphore.acquire()
+        now = time.time()
+        while self.idle:
+            conn, used = self.idle.pop()
+            if now - used < self.idle_timeout and conn.is_alive():
+                return conn, True
+            conn.close()
+        try:
+            return await self.connect(), False
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def put(self, conn):
+        "Return the connection to the pool (to be reused)"
+        self.idle.append((conn, time.time()))
+        self.semaphore.release()
+
+    def discard(self, conn):
+        "Close a connection not usable anymore"
+        conn.close()
+        self.semaphore.release()
+
+    def close(self):
+        while self.idle:
+            conn, used = self.idle.pop()
+            conn.close()
+
+
+# pools are bound to the event loop where the connections were opened:
+_connection_pools = weakref.WeakKeyDictionary()     # loop: {key: pool}
+
+
+class AsyncTransport(object):
+    """Non-blocking HTTP/1.1 transport with per-host keep-alive pools"""
+    _wrapper_version = "asyncio %s" % __version__
+    _wrapper_name = 'asyncio'
+    pool_size = 10              # maximum connections per host (and loop)
+    idle_timeout = 60           # seconds to keep an idle connection
+
+    def __init__(self, timeout=TIMEOUT, cacert=None):
+        self.timeout = timeout
+        self.cacert = cacert
+
+    def get_pool(self, scheme, netloc):
+        "Return the connection pool for the host (in the running loop)"
+        pools = _connection_pools.setdefault(asyncio.get_event_loop(), {})
+        key = (scheme, netloc, self.cacert)
+        pool = pools.get(key)
+        if pool is None:
+            context = None
+            if scheme == 'https':
+                context = ssl.create_default_context(cafile=self.cacert)
+                if not self.cacert:
+                    # same as urllib2 transport (no verification)
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+            pool = pools[key] = AsyncConnectionPool(scheme, netloc, context,
+                                                    self.pool_size, self.idle_timeout)
+        return pool
+
+    async def request(self, url, method="GET", body=None, headers={}):
+        if self.timeout is not None:
+            return await asyncio.wait_for(self._request(url, method, body, headers),
+                                          self.timeout)
+        return await self._request(url, method, body, headers)
+
+    async def _request(self, url, method, body, headers):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme not in ('http', 'https'):
+            raise RuntimeError('%s scheme is not supported with asyncio transport' % scheme)
+        if query:
+            path = '%s?%s' % (path, query)
+        pool = self.get_pool(scheme, netloc)
+        while True:
+            conn, reused = await pool.get()
+            try:
+                response, content, keep_alive, reason = await conn.request(
+                    method, netloc, path or '/', body, headers)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pool.discard(conn)
+                # the server could have closed an idle connection, retry:
+                if not reused:
+                    raise
+            except BaseException:
+                # i.e. timeout (cancelled), the response was not read
+                pool.discard(conn)
+                raise
+        if keep_alive:
+            pool.put(conn)
+        else:
+            pool.discard(conn)
+        status = int(response['status'])
+        if status >= 400 and status != 500:
+            raise HTTPError(url, status, reason, response, BytesIO(content))
+        return response, content
+
+
+class AsyncSoapClient(SoapClient):
+    """SOAP client with awaitable calls (asyncio event loop)
+
+    The WSDL model, marshalling and plugins are the ones of SoapClient (the
+    WSDL is fetched and parsed at construction, see cache / shared_wsdl);
+    only the HTTP exchange is non-blocking, so one loop can keep many
+    requests in flight, even several concurrent calls of the same client.
+    wsdl_call_stream is not awaitable: it is the one of SoapClient, using
+    the blocking transport (call it from a thread, i.e. run_in_executor).
+    """
+
+    def __init__(self, *args, **kwargs):
+        SoapClient.__init__(self, *args, **kwargs)
+        self.async_http = AsyncTransport(timeout=kwargs.get('timeout', TIMEOUT),
+                                         cacert=self.cacert)
+
+    async def call(self, method, *args, **kwargs):
+        """Prepare xml request and make SOAP call, returning a SimpleXMLElement"""
+        soap_uri = self.soap_uri
+        context = self.call_context
+        xml_request = context.xml_request = self._build_request(method, args, kwargs, soap_uri)
+        namespace = self.namespace
+        xml_response = await self.send(method, xml_request)
+        # restore the state of this call (other calls could change it meanwhile):
+        context.namespace = namespace
+        context.xml_request = xml_request
+        context.xml_response = xml_response
+        # the plugin checks returned as futures are awaited (not blocking the loop)
+        context.defer_checks = True
+        try:
+            response = self._parse_response(method, xml_response, args, kwargs, soap_uri)
+            checks = context.checks
+        finally:
+            context.defer_checks, context.checks = False, ()
+        for check in checks:
+            await asyncio.wrap_future(check)
+        return response
+
+    async def send(self, method, xml):
+        """Send SOAP request using HTTP (non-blocking)"""
+        if self.location == 'test': return
+        location, http_method, headers = self._http_request(method, xml)
+        body = self._encode_request(xml, headers)
+        response, content = await self.async_http.request(
+            location, http_method, body=body, headers=headers)
+        content = self._decode_response(response, content)
+        self.call_context.response = response
+        self.call_context.content = content
+        log.debug('\n'.join(["%s: %s" % (k, v) for k, v in response.items()]))
+        log.debug(content)
+        return content
+
+    async def wsdl_call(self, method, *args, **kwargs):
+        """Pre and post process SOAP call, input and output parameters using WSDL"""
+        return await self.wsdl_call_with_args(method, args, kwargs)
+
+    async def wsdl_call_with_args(self, method, args, kwargs):
+        """Pre and post process SOAP call, input and output parameters using WSDL"""
+        soap_uri = self.soap_uri
+        method, params, output = self._wsdl_prepare(method, args, kwargs)
+        response = await self.call(method, *params)
+        return self._wsdl_result(method, response, output, soap_uri)
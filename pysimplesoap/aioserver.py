@@ -0,0 +1,356 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Pythonic simple SOAP Server for asyncio (python 3.5+ only)"""
+
+
+import asyncio
+import io
+import logging
+from http.client import responses
+
+from . import __author__, __copyright__, __license__, __version__
+from .server import compress_response, decode_body, RequestBody, RequestEntityTooLarge, \
+    COMPRESS_SIZE, UTF8_CHARSETS
+
+log = logging.getLogger(__name__)
+
+# requests bigger than this are parsed in the executor (not in the loop):
+OFFLOAD_SIZE = 16384
+
+
+def get_charset(content_type, default='utf-8'):
+    "Return the charset parameter of a Content-Type header"
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"') or default
+    return default
+
+
+async def dispatch(dispatcher, xml, action=None, fault=None, executor=None,
+                   offload_size=OFFLOAD_SIZE):
+    """Receive and process SOAP call (awaiting coroutine functions)
+
+    Regular functions and the CPU bound phases (parsing big or streamed
+    requests, serializing the response) run in the executor, so the loop is
+    free to serve other connections meanwhile.
+    """
+    loop = asyncio.get_event_loop()
+    if hasattr(xml, 'read') or len(xml) > offload_size:
+        call = await loop.run_in_executor(executor, dispatcher.parse_request,
+                                          xml, action, fault)
+    else:
+        call = dispatcher.parse_request(xml, action, fault)
+    if call.fault:
+        return dispatcher.build_response(call)
+    if asyncio.iscoroutinefunction(call.function):
+        try:
+            call.ret = await call.function(**call.args)
+        except Exception:
+            dispatcher.handle_error(call)
+        return await loop.run_in_executor(executor, dispatcher.build_response, call)
+
+    def execute():
+        dispatcher.execute(call)
+        return dispatcher.build_response(call)
+
+    return await loop.run_in_executor(executor, execute)
+
+
+class BadRequest(Exception):
+    def __init__(self, status, message=None):
+        Exception.__init__(self, message or responses[status])
+        self.status = status
+
+
+class AsyncHandler(object):
+    """Serve a SoapDispatcher (base of the asyncio front ends)
+
+    Registered functions can be coroutine functions (async def), awaited in
+    the loop; regular ones run in the executor (default thread pool).
+    """
+    max_body_size = 10 * 1024 * 1024   # bigger requests get a 413 response
+    offload_size = OFFLOAD_SIZE
+    compress_size = COMPRESS_SIZE       # compress bigger responses (None: never)
+
+    def __init__(self, dispatcher, executor=None):
+        self.dispatcher = dispatcher
+        self.executor = executor
+
+    async def handle(self, method, path, query, headers, body):
+        """Return the status, headers and content of the response
+
+        headers are the request ones (lowercase names)
+        """
+        if method == 'GET':
+            # wsdl or method help (generated in the executor the first time):
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor, self.dispatcher.document_response, path, query,
+                headers.get('if-none-match'), headers.get('accept-encoding'))
+        elif method == 'POST':
+            charset = get_charset(headers.get('content-type', ''))
+            fault = {}
+            try:
+                if hasattr(body, 'read'):
+                    # streamed: parsed (in the executor) while it is received
+                    request = self.decode(body, headers.get('content-encoding'))
+                    if charset.lower() not in UTF8_CHARSETS:
+                        loop = asyncio.get_event_loop()
+                        body = await loop.run_in_executor(self.executor, request.read)
+                        request = body.decode(charset)
+                else:
+                    if headers.get('content-encoding'):
+                        body = self.decode(io.BytesIO(body), headers['content-encoding']).read()
+                    # convert xml request to unicode (according to request headers)
+                    request = body.decode(charset)
+                response = await dispatch(self.dispatcher, request, fault=fault,
+                                          executor=self.executor,
+                                          offload_size=self.offload_size)
+            except RequestEntityTooLarge:
+                raise BadRequest(413)
+            response_headers, response = compress_response(
+                response, headers.get('accept-encoding'), self.compress_size)
+            # check if fault dict was completed (faultcode, faultstring, detail)
+            return (500 if fault else 200, [('Content-Type', 'text/xml')] + response_headers,
+                    response)
+        return 405, [('Content-Type', 'text/plain')], b'Method not allowed'
+
+    def decode(self, stream, content_encoding):
+        "Return a stream to read the body decompressed (checking its size)"
+        try:
+            return decode_body(stream, content_encoding, self.max_body_size)
+        except ValueError:
+            raise BadRequest(415, "Unsupported Content-Encoding")
+
+
+class AsyncSoapServer(AsyncHandler):
+    """HTTP/1.1 (keep-alive) asyncio server for a SoapDispatcher"""
+    keepalive_timeout = 15              # seconds to wait for the next request
+    body_timeout = 60                   # seconds to receive its headers and body
+    backlog = 1024
+
+    def __init__(self, dispatcher, executor=None):
+        AsyncHandler.__init__(self, dispatcher, executor)
+        self.server = None
+        self.connections = set()        # tasks serving the open connections
+
+    async def start(self, host='', port=8008, **kwargs):
+        "Start listening (kwargs are passed to asyncio.start_server)"
+        kwargs.setdefault('backlog', self.backlog)
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 host, port, **kwargs)
+        return self.server
+
+    async def close(self):
+        "Stop listening and close the open (idle or in use) connections"
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        tasks = list(self.connections)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def serve_forever(self, host='', port=8008, **kwargs):
+        "Run the server in a new event loop (blocking)"
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.start(host, port, **kwargs))
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self.close())
+            loop.close()
+
+    async def handle_connection(self, reader, writer):
+        "Serve the requests of a connection (while it is kept alive)"
+        task = asyncio.current_task() if hasattr(asyncio, 'current_task') \
+            else asyncio.Task.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader, writer)
+                    if request is None:
+                        break
+                    method, path, version, headers, body = request
+                    path, _, query = path[1:].partition("?")
+                    status, response_headers, content = await self.handle(
+                        method, path, query, headers, body)
+                except BadRequest as e:
+                    content = str(e).encode('utf-8')
+                    self.write_response(writer, e.status, [('Content-Type', 'text/plain')],
+                                        content, keep_alive=False)
+                    await writer.drain()
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    raise
+                except Exception:
+                    log.exception("Error serving the request")
+                    self.write_response(writer, 500, [('Content-Type', 'text/plain')],
+                                        b'Internal Server Error', keep_alive=False)
+                    await writer.drain()
+                    break
+                connection = headers.get('connection', '').lower()
+                if version == 'HTTP/1.1':
+                    keep_alive = 'close' not in connection
+                else:
+                    keep_alive = 'keep-alive' in connection
+                self.write_response(writer, status, response_headers, content, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def read_request(self, reader, writer):
+        "Return method, path, version, headers and body (None if closed)"
+        # idle connection (closed silently if no request arrives):
+        line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+        if not line:
+            return None
+        try:
+            return await asyncio.wait_for(self.read_message(line, reader, writer),
+                                          self.body_timeout)
+        except asyncio.TimeoutError:
+            raise BadRequest(408)
+
+    async def read_message(self, line, reader, writer):
+        "Return the request given its first line (reading the headers and body)"
+        try:
+            method, path, version = line.decode('latin-1').split()
+        except ValueError:
+            raise BadRequest(400)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('expect', '').lower() == '100-continue':
+            if int(headers.get('content-length', 0)) > self.max_body_size:
+                raise BadRequest(413)
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = await self.read_chunked(reader)
+        else:
+            length = int(headers.get('content-length', 0))
+            if length > self.max_body_size:
+                raise BadRequest(413)
+            body = await reader.readexactly(length)
+        return method, path, version, headers, body
+
+    async def read_chunked(self, reader):
+        chunks = []
+        size = 0
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            if not chunk_size:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass    # trailers
+                return b''.join(chunks)
+            size += chunk_size
+            if size > self.max_body_size:
+                raise BadRequest(413)
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readline()
+
+    def write_response(self, writer, status, headers, content, keep_alive=True):
+        lines = ['HTTP/1.1 %d %s' % (status, responses.get(status, ''))]
+        lines.extend(['%s: %s' % (name, value) for name, value in headers])
+        if status != 304 and 'content-length' not in [name.lower() for name, value in headers]:
+            lines.append('Content-Length: %d' % len(content))
+        lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + content)
+
+
+class ReceiveStream(object):
+    """File-like object reading the ASGI request messages (from a thread)
+
+    Each read waits in the loop for the next message, so the dispatcher
+    (running in the executor) parses the body while it arrives.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.pending = b''
+        self.done = False
+
+    async def next_message(self):
+        return await self.receive()
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or not self.pending):
+            message = asyncio.run_coroutine_threadsafe(self.next_message(),
+                                                       self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise BadRequest(400, "client disconnected")
+            self.pending += message.get('body', b'')
+            self.done = not message.get('more_body')
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
+class ASGISOAPHandler(AsyncHandler):
+    """ASGI application for a SoapDispatcher (i.e. for uvicorn, hypercorn)
+
+    POST requests are dispatched, GET requests return the wsdl or the
+    method help (as SOAPHandler). The request body is parsed in the executor
+    while it is received (see ReceiveStream).
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        elif scope['type'] != 'http':
+            raise RuntimeError("unsupported ASGI scope type %s" % scope['type'])
+        headers = dict([(name.decode('latin-1'), value.decode('latin-1'))
+                        for name, value in scope.get('headers', [])])
+        try:
+            body = b''
+            if scope['method'] == 'POST':
+                body = self.body_stream(headers, receive)
+            status, response_headers, content = await self.handle(
+                scope['method'], scope['path'][1:],
+                scope.get('query_string', b'').decode('latin-1'), headers, body)
+        except BadRequest as e:
+            status, content = e.status, str(e).encode('utf-8')
+            response_headers = [('Content-Type', 'text/plain')]
+        if status != 304 and 'content-length' not in [name.lower() for name, value in response_headers]:
+            response_headers.append(('Content-Length', str(len(content))))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': content})
+
+    def body_stream(self, headers, receive):
+        "Return a stream to read the request body (checking its size while it arrives)"
+        if int(headers.get('content-length', 0)) > self.max_body_size:
+            raise BadRequest(413)
+        return RequestBody(ReceiveStream(receive, asyncio.get_event_loop()), None,
+                           max_size=self.max_body_size)
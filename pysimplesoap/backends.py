@@ -0,0 +1,488 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Pluggable XML tree implementations used by SimpleXMLElement"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+import copy
+import logging
+import xml.dom.minidom
+from xml.parsers import expat
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+from . import __author__, __copyright__, __license__, __version__
+
+log = logging.getLogger(__name__)
+
+#
+# We store metadata about what XML tree implementations we have available.
+#
+_xml_backends = {}  # libname: backend instance mapping
+
+XML_URI = "http://www.w3.org/XML/1998/namespace"
+
+
+def xml_escape(data):
+    "Escape character data (same replacements as minidom serialization)"
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+                replace("\"", "&quot;").replace(">", "&gt;")
+
+
+class XMLBackendBase:
+    """Operations on the document tree needed by SimpleXMLElement
+
+    Nodes (documents and elements) are opaque objects of the underlying
+    library, SimpleXMLElement only manipulates them through these methods.
+    """
+    _backend_name = None
+
+    def __repr__(self):
+        return "<XML backend %s>" % self._backend_name
+
+
+#
+# minidom support (default, always available).
+#
+class MinidomBackend(XMLBackendBase):
+    _backend_name = 'minidom'
+
+    def parse(self, text):
+        if hasattr(text, 'read'):
+            # file-like object (parsed while it is read)
+            return xml.dom.minidom.parse(text)
+        return xml.dom.minidom.parseString(text)
+
+    def document_element(self, document):
+        return document.documentElement
+
+    def create_element(self, document, name, namespace=None):
+        if namespace is None:
+            return document.createElement(name)
+        return document.createElementNS(namespace, name)
+
+    def append_child(self, document, element, child):
+        element.appendChild(child)
+
+    def remove_child(self, document, element, child):
+        element.removeChild(child)
+
+    def append_text(self, document, element, text):
+        element.appendChild(document.createTextNode(text))
+
+    def append_cdata(self, document, element, data):
+        element.appendChild(document.createCDATASection(data))
+
+    def append_comment(self, document, element, data):
+        element.appendChild(document.createComment(data))
+
+    def import_node(self, document, element, other_document, other):
+        element.appendChild(document.importNode(other, True))  # deep copy
+
+    def to_xml(self, document, pretty=False):
+        if not pretty:
+            return document.toxml('UTF-8')
+        else:
+            return document.toprettyxml(encoding='UTF-8')
+
+    def element_xml(self, element):
+        return element.toxml()
+
+    def get_name(self, element):
+        return element.tagName
+
+    def get_local_name(self, element):
+        return element.localName
+
+    def get_prefix(self, element):
+        return element.prefix
+
+    def attributes(self, element):
+        return element.attributes
+
+    def attribute_items(self, element):
+        return list(element.attributes.items())
+
+    def get_attribute(self, element, name):
+        if element.hasAttribute(name):
+            return element.attributes[name].value
+
+    def set_attribute(self, element, name, value):
+        element.setAttribute(name, value)
+
+    def remove_attribute(self, element, name):
+        element.removeAttribute(name)
+
+    def children(self, element):
+        return [node for node in element.childNodes
+                if node.nodeType == node.ELEMENT_NODE]
+
+    def child_names(self, element):
+        return [node.tagName for node in element.childNodes
+                if node.nodeType != node.TEXT_NODE]
+
+    def get_text(self, element):
+        rc = ''
+        for node in element.childNodes:
+            if node.nodeType == node.TEXT_NODE or node.nodeType == node.CDATA_SECTION_NODE:
+                rc = rc + node.data
+        return rc
+
+    def find(self, document, element, tag):
+        return element.getElementsByTagName(tag)
+
+    def find_ns(self, document, element, namespace, tag):
+        return element.getElementsByTagNameNS(namespace, tag)
+
+    def namespace_uri(self, document, element, prefix):
+        while element is not None and element.attributes is not None:
+            try:
+                return element.attributes['xmlns:%s' % prefix].value
+            except KeyError:
+                element = element.parentNode
+
+    def canonicalize(self, document, element, output=None, exclusive=True):
+        from . import c14n
+        return c14n.Canonicalize(element, output,
+                                 unsuppressedPrefixes=[] if exclusive else None)
+
+_xml_backends['minidom'] = MinidomBackend()
+
+
+#
+# ElementTree support (C accelerated when available).
+#
+def CDATA(data=None):
+    "CDATA section factory (marker tag, like ElementTree.Comment)"
+    element = ElementTree.Element(CDATA)
+    element.text = data
+    return element
+
+
+class ElementTreeDocument(object):
+    "Root element plus the bookkeeping that ElementTree does not keep"
+
+    def __init__(self, root=None):
+        self.root = root
+        self.namespaces = {}    # created/imported element: namespace uri
+        self.__parents = None   # child: parent (built on demand)
+
+    def get_parent(self, element):
+        if self.__parents is None:
+            self.__parents = dict((child, parent)
+                                  for parent in self.root.iter()
+                                  for child in parent)
+        return self.__parents.get(element)
+
+    def modified(self):
+        "Invalidate the parent map (the tree structure changed)"
+        self.__parents = None
+
+
+class ElementTreeBackend(XMLBackendBase):
+    """Tree of ElementTree elements, parsed by expat without namespace
+    processing so tag and attribute names keep their prefixes (as DOM
+    tagName) and xmlns declarations remain regular attributes.
+    """
+    _backend_name = 'etree'
+
+    def parse(self, text):
+        try:
+            builder = ElementTree.TreeBuilder(insert_comments=True)
+        except TypeError:
+            builder = ElementTree.TreeBuilder()     # python < 3.8: no comments
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+
+        def start(name, attrs):
+            if attrs:
+                # namespace declarations first (as minidom builder does)
+                attrs = dict(sorted(attrs.items(),
+                                    key=lambda item: not item[0].startswith("xmlns")))
+            return builder.start(name, attrs)
+        parser.StartElementHandler = start
+        parser.EndElementHandler = builder.end
+        parser.CharacterDataHandler = builder.data
+        if hasattr(builder, 'comment'):
+            parser.CommentHandler = builder.comment
+        parser.StartCdataSectionHandler = lambda: builder.start(CDATA, {})
+        parser.EndCdataSectionHandler = lambda: builder.end(CDATA)
+        if hasattr(text, 'read'):
+            # file-like object (parsed while it is read)
+            parser.ParseFile(text)
+        else:
+            parser.Parse(text, True)
+        return ElementTreeDocument(builder.close())
+
+    def document_element(self, document):
+        return document.root
+
+    def create_element(self, document, name, namespace=None):
+        element = ElementTree.Element(name)
+        document.namespaces[element] = namespace
+        return element
+
+    def append_child(self, document, element, child):
+        element.append(child)
+        document.modified()
+
+    def remove_child(self, document, element, child):
+        if child.tail:
+            # the following text node belongs to the parent (keep it)
+            index = list(element).index(child)
+            if index:
+                element[index - 1].tail = (element[index - 1].tail or '') + child.tail
+            else:
+                element.text = (element.text or '') + child.tail
+        element.remove(child)
+        document.modified()
+
+    def append_text(self, document, element, text):
+        if len(element):
+            element[-1].tail = (element[-1].tail or '') + text
+        else:
+            element.text = (element.text or '') + text
+
+    def append_cdata(self, document, element, data):
+        self.append_child(document, element, CDATA(data))
+
+    def append_comment(self, document, element, data):
+        self.append_child(document, element, ElementTree.Comment(data))
+
+    def import_node(self, document, element, other_document, other):
+        node = copy.deepcopy(other)
+        # keep the namespace of the copies (as DOM namespaceURI):
+        scope = self.__scope(other_document, other)
+        for original, clone in zip(self.__iter_ns(other_document, other, scope),
+                                   node.iter()):
+            document.namespaces[clone] = original[1]
+        self.append_child(document, element, node)
+
+    def to_xml(self, document, pretty=False):
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>']
+        if not pretty:
+            self.__write(parts.append, document.root)
+        else:
+            parts.append("\n")
+            self.__write_pretty(parts.append, document.root, "")
+        return "".join(parts).encode("utf8")
+
+    def element_xml(self, element):
+        parts = []
+        self.__write(parts.append, element)
+        return "".join(parts)
+
+    def __write(self, write, element):
+        "Serialize the element like minidom toxml"
+        tag = element.tag
+        if tag is ElementTree.Comment:
+            write("<!--%s-->" % element.text)
+            return
+        elif tag is CDATA:
+            write("<![CDATA[%s]]>" % element.text)
+            return
+        write("<" + tag)
+        for k, v in element.attrib.items():
+            write(' %s="%s"' % (k, xml_escape(v)))
+        if element.text is None and not len(element):
+            write("/>")
+            return
+        write(">")
+        if element.text:
+            write(xml_escape(element.text))
+        for child in element:
+            self.__write(write, child)
+            if child.tail:
+                write(xml_escape(child.tail))
+        write("</%s>" % tag)
+
+    def __write_pretty(self, write, element, indent, addindent="\t", newl="\n"):
+        "Serialize the element like minidom toprettyxml"
+        tag = element.tag
+        if tag is ElementTree.Comment:
+            write("%s<!--%s-->%s" % (indent, element.text, newl))
+            return
+        elif tag is CDATA:
+            write("<![CDATA[%s]]>" % element.text)
+            return
+        write(indent + "<" + tag)
+        for k, v in element.attrib.items():
+            write(' %s="%s"' % (k, xml_escape(v)))
+        nodes = []
+        if element.text is not None:
+            nodes.append(element.text)
+        for child in element:
+            nodes.append(child)
+            if child.tail is not None:
+                nodes.append(child.tail)
+        if not nodes:
+            write("/>%s" % newl)
+            return
+        write(">")
+        if len(nodes) == 1 and (isinstance(nodes[0], basestring) or nodes[0].tag is CDATA):
+            if isinstance(nodes[0], basestring):
+                write(xml_escape(nodes[0]))
+            else:
+                self.__write(write, nodes[0])
+        else:
+            write(newl)
+            for node in nodes:
+                if isinstance(node, basestring):
+                    write(xml_escape("%s%s%s" % (indent + addindent, node, newl)))
+                else:
+                    self.__write_pretty(write, node, indent + addindent, addindent, newl)
+            write(indent)
+        write("</%s>%s" % (tag, newl))
+
+    def get_name(self, element):
+        return element.tag
+
+    def get_local_name(self, element):
+        return element.tag.split(":", 1)[-1]
+
+    def get_prefix(self, element):
+        if ":" in element.tag:
+            return element.tag.split(":", 1)[0]
+
+    def attributes(self, element):
+        return element.attrib
+
+    def attribute_items(self, element):
+        return list(element.attrib.items())
+
+    def get_attribute(self, element, name):
+        return element.get(name)
+
+    def set_attribute(self, element, name, value):
+        element.set(name, value)
+
+    def remove_attribute(self, element, name):
+        del element.attrib[name]
+
+    def children(self, element):
+        return [node for node in element if isinstance(node.tag, basestring)]
+
+    def child_names(self, element):
+        return [node.tag for node in element if isinstance(node.tag, basestring)]
+
+    def get_text(self, element):
+        rc = element.text or ''
+        for node in element:
+            if node.tag is CDATA:
+                rc = rc + node.text
+            if node.tail:
+                rc = rc + node.tail
+        return rc
+
+    def find(self, document, element, tag):
+        return [node for node in element.iter(tag)
+                if node is not element and isinstance(node.tag, basestring)]
+
+    def find_ns(self, document, element, namespace, tag):
+        scope = self.__scope(document, element)
+        return [node for node, uri in self.__iter_ns(document, element, scope)
+                if node is not element and
+                   (namespace == '*' or uri == namespace) and
+                   (tag == '*' or self.get_local_name(node) == tag)]
+
+    def __scope(self, document, element):
+        "Return the namespace declarations {prefix: uri} in effect"
+        ancestors = []
+        while element is not None:
+            ancestors.append(element)
+            element = document.get_parent(element)
+        scope = {'xml': XML_URI}
+        for ancestor in reversed(ancestors):
+            scope = self.__declare(ancestor, scope)
+        return scope
+
+    def __declare(self, element, scope):
+        "Add the xmlns attributes of the element to the scope (copy)"
+        declared = None
+        for k, v in element.attrib.items():
+            if k == 'xmlns' or k.startswith('xmlns:'):
+                if declared is None:
+                    declared = dict(scope)
+                declared[k[6:] or None] = v or None
+        return scope if declared is None else declared
+
+    def __iter_ns(self, document, element, scope):
+        "Yield the element and its descendants with their namespace uri"
+        stack = [(element, scope)]
+        while stack:
+            node, scope = stack.pop()
+            if not isinstance(node.tag, basestring):
+                continue
+            if node is not element:
+                scope = self.__declare(node, scope)
+            if node in document.namespaces:
+                yield node, document.namespaces[node]
+            else:
+                yield node, scope.get(self.get_prefix(node))
+            stack.extend([(child, scope) for child in reversed(node)])
+
+    def namespace_uri(self, document, element, prefix):
+        while element is not None:
+            value = element.get('xmlns:%s' % prefix)
+            if value is not None:
+                return value
+            element = document.get_parent(element)
+
+    def canonicalize(self, document, element, output=None, exclusive=True):
+        # the pure-python c14n implementation needs a DOM (ancestors are
+        # needed for the namespace context), locate the same element there:
+        path = []
+        while element is not document.root:
+            parent = document.get_parent(element)
+            path.append(self.children(parent).index(element))
+            element = parent
+        minidom = _xml_backends['minidom']
+        dom = minidom.parse(self.to_xml(document))
+        node = dom.documentElement
+        for i in reversed(path):
+            node = minidom.children(node)[i]
+        return minidom.canonicalize(dom, node, output, exclusive)
+
+_xml_backends['etree'] = ElementTreeBackend()
+
+
+def get_xml_backend(library=None):
+    """Return the XML backend for the library (minidom if not given)"""
+    try:
+        return _xml_backends[library or 'minidom']
+    except KeyError:
+        raise RuntimeError('%s XML backend is not available' % (library,))
+
+
+def set_xml_backend(library=None):
+    """Set the XML backend used by SimpleXMLElement (i.e. 'etree')"""
+    global XMLBackend
+    XMLBackend = get_xml_backend(library)
+    return XMLBackend
+
+
+def get_XMLBackend():
+    """Return current XML backend"""
+    global XMLBackend
+    return XMLBackend
+
+
+# define the default XML backend (it can be changed at runtime!):
+set_xml_backend()
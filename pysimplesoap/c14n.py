@@ -16,12 +16,9 @@ This module generates canonical XML of a document or element.
 and includes a prototype of exclusive canonicalization
     http://www.w3.org/Signature/Drafts/xml-exc-c14n
 
-Requires PyXML 0.7.0 or later.
-
-Known issues if using Ft.Lib.pDomlette:
-    1. Unicode
-    2. does not white space normalize attributes of type NMTOKEN and ID?
-    3. seems to be include "\n" after importing external entities?
+Known issues with non-validating parsers (i.e. xml.dom.minidom):
+    1. default attributes declared in the DTD are not added
+    2. does not white space normalize attributes of type NMTOKEN and ID
 
 Note, this version processes a DOM tree, and consequently it processes
 namespace nodes as attributes, not from a node's namespace axis. This
@@ -29,6 +26,10 @@ permits simple document and element canonicalization without
 XPath. When XPath is used, the XPath result node list is passed and used to
 determine if the node is in the XPath result list, but little else.
 
+The tree is walked iteratively (deep documents do not reach the recursion
+limit) and the UTF-8 output is written in blocks, so it can be fed to a
+HashSink to compute the digest without building the canonical text.
+
 Authors:
     "Joseph M. Reagle Jr." <reagle@w3.org>
     "Rich Salz" <rsalz@zolera.com>
@@ -47,375 +48,301 @@ or
   http://www.w3.org/Consortium/Legal/copyright-software-19980720
 '''
 
-import string
+import hashlib
+import sys
 from xml.dom import Node
+if sys.version > '3':
+    basestring = str
+
 try:
     from xml.ns import XMLNS
-except:
+except ImportError:
     class XMLNS:
         BASE = "http://www.w3.org/2000/xmlns/"
         XML = "http://www.w3.org/XML/1998/namespace"
-try:
-    import cStringIO
-    StringIO = cStringIO
-except ImportError:
-    import StringIO
 
-_attrs = lambda E: (E.attributes and E.attributes.values()) or []
+_attrs = lambda E: (E.attributes and list(E.attributes.values())) or []
 _children = lambda E: E.childNodes or []
-_IN_XML_NS = lambda n: n.name.startswith("xmlns")
-_inclusive = lambda n: n.unsuppressedPrefixes == None
-
+_in_subset = lambda subset, node: subset is None or node in subset
 
 # Does a document/PI has lesser/greater document order than the
 # first element?
 _LesserElement, _Element, _GreaterElement = range(3)
 
-def _sorter(n1,n2):
-    '''_sorter(n1,n2) -> int
-    Sorting predicate for non-NS attributes.'''
-
-    i = cmp(n1.namespaceURI, n2.namespaceURI)
-    if i: return i
-    return cmp(n1.localName, n2.localName)
-
-
-def _sorter_ns(n1,n2):
-    '''_sorter_ns((n,v),(n,v)) -> int
-    "(an empty namespace URI is lexicographically least)."'''
-
-    if n1[0] == 'xmlns': return -1
-    if n2[0] == 'xmlns': return 1
-    return cmp(n1[0], n2[0])
-
-def _utilized(n, node, other_attrs, unsuppressedPrefixes):
-    '''_utilized(n, node, other_attrs, unsuppressedPrefixes) -> boolean
-    Return true if that nodespace is utilized within the node'''
-    if n.startswith('xmlns:'):
-        n = n[6:]
-    elif n.startswith('xmlns'):
-        n = n[5:]
-    if (n=="" and node.prefix in ["#default", None]) or \
-        n == node.prefix or n in unsuppressedPrefixes: 
-            return 1
-    for attr in other_attrs:
-        if n == attr.prefix: return 1
-    # For exclusive need to look at attributes
-    if unsuppressedPrefixes is not None:
-        for attr in _attrs(node):
-            if n == attr.prefix: return 1
-            
-    return 0
-
-
-def _inclusiveNamespacePrefixes(node, context, unsuppressedPrefixes):
-    '''http://www.w3.org/TR/xml-exc-c14n/ 
-    InclusiveNamespaces PrefixList parameter, which lists namespace prefixes that 
-    are handled in the manner described by the Canonical XML Recommendation'''
-    inclusive = []
-    if node.prefix:
-        usedPrefixes = ['xmlns:%s' %node.prefix]
-    else:
-        usedPrefixes = ['xmlns']
+# size (characters) of the blocks written to the output:
+BLOCK_SIZE = 65536
+
+
+def _escape_text(s):
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;") \
+            .replace("\r", "&#xD;")
 
-    for a in _attrs(node):
-        if a.nodeName.startswith('xmlns') or not a.prefix: continue
-        usedPrefixes.append('xmlns:%s' %a.prefix)
-
-    unused_namespace_dict = {}
-    for attr in context:
-        n = attr.nodeName
-        if n in unsuppressedPrefixes:
-            inclusive.append(attr)
-        elif n.startswith('xmlns:') and n[6:] in unsuppressedPrefixes:
-            inclusive.append(attr)
-        elif n.startswith('xmlns') and n[5:] in unsuppressedPrefixes:
-            inclusive.append(attr)
-        elif attr.nodeName in usedPrefixes:
-            inclusive.append(attr)
-        elif n.startswith('xmlns:'):
-            unused_namespace_dict[n] = attr.value
-
-    return inclusive, unused_namespace_dict
-
-#_in_subset = lambda subset, node: not subset or node in subset
-_in_subset = lambda subset, node: subset is None or node in subset # rich's tweak
-
-
-class _implementation:
-    '''Implementation class for C14N. This accompanies a node during it's
-    processing and includes the parameters and processing state.'''
-
-    # Handler for each node type; populated during module instantiation.
-    handlers = {}
-
-    def __init__(self, node, write, **kw):
-        '''Create and run the implementation.'''
-        self.write = write
-        self.subset = kw.get('subset')
-        self.comments = kw.get('comments', 0)
-        self.unsuppressedPrefixes = kw.get('unsuppressedPrefixes')
-        nsdict = kw.get('nsdict', { 'xml': XMLNS.XML, 'xmlns': XMLNS.BASE })
-        
-        # Processing state.
-        self.state = (nsdict, {'xml':''}, {}, {}) #0422
-        
-        if node.nodeType == Node.DOCUMENT_NODE:
-            self._do_document(node)
-        elif node.nodeType == Node.ELEMENT_NODE:
-            self.documentOrder = _Element        # At document element
-            if not _inclusive(self):
-                inherited,unused = _inclusiveNamespacePrefixes(node, self._inherit_context(node), 
-                                self.unsuppressedPrefixes)
-                self._do_element(node, inherited, unused=unused)
-            else:
-                inherited = self._inherit_context(node)
-                self._do_element(node, inherited)
-        elif node.nodeType == Node.DOCUMENT_TYPE_NODE:
-            pass
-        else:
-            raise TypeError(str(node))
 
+def _escape_attr(s):
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;") \
+            .replace("\t", "&#x9;").replace("\n", "&#xA;").replace("\r", "&#xD;")
 
-    def _inherit_context(self, node):
-        '''_inherit_context(self, node) -> list
-        Scan ancestors of attribute and namespace context.  Used only
-        for single element node canonicalization, not for subset
-        canonicalization.'''
 
-        # Collect the initial list of xml:foo attributes.
-        xmlattrs = filter(_IN_XML_NS, _attrs(node))
+def _prefix(name):
+    "Return the prefix of a qualified name ('' if none)"
+    prefix, colon, local = name.partition(':')
+    return colon and prefix
 
-        # Walk up and get all xml:XXX attributes we inherit.
-        inherited, parent = [], node.parentNode
-        while parent and parent.nodeType == Node.ELEMENT_NODE:
-            for a in filter(_IN_XML_NS, _attrs(parent)):
-                n = a.localName
-                if n not in xmlattrs:
-                    xmlattrs.append(n)
-                    inherited.append(a)
+
+def _ns_declarations(node):
+    """Return the namespace declarations of an element {prefix: uri}
+
+    Qualified names are used (not the DOM namespace properties), so nodes
+    created in memory (i.e. setAttribute) are processed as if parsed.
+    """
+    ns = {}
+    for a in _attrs(node):
+        name = a.nodeName
+        if name == 'xmlns':
+            ns[''] = a.value or ''      # xmlns="": None
+        elif name.startswith('xmlns:'):
+            ns[name[6:]] = a.value
+    return ns
+
+
+class _Context(object):
+    "Namespace and xml:* attributes state of an element (for its children)"
+
+    def __init__(self, inscope, rendered, xml_attrs, in_output):
+        self.inscope = inscope              # {prefix: uri} declared
+        self.rendered = rendered            # {prefix: uri} output by ancestors
+        self.xml_attrs = xml_attrs          # {local name: attribute} inherited
+        self.in_output = in_output          # the element was rendered
+
+
+class _Canonicalizer(object):
+    '''Write the canonical form of a DOM node. The tree is walked with an
+    explicit stack (no recursion) and the output is written in blocks.'''
+
+    def __init__(self, write, subset=None, comments=0, unsuppressedPrefixes=None,
+                 nsdict=None):
+        self.out = write
+        self.subset = subset
+        self.comments = comments
+        self.exclusive = unsuppressedPrefixes is not None
+        # InclusiveNamespaces PrefixList ("#default" is the default namespace):
+        self.prefixes = set([p != '#default' and p or ''
+                             for p in unsuppressedPrefixes or []])
+        self.nsdict = dict([(p, uri) for p, uri in (nsdict or {}).items()
+                            if p not in ('xml', 'xmlns')])
+        self.parts = []
+        self.size = 0
+        self.documentOrder = _Element
+
+    def write(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size > BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out(''.join(self.parts).encode('utf-8'))
+            self.parts = []
+            self.size = 0
+
+    def run(self, node):
+        if node.nodeType == Node.DOCUMENT_NODE:
+            self.documentOrder = _LesserElement
+            for child in node.childNodes:
+                if child.nodeType == Node.ELEMENT_NODE:
+                    self.documentOrder = _Element        # At document element
+                    self.do_element(child, self.initial_context(child, False))
+                    self.documentOrder = _GreaterElement # After document element
+                elif child.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
+                    self.do_pi(child)
+                elif child.nodeType == Node.COMMENT_NODE:
+                    self.do_comment(child)
+                elif child.nodeType not in (Node.DOCUMENT_TYPE_NODE, Node.TEXT_NODE):
+                    raise TypeError(str(child))
+        elif node.nodeType == Node.ELEMENT_NODE:
+            self.do_element(node, self.initial_context(node, True))
+        elif node.nodeType != Node.DOCUMENT_TYPE_NODE:
+            raise TypeError(str(node))
+        self.flush()
+
+    def initial_context(self, node, ancestors):
+        '''Return the context of the parent of the element to canonicalize
+        (the declarations and xml:* attributes of the ancestors apply)'''
+        inscope = dict(self.nsdict)
+        xml_attrs = {}
+        parents = []
+        parent = node.parentNode
+        while ancestors and parent is not None and parent.nodeType == Node.ELEMENT_NODE:
+            parents.append(parent)
             parent = parent.parentNode
-        return inherited
-
-
-    def _do_document(self, node):
-        '''_do_document(self, node) -> None
-        Process a document node. documentOrder holds whether the document
-        element has been encountered such that PIs/comments can be written
-        as specified.'''
-
-        self.documentOrder = _LesserElement
-        for child in node.childNodes:
-            if child.nodeType == Node.ELEMENT_NODE:
-                self.documentOrder = _Element        # At document element
-                self._do_element(child)
-                self.documentOrder = _GreaterElement # After document element
-            elif child.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
-                self._do_pi(child)
-            elif child.nodeType == Node.COMMENT_NODE:
-                self._do_comment(child)
-            elif child.nodeType == Node.DOCUMENT_TYPE_NODE:
-                pass
+        for parent in reversed(parents):
+            inscope.update(_ns_declarations(parent))
+            for a in _attrs(parent):
+                if a.nodeName.startswith('xml:'):
+                    xml_attrs[a.nodeName] = a
+        return _Context(inscope, {}, xml_attrs, False)
+
+    def do_element(self, root, context):
+        '''Process an element and its descendants'''
+        stack = [(root, context)]
+        while stack:
+            node, context = stack.pop()
+            if context is None:
+                self.write(node)                # end tag
+            elif node.nodeType == Node.ELEMENT_NODE:
+                end, context = self.start_element(node, context)
+                if end:
+                    stack.append((end, None))
+                stack.extend([(child, context) for child in reversed(_children(node))])
+            elif node.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+                if node.data and _in_subset(self.subset, node):
+                    self.write(_escape_text(node.data))
+            elif node.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
+                self.do_pi(node)
+            elif node.nodeType == Node.COMMENT_NODE:
+                self.do_comment(node)
+            elif node.nodeType == Node.ENTITY_REFERENCE_NODE:
+                stack.extend([(child, context) for child in reversed(_children(node))])
             else:
-                raise TypeError(str(child))
-    handlers[Node.DOCUMENT_NODE] = _do_document
-
+                raise TypeError(str(node))
+
+    def start_element(self, node, parent):
+        '''Write the start tag, return the end tag and the children context
+        (the end tag is None if the element is not in the subset)'''
+        inscope = parent.inscope
+        local = _ns_declarations(node)
+        if local:
+            inscope = inscope.copy()
+            inscope.update(local)
+        # Divide attributes into XML and others (NS were already processed).
+        xml_attrs, other_attrs = {}, []
+        for a in _attrs(node):
+            name = a.nodeName
+            if name.startswith('xml:'):
+                xml_attrs[name] = a
+            elif name != 'xmlns' and not name.startswith('xmlns:') and \
+                    _in_subset(self.subset, a):
+                other_attrs.append(a)
+        inherited = parent.xml_attrs
+        if xml_attrs and not self.exclusive:
+            inherited = inherited.copy()
+            inherited.update(xml_attrs)
+
+        if not _in_subset(self.subset, node):
+            return None, _Context(inscope, parent.rendered, inherited, False)
+
+        # Create list of NS attributes to render (not previously rendered
+        # with the same value): all the in scope ones, or if exclusive, the
+        # visibly utilized and the InclusiveNamespaces PrefixList ones.
+        if self.exclusive:
+            candidates = set([_prefix(node.nodeName)])
+            # unprefixed attributes have no namespace (not the default one):
+            candidates.update([_prefix(a.nodeName) for a in other_attrs
+                               if ':' in a.nodeName])
+            candidates.update([p for p in self.prefixes if p in inscope])
+        else:
+            candidates = set(inscope)
+            candidates.add('')
+        rendered = parent.rendered
+        ns_to_render = []
+        for prefix in candidates:
+            uri = inscope.get(prefix, '')
+            if prefix and not uri:
+                raise RuntimeError('For exclusive c14n, unable to map prefix '
+                                   '"%s" in %s' % (prefix, node.nodeName))
+            # the default namespace is "undeclared" only if it was rendered
+            if prefix != 'xml' and rendered.get(prefix, '') != uri:
+                ns_to_render.append((prefix, uri))
+        if ns_to_render:
+            rendered = rendered.copy()
+            rendered.update(ns_to_render)
+
+        # If exclusive or the parent is rendered, add the local xml attributes
+        # Else, add all local and ancestor xml attributes
+        if self.exclusive:
+            other_attrs.extend([a for a in xml_attrs.values()
+                                if _in_subset(self.subset, a)])
+        elif parent.in_output:
+            other_attrs.extend(xml_attrs.values())
+        else:
+            other_attrs.extend(inherited.values())
 
-    def _do_text(self, node):
-        '''_do_text(self, node) -> None
-        Process a text or CDATA node.  Render various special characters
-        as their C14N entity representations.'''
-        if not _in_subset(self.subset, node): return
-        s = string.replace(node.data, "&", "&amp;")
-        s = string.replace(s, "<", "&lt;")
-        s = string.replace(s, ">", "&gt;")
-        s = string.replace(s, "\015", "&#xD;")
-        if s: self.write(s)
-    handlers[Node.TEXT_NODE] = _do_text
-    handlers[Node.CDATA_SECTION_NODE] = _do_text
-
-
-    def _do_pi(self, node):
-        '''_do_pi(self, node) -> None
-        Process a PI node. Render a leading or trailing #xA if the
+        W = self.write
+        W('<')
+        W(node.nodeName)
+        for prefix, uri in sorted(ns_to_render):
+            W(prefix and ' xmlns:%s="' % prefix or ' xmlns="')
+            W(_escape_attr(uri))
+            W('"')
+        # Sort by namespace uri (none first) and local name.
+        keys = []
+        for a in other_attrs:
+            prefix = _prefix(a.nodeName)
+            uri = prefix == 'xml' and XMLNS.XML or prefix and inscope.get(prefix) or ''
+            keys.append(((uri, a.nodeName.partition(':')[2] or a.nodeName), a))
+        keys.sort(key=lambda item: item[0])
+        for key, a in keys:
+            W(' ')
+            W(a.nodeName)
+            W('="')
+            W(_escape_attr(a.value))
+            W('"')
+        W('>')
+        return '</%s>' % node.nodeName, _Context(inscope, rendered, inherited, True)
+
+    def do_pi(self, node):
+        '''Process a PI node. Render a leading or trailing #xA if the
         document order of the PI is greater or lesser (respectively)
-        than the document element.
-        '''
+        than the document element.'''
         if not _in_subset(self.subset, node): return
         W = self.write
         if self.documentOrder == _GreaterElement: W('\n')
         W('<?')
-        W(node.nodeName)
-        s = node.data
-        if s:
+        W(node.target)
+        if node.data:
             W(' ')
-            W(s)
+            W(node.data)
         W('?>')
         if self.documentOrder == _LesserElement: W('\n')
-    handlers[Node.PROCESSING_INSTRUCTION_NODE] = _do_pi
 
+    def do_comment(self, node):
+        '''Process a comment node (if comments are kept), as a PI.'''
+        if not self.comments or not _in_subset(self.subset, node): return
+        W = self.write
+        if self.documentOrder == _GreaterElement: W('\n')
+        W('<!--')
+        W(node.data)
+        W('-->')
+        if self.documentOrder == _LesserElement: W('\n')
 
-    def _do_comment(self, node):
-        '''_do_comment(self, node) -> None
-        Process a comment node. Render a leading or trailing #xA if the
-        document order of the comment is greater or lesser (respectively)
-        than the document element.
-        '''
-        if not _in_subset(self.subset, node): return
-        if self.comments:
-            W = self.write
-            if self.documentOrder == _GreaterElement: W('\n')
-            W('<!--')
-            W(node.data)
-            W('-->')
-            if self.documentOrder == _LesserElement: W('\n')
-    handlers[Node.COMMENT_NODE] = _do_comment
 
+class HashSink(object):
+    '''File-like object updating a hash with the data written: used as the
+    Canonicalize output, the digest is computed without storing the text.'''
 
-    def _do_attr(self, n, value):
-        ''''_do_attr(self, node) -> None
-        Process an attribute.'''
+    def __init__(self, algorithm='sha1'):
+        if isinstance(algorithm, basestring):
+            algorithm = hashlib.new(algorithm)
+        self.hash = algorithm
 
-        W = self.write
-        W(' ')
-        W(n)
-        W('="')
-        s = string.replace(value, "&", "&amp;")
-        s = string.replace(s, "<", "&lt;")
-        s = string.replace(s, '"', '&quot;')
-        s = string.replace(s, '\011', '&#x9')
-        s = string.replace(s, '\012', '&#xA')
-        s = string.replace(s, '\015', '&#xD')
-        W(s)
-        W('"')
-
-
-    def _do_element(self, node, initial_other_attrs = [], unused = None):
-        '''_do_element(self, node, initial_other_attrs = [], unused = {}) -> None
-        Process an element (and its children).'''
-
-        # Get state (from the stack) make local copies.
-        #   ns_parent -- NS declarations in parent
-        #   ns_rendered -- NS nodes rendered by ancestors
-        #        ns_local -- NS declarations relevant to this element
-        #   xml_attrs -- Attributes in XML namespace from parent
-        #       xml_attrs_local -- Local attributes in XML namespace.
-        #   ns_unused_inherited -- not rendered namespaces, used for exclusive 
-        ns_parent, ns_rendered, xml_attrs = \
-                self.state[0], self.state[1].copy(), self.state[2].copy() #0422
-                
-        ns_unused_inherited = unused
-        if unused is None:
-            ns_unused_inherited = self.state[3].copy()
-            
-        ns_local = ns_parent.copy()
-        inclusive = _inclusive(self)
-        xml_attrs_local = {}
-
-        # Divide attributes into NS, XML, and others.
-        other_attrs = []
-        in_subset = _in_subset(self.subset, node)
-        for a in initial_other_attrs + _attrs(node):
-            if a.namespaceURI == XMLNS.BASE:
-                n = a.nodeName
-                if n == "xmlns:": n = "xmlns"        # DOM bug workaround
-                ns_local[n] = a.nodeValue
-            elif a.namespaceURI == XMLNS.XML:
-                if inclusive or (in_subset and  _in_subset(self.subset, a)): #020925 Test to see if attribute node in subset
-                    xml_attrs_local[a.nodeName] = a #0426
-            else:
-                if  _in_subset(self.subset, a):     #020925 Test to see if attribute node in subset
-                    other_attrs.append(a)
-                    
-#                # TODO: exclusive, might need to define xmlns:prefix here
-#                if not inclusive and a.prefix is not None and not ns_rendered.has_key('xmlns:%s' %a.prefix):
-#                    ns_local['xmlns:%s' %a.prefix] = ??
-
-            #add local xml:foo attributes to ancestor's xml:foo attributes
-            xml_attrs.update(xml_attrs_local)
-
-        # Render the node
-        W, name = self.write, None
-        if in_subset: 
-            name = node.nodeName
-            if not inclusive:
-                if node.prefix is not None:
-                    prefix = 'xmlns:%s' %node.prefix
-                else:
-                    prefix = 'xmlns'
-                    
-                if not ns_rendered.has_key(prefix) and not ns_local.has_key(prefix):
-                    if not ns_unused_inherited.has_key(prefix):
-                        raise RuntimeError(\
-                            'For exclusive c14n, unable to map prefix "%s" in %s' %(
-                            prefix, node))
-                    
-                    ns_local[prefix] = ns_unused_inherited[prefix]
-                    del ns_unused_inherited[prefix]
-                
-            W('<')
-            W(name)
-
-            # Create list of NS attributes to render.
-            ns_to_render = []
-            for n,v in ns_local.items():
-
-                # If default namespace is XMLNS.BASE or empty,
-                # and if an ancestor was the same
-                if n == "xmlns" and v in [ XMLNS.BASE, '' ] \
-                and ns_rendered.get('xmlns') in [ XMLNS.BASE, '', None ]:
-                    continue
-
-                # "omit namespace node with local name xml, which defines
-                # the xml prefix, if its string value is
-                # http://www.w3.org/XML/1998/namespace."
-                if n in ["xmlns:xml", "xml"] \
-                and v in [ 'http://www.w3.org/XML/1998/namespace' ]:
-                    continue
-
-
-                # If not previously rendered
-                # and it's inclusive  or utilized
-                if (n,v) not in ns_rendered.items():
-                    if inclusive or _utilized(n, node, other_attrs, self.unsuppressedPrefixes):
-                        ns_to_render.append((n, v))
-                    elif not inclusive:
-                        ns_unused_inherited[n] = v
-
-            # Sort and render the ns, marking what was rendered.
-            ns_to_render.sort(_sorter_ns)
-            for n,v in ns_to_render:
-                self._do_attr(n, v)
-                ns_rendered[n]=v    #0417
-
-            # If exclusive or the parent is in the subset, add the local xml attributes
-            # Else, add all local and ancestor xml attributes
-            # Sort and render the attributes.
-            if not inclusive or _in_subset(self.subset,node.parentNode):  #0426
-                other_attrs.extend(xml_attrs_local.values())
-            else:
-                other_attrs.extend(xml_attrs.values())
-            other_attrs.sort(_sorter)
-            for a in other_attrs:
-                self._do_attr(a.nodeName, a.value)
-            W('>')
+    def write(self, data):
+        self.hash.update(data)
 
-        # Push state, recurse, pop state.
-        state, self.state = self.state, (ns_local, ns_rendered, xml_attrs, ns_unused_inherited)
-        for c in _children(node):
-            _implementation.handlers[c.nodeType](self, c)
-        self.state = state
+    def digest(self):
+        return self.hash.digest()
 
-        if name: W('</%s>' % name)
-    handlers[Node.ELEMENT_NODE] = _do_element
+    def hexdigest(self):
+        return self.hash.hexdigest()
 
 
 def Canonicalize(node, output=None, **kw):
     '''Canonicalize(node, output=None, **kw) -> UTF-8
 
     Canonicalize a DOM document/element node and all descendents.
-    Return the text; if output is specified then output.write will
-    be called to output the text and None will be returned
+    Return the text (UTF-8 encoded); if output is specified then
+    output.write will be called to output the text (in UTF-8 blocks)
+    and None will be returned
     Keyword parameters:
         nsdict: a dictionary of prefix:uri namespace entries
                 assumed to exist in the surrounding context
@@ -426,8 +353,17 @@ def Canonicalize(node, output=None, **kw):
                 prefixes that should be inherited.
     '''
     if output:
-        apply(_implementation, (node, output.write), kw)
+        _Canonicalizer(output.write, **kw).run(node)
     else:
-        s = StringIO.StringIO()
-        apply(_implementation, (node, s.write), kw)
-        return s.getvalue()
+        chunks = []
+        _Canonicalizer(chunks.append, **kw).run(node)
+        return b''.join(chunks)
+
+
+def digest(node, algorithm='sha1', **kw):
+    '''digest(node, algorithm='sha1', **kw) -> bytes
+
+    Return the hash digest of the canonical form, see Canonicalize.'''
+    sink = HashSink(algorithm)
+    Canonicalize(node, sink, **kw)
+    return sink.digest()
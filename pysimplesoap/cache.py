@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Compiled WSDL cache (parsed services stored by content hash) and LRU caches"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from . import __author__, __copyright__, __license__, __version__
+
+log = logging.getLogger(__name__)
+
+
+def digest(data):
+    "Return the hex digest used for the cache keys"
+    if isinstance(data, unicode):
+        data = data.encode('utf8')
+    return hashlib.sha1(data).hexdigest()
+
+
+class Fetched(list):
+    """Documents downloaded while parsing a WSDL: [(url, digest)]
+
+    Passed as the cache argument to helpers.fetch, that records each
+    document instead of storing it (so the content hash is always fresh).
+    """
+
+    def record(self, url, xml):
+        self.append((url, digest(xml)))
+
+
+class WsdlCache(object):
+    """Persistent cache of parsed WSDL (services map) shared by processes
+
+    Two kinds of files are written in the directory (atomically, renaming a
+    temporary file, so concurrent readers never see partial contents):
+
+    * <md5(url)>.idx: the index with the documents fetched (the WSDL and
+      every import) and their digests, pointing to the compiled entry
+    * <content key>.wsdlc: the compiled services (binary pickle), keyed by
+      a hash of the library version, options and all the document digests
+
+    By default the index is trusted (i.e. precompiled at deploy time), so a
+    cached load does not touch the network. If validate is True (opt-in),
+    the documents are downloaded (not parsed) again on load and the compiled
+    entry is only used if none of them has changed.
+    """
+
+    def __init__(self, directory='.', validate=False):
+        self.directory = directory
+        self.validate = validate
+
+    def key(self, url, soap_server=None):
+        "Return the index file name for the url"
+        key = '%s|%s' % (url, soap_server or '')
+        return os.path.join(self.directory,
+                            '%s.idx' % hashlib.md5(key.encode('utf8')).hexdigest())
+
+    def content_key(self, url, soap_server, documents):
+        "Return the compiled entry file name for the fetched documents"
+        key = [__version__, url, soap_server or '']
+        key.extend(['%s %s' % document for document in documents])
+        return os.path.join(self.directory, '%s.wsdlc' % digest('\n'.join(key)))
+
+    def load(self, url, soap_server=None, fetch=None):
+        """Return the compiled entry (dict) or None if missing or outdated
+
+        fetch(url) should return the current content of a document, it is
+        used to check the digests (if validate is enabled).
+        """
+        index = self.read(self.key(url, soap_server))
+        if not index or index.get('version') != __version__ or index.get('url') != url:
+            return None
+        documents = index['documents']
+        if self.validate and fetch:
+            try:
+                current = [(location, digest(fetch(location))) for location, _ in documents]
+            except Exception as e:
+                log.warning('Unable to check cached wsdl documents: %s' % e)
+                return None
+            if current != documents:
+                log.debug('WSDL documents changed, discarding %s' % index['key'])
+                return None
+        entry = self.read(os.path.join(self.directory, index['key']))
+        if entry and entry.get('url') == url:
+            return entry
+        return None
+
+    def store(self, url, soap_server, documents, entry):
+        "Save the compiled entry and the index pointing to it"
+        # the documents may be fetched concurrently (in any order):
+        documents = sorted(set(documents))
+        filename = self.content_key(url, soap_server, documents)
+        entry = dict(entry, version=__version__, url=url)
+        index = {'version': __version__, 'url': url, 'documents': documents,
+                 'key': os.path.basename(filename)}
+        # write the content first, the index makes it visible:
+        self.write(filename, entry)
+        self.write(self.key(url, soap_server), index)
+        return filename
+
+    def read(self, filename):
+        "Unpickle a cache file (None if it doesn't exist or is invalid)"
+        try:
+            f = open(filename, 'rb')
+        except IOError:
+            return None
+        try:
+            log.debug('Unpickle file %s' % (filename, ))
+            return pickle.loads(f.read())
+        except Exception as e:
+            log.warning('Discarding invalid cache file %s: %s' % (filename, e))
+            return None
+        finally:
+            f.close()
+
+    def write(self, filename, obj):
+        "Pickle an object to a file atomically"
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # created by another process
+                pass
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+            finally:
+                f.close()
+            replace(tmp, filename)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+
+if hasattr(os, 'replace'):
+    replace = os.replace
+else:
+    def replace(src, dst):
+        # python 2: rename is atomic on posix but fails on windows if dst exists
+        try:
+            os.rename(src, dst)
+        except OSError:
+            os.remove(dst)
+            os.rename(src, dst)
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache of objects built on demand (bounded size)
+
+    Entries older than ttl seconds (if given) are built again. Only one
+    thread builds a given entry, the others wait for it.
+    """
+    clock = staticmethod(time.time)
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__entries = OrderedDict()  # key: (time, value), least recently used first
+        self.__building = {}            # key: lock held while building
+        self.__lock = threading.Lock()
+
+    def __fresh(self, key):
+        "Return the entry (moved to the end) or None if missing or expired"
+        entry = self.__entries.pop(key, None)
+        if entry is not None and (self.ttl is None or self.clock() - entry[0] < self.ttl):
+            self.__entries[key] = entry
+            return entry
+
+    def get(self, key, build):
+        "Return the value for the key, calling build() if not cached"
+        while True:
+            with self.__lock:
+                entry = self.__fresh(key)
+                if entry is not None:
+                    return entry[1]
+                lock = self.__building.get(key)
+                if lock is None:
+                    lock = self.__building[key] = threading.Lock()
+                    lock.acquire()
+                    break
+            # another thread is building the value, wait and check again:
+            with lock:
+                pass
+        try:
+            value = build()
+            with self.__lock:
+                self.__entries[key] = (self.clock(), value)
+                while len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last=False)
+            return value
+        finally:
+            with self.__lock:
+                del self.__building[key]
+            lock.release()
+
+    def __contains__(self, key):
+        with self.__lock:
+            return self.__fresh(key) is not None
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def clear(self):
+        "Discard all the entries"
+        with self.__lock:
+            self.__entries.clear()
+
+
+class WsdlRegistry(LRUCache):
+    """Process-wide LRU registry of parsed WSDL models shared by clients
+
+    The models (services map, namespace, documentation and elements) are
+    built once per key and must be considered read-only: per-client state
+    (location, action, namespace, service port) is kept by each SoapClient.
+    Only one thread builds a given model, the others wait for it.
+    """
+
+    def __init__(self, maxsize=32):
+        LRUCache.__init__(self, maxsize)
+
+
+def source_key(source):
+    """Return a cache key for a key / certificate given as content or path
+
+    Files are identified by path, modification time and size (so a
+    replaced file is loaded again), contents by their digest.
+    """
+    if isinstance(source, bytes) and (b'\0' in source or b'\n' in source) or \
+            isinstance(source, unicode) and '\n' in source:
+        return 'content', digest(source)
+    try:
+        stat = os.stat(source)
+    except (OSError, TypeError, ValueError):
+        return 'content', digest(source)
+    return 'file', os.path.abspath(source), stat.st_mtime, stat.st_size
+
+
+# default registry (SoapClient shared_wsdl=True)
+wsdl_registry = WsdlRegistry()
+
+
+def main(argv=None):
+    "Precompile the WSDL urls given in the command line (i.e. at deploy time)"
+    import getopt
+    from .client import SoapClient
+    opts, urls = getopt.getopt(sys.argv[1:] if argv is None else argv, 'd:s:b:',
+                               ['directory=', 'soap-server=', 'wsdl-basedir='])
+    opts = dict(opts)
+    if not urls:
+        sys.stderr.write('usage: python -m pysimplesoap.cache [-d directory] '
+                         '[-s soap_server] [-b wsdl_basedir] url...\n')
+        return 2
+    # check the documents, so a deploy refreshes outdated entries:
+    cache = WsdlCache(opts.get('-d', opts.get('--directory', '.')), validate=True)
+    soap_server = opts.get('-s', opts.get('--soap-server'))
+    for url in urls:
+        # parse (or check) the wsdl and store the compiled entry:
+        SoapClient(wsdl=url, cache=cache, soap_server=soap_server,
+                   wsdl_basedir=opts.get('-b', opts.get('--wsdl-basedir', '')))
+        sys.stdout.write('%s: %s\n' % (url, cache.key(url, soap_server)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,26 +15,34 @@
 from __future__ import unicode_literals
 import sys
 if sys.version > '3':
-    unicode = str
+    basestring = unicode = str
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
 import copy
-import hashlib
+import itertools
 import logging
 import os
 import tempfile
+import threading
 import warnings
 
+try:
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+except ImportError:
+    ThreadPoolExecutor = None   # python 2 without futures: call sequentially
+
 from . import __author__, __copyright__, __license__, __version__, TIMEOUT
 from .simplexml import SimpleXMLElement, TYPE_MAP, REVERSE_TYPE_MAP, Struct
-from .transport import get_http_wrapper, set_http_wrapper, get_Http
+from .transport import get_http_wrapper, set_http_wrapper, get_Http, \
+                       compress, decompress, DecompressingStream, CONTENT_ENCODINGS
+from .templates import EnvelopeTemplate, UnsupportedValue
+from .plans import UnmarshallPlan, MarshallPlan
+from .stream import StreamUnmarshaller
+from .cache import WsdlCache, Fetched, WsdlRegistry, wsdl_registry
 # Utility functions used throughout wsdl_parse, moved aside for readability
 from .helpers import Alias, fetch, sort_dict, make_key, process_element, \
                      postprocess_element, get_message, preprocess_schema, \
-                     get_local_name, get_namespace_prefix, TYPE_MAP, urlsplit
+                     get_local_name, get_namespace_prefix, TYPE_MAP, urlsplit, \
+                     fetch_all, prefetch_schemas
 from .wsse import UsernameToken
 
 log = logging.getLogger(__name__)
@@ -71,19 +79,97 @@ soap_namespaces = dict(
 )
 
 
+# versions of the values set for the client (see CallState)
+_versions = itertools.count(1)
+
+
+class CallContext(threading.local):
+    """State of the calls in progress in the current thread"""
+    call_headers = None         # Struct to be marshalled for RPC Call
+    params_plan = None          # MarshallPlan for the next call parameters
+    defer_checks = False        # return the plugin checks instead of waiting
+    checks = ()                 # futures returned by the plugins (last response)
+
+    def __init__(self, versions=None):
+        # name: version of the client value (shared by all the threads)
+        self.__dict__['versions'] = {} if versions is None else versions
+        # name: version of the client value replaced by the thread value
+        self.__dict__['replaced'] = {}
+
+    def __setattr__(self, name, value):
+        self.replaced[name] = self.versions.get(name, 0)
+        threading.local.__setattr__(self, name, value)
+
+
+class CallState(object):
+    """SoapClient attribute with a per-thread value for the current call
+
+    Setting the attribute changes the value shared by all the threads (i.e.
+    configuration); the calls store their values in the CallContext, so a
+    client can be used concurrently from several threads. The thread values
+    are valid until the attribute is set again (from any thread).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        context = client.call_context
+        if self.name in context.__dict__:
+            if context.replaced[self.name] == context.versions.get(self.name, 0):
+                return context.__dict__[self.name]
+            # outdated (set for the client after the call):
+            context.__dict__.pop(self.name, None)
+        try:
+            return client.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, client, value):
+        client.__dict__[self.name] = value
+        client.call_context.versions[self.name] = next(_versions)
+
+
 class SoapClient(object):
     """Simple SOAP Client (simil PHP)"""
+
+    # per call (thread) values, see CallContext:
+    action = CallState('action')
+    namespace = CallState('namespace')
+    qualified = CallState('qualified')
+    xml_request = CallState('xml_request')
+    xml_response = CallState('xml_response')
+    response = CallState('response')
+    content = CallState('content')
+
     def __init__(self, location=None, action=None, namespace=None,
                  cert=None, exceptions=True, proxy=None, ns=None,
                  soap_ns=None, wsdl=None, wsdl_basedir='', cache=False, cacert=None,
                  sessions=False, soap_server=None, timeout=TIMEOUT,
                  http_headers=None, trace=False,
                  username=None, password=None,
-                 key_file=None, plugins=None, strict=True,
+                 key_file=None, plugins=None, strict=True, compiled=False,
+                 shared_wsdl=False, wsdl_workers=8, compress=None,
+                 accept_encoding=None,
                  ):
         """
         :param http_headers: Additional HTTP Headers; example: {'Host': 'ipsec.example.com'}
+        :param compress: Content-Encoding of the requests ('gzip', 'deflate'
+          or True for gzip); the server must accept compressed requests
+        :param accept_encoding: Accept-Encoding to ask compressed responses
+          (i.e. 'gzip', or True for 'gzip, deflate'), decompressed on arrival
+        :param compiled: Use cached envelope templates and write the parameters
+          directly (without building a DOM) when possible, and convert the
+          WSDL parameters and responses with cached plans (see plans.py)
+        :param shared_wsdl: Reuse the WSDL model already parsed in this process
+          for the same url (True: default registry, or a WsdlRegistry);
+          the shared services map should not be modified.
+        :param wsdl_workers: Number of threads to download the WSDL and XSD
+          imports concurrently (0 or 1 to fetch them one at a time)
         """
+        self.call_context = CallContext({})
         self.certssl = cert
         self.keyssl = key_file
         self.location = location        # server location (url)
@@ -91,9 +177,17 @@ class SoapClient(object):
         self.namespace = namespace      # message
         self.exceptions = exceptions    # lanzar execpiones? (Soap Faults)
         self.xml_request = self.xml_response = ''
+        self.response = self.content = None
+        self.qualified = None
         self.http_headers = http_headers or {}
         self.plugins = plugins or []
         self.strict = strict
+        self.compiled = compiled
+        self.compress = 'gzip' if compress is True else compress
+        self.accept_encoding = 'gzip, deflate' if accept_encoding is True else accept_encoding
+        self.__templates = {}       # (method, namespace): EnvelopeTemplate
+        self.__plans = {}           # (method, strict): UnmarshallPlan
+        self.__marshall_plans = {}  # method: MarshallPlan
         # extract the base directory / url for wsdl relative imports:
         if wsdl and wsdl_basedir == '':
             # parse the wsdl url, strip the scheme and filename
@@ -101,6 +195,7 @@ class SoapClient(object):
             wsdl_basedir = os.path.dirname(netloc + path)
 
         self.wsdl_basedir = wsdl_basedir
+        self.wsdl_workers = wsdl_workers
 
         # shortcut to print all debugging info and sent / received xml messages
         if trace:
@@ -123,7 +218,6 @@ class SoapClient(object):
 
         # SOAP Header support
         self.__headers = {}         # general headers
-        self.__call_headers = None  # Struct to be marshalled for RPC Call
 
         # check if the Certification Authority Cert is a string and store it
         if cacert and cacert.startswith('-----BEGIN CERTIFICATE-----'):
@@ -134,16 +228,25 @@ class SoapClient(object):
             cacert = filename
             f.close()
         self.cacert = cacert
+        # serialize the requests if the transport is not thread safe:
+        self.__http_lock = threading.Lock()
 
         # Create HTTP wrapper
         Http = get_Http()
-        self.http = Http(timeout=timeout, cacert=cacert, proxy=proxy, sessions=sessions)
-        if username and password:
-            if hasattr(self.http, 'add_credentials'):
-                self.http.add_credentials(username, password)
-        if cert and key_file:
-            if hasattr(self.http, 'add_certificate'):
-                self.http.add_certificate(key=key_file, cert=cert, domain='')
+
+        def create_http():
+            http = Http(timeout=timeout, cacert=cacert, proxy=proxy, sessions=sessions)
+            if username and password:
+                if hasattr(http, 'add_credentials'):
+                    http.add_credentials(username, password)
+            if cert and key_file:
+                if hasattr(http, 'add_certificate'):
+                    http.add_certificate(key=key_file, cert=cert, domain='')
+            return http
+
+        self.http = create_http()
+        # additional connections (i.e. threads fetching the wsdl imports):
+        self.create_http = create_http
 
 
         # namespace prefix, None to use xmlns attribute or False to not use it:
@@ -165,8 +268,13 @@ class SoapClient(object):
 <%(soap_ns)s:Header/>
 <%(soap_ns)s:Body><%(ns)s:%(method)s></%(ns)s:%(method)s></%(soap_ns)s:Body></%(soap_ns)s:Envelope>"""
 
-        # parse wsdl url
-        self.services = wsdl and self.wsdl_parse(wsdl, cache=cache)
+        # parse wsdl url (or bind to the shared model)
+        if wsdl and shared_wsdl is True:
+            self.services = self.wsdl_bind(wsdl_registry, wsdl, cache=cache)
+        elif wsdl and isinstance(shared_wsdl, WsdlRegistry):
+            self.services = self.wsdl_bind(shared_wsdl, wsdl, cache=cache)
+        else:
+            self.services = wsdl and self.wsdl_parse(wsdl, cache=cache)
         self.service_port = None                 # service port for late binding
 
     def __getattr__(self, attr):
@@ -176,6 +284,11 @@ class SoapClient(object):
         else:  # using WSDL:
             return lambda *args, **kwargs: self.wsdl_call(attr, *args, **kwargs)
 
+    @property
+    def soap_uri(self):
+        """SOAP envelope namespace URI (according the soap_ns prefix)"""
+        return soap_namespaces[self.__soap_ns]
+
     def call(self, method, *args, **kwargs):
         """Prepare xml request and make SOAP call, returning a SimpleXMLElement.
 
@@ -183,25 +296,55 @@ class SoapClient(object):
         SimpleXMLElement object, then these headers will be inserted into the
         request.
         """
+        soap_uri = soap_namespaces[self.__soap_ns]
+        context = self.call_context
+        context.xml_request = self._build_request(method, args, kwargs, soap_uri)
+        context.xml_response = self.send(method, context.xml_request)
+        return self._parse_response(method, context.xml_response,
+                                    args, kwargs, soap_uri)
+
+    def _build_request(self, method, args, kwargs, soap_uri):
+        """Serialize the parameters and headers, returning the xml request"""
         #TODO: method != input_message
         # Basic SOAP request:
-        soap_uri = soap_namespaces[self.__soap_ns]
-        xml = self.__xml % dict(method=method,              # method tag name
-                                namespace=self.namespace,   # method ns uri
-                                ns=self.__ns,               # method ns prefix
-                                soap_ns=self.__soap_ns,     # soap prefix & uri
-                                soap_uri=soap_uri)
-        request = SimpleXMLElement(xml, namespace=self.__ns and self.namespace,
-                                        prefix=self.__ns)
-
         request_headers = kwargs.pop('headers', None)
+        context = self.call_context
+        # parameters not sorted yet (see wsdl_call_get_params):
+        plan, context.params_plan = context.params_plan, None
 
         # serialize parameters
         if kwargs:
             parameters = list(kwargs.items())
         else:
             parameters = args
-        if parameters and isinstance(parameters[0], SimpleXMLElement):
+        raw = parameters and isinstance(parameters[0], SimpleXMLElement)
+        use_ns = None if (self.__soap_server == "jetty" or self.qualified is False) else True
+
+        # construct header and parameters (if not wsdl given) except wsse
+        if self.__headers and not self.services:
+            context.call_headers = dict([(k, v) for k, v in self.__headers.items()
+                                        if not k.startswith('wsse:')])
+        # always extract WS Security header and send it (backward compatible)
+        if 'wsse:Security' in self.__headers and not self.plugins:
+            warnings.warn("Replace wsse:Security with UsernameToken plugin",
+                          DeprecationWarning)
+            self.plugins.append(UsernameToken())
+
+        # fast path: write the parameters in the cached envelope (no DOM)
+        if (self.compiled and not raw and not self.plugins and
+                not context.call_headers and not request_headers and
+                (parameters or self.__soap_server not in ('jbossas6',))):
+            try:
+                return self.get_template(method).render(parameters, use_ns, plan)
+            except UnsupportedValue as e:
+                log.debug("Using DOM to serialize the request: %s" % e)
+        if plan and parameters and not raw:
+            parameters = plan.sort(parameters)
+
+        request = SimpleXMLElement(self._envelope_xml(method),
+                                   namespace=self.__ns and self.namespace,
+                                   prefix=self.__ns)
+        if raw:
             body = request('Body', ns=list(soap_namespaces.values()),)
             # remove default body parameter (method name)
             delattr(body, method)
@@ -209,7 +352,6 @@ class SoapClient(object):
             body.import_node(parameters[0])
         elif parameters:
             # marshall parameters:
-            use_ns = None if (self.__soap_server == "jetty" or self.qualified is False) else True
             for k, v in parameters:  # dict: tag=valor
                 if hasattr(v, "namespaces") and use_ns:
                     ns = v.namespaces.get(None, True)
@@ -220,19 +362,9 @@ class SoapClient(object):
             # JBossAS-6 requires no empty method parameters!
             delattr(request("Body", ns=list(soap_namespaces.values()),), method)
 
-        # construct header and parameters (if not wsdl given) except wsse
-        if self.__headers and not self.services:
-            self.__call_headers = dict([(k, v) for k, v in self.__headers.items()
-                                        if not k.startswith('wsse:')])
-        # always extract WS Security header and send it (backward compatible)
-        if 'wsse:Security' in self.__headers and not self.plugins:
-            warnings.warn("Replace wsse:Security with UsernameToken plugin",
-                          DeprecationWarning)
-            self.plugins.append(UsernameToken())
-
-        if self.__call_headers:
+        if context.call_headers:
             header = request('Header', ns=list(soap_namespaces.values()),)
-            for k, v in self.__call_headers.items():
+            for k, v in context.call_headers.items():
                 ##if not self.__ns:
                 ##    header['xmlns']
                 if isinstance(v, SimpleXMLElement):
@@ -252,11 +384,71 @@ class SoapClient(object):
             plugin.preprocess(self, request, method, args, kwargs,
                                     self.__headers, soap_uri)
 
-        self.xml_request = request.as_xml()
-        self.xml_response = self.send(method, self.xml_request)
-        response = SimpleXMLElement(self.xml_response, namespace=self.namespace,
+        return request.as_xml()
+
+    def _envelope_xml(self, method):
+        """Return the basic SOAP request xml for the method"""
+        return self.__xml % dict(method=method,              # method tag name
+                                 namespace=self.namespace,   # method ns uri
+                                 ns=self.__ns,               # method ns prefix
+                                 soap_ns=self.__soap_ns,     # soap prefix & uri
+                                 soap_uri=soap_namespaces[self.__soap_ns])
+
+    def get_template(self, method):
+        """Return the cached envelope template for the method (compile it if needed)"""
+        key = (method, self.namespace)
+        template = self.__templates.get(key)
+        if template is None:
+            template = EnvelopeTemplate(self._envelope_xml(method), method,
+                                        namespace=self.__ns and self.namespace,
+                                        prefix=self.__ns)
+            self.__templates[key] = template
+        return template
+
+    def get_marshall_plan(self, method, input):
+        """Return the cached marshall plan for the method input types"""
+        plan = self.__marshall_plans.get(method)
+        if plan is None or plan.input is not input:
+            plan = MarshallPlan(input)
+            self.__marshall_plans[method] = plan
+        return plan
+
+    def get_unmarshall_plan(self, method, output):
+        """Return the cached unmarshall plan for the method output types"""
+        key = (method, self.strict)
+        plan = self.__plans.get(key)
+        if plan is None or plan.types is not output:
+            plan = UnmarshallPlan(output, strict=self.strict)
+            self.__plans[key] = plan
+        return plan
+
+    def _parse_response(self, method, xml_response, args, kwargs, soap_uri):
+        """Parse the xml response, check for faults and run the plugins"""
+        response = SimpleXMLElement(xml_response, namespace=self.namespace,
                                     jetty=self.__soap_server in ('jetty',))
-        if self.exceptions and response("Fault", ns=list(soap_namespaces.values()), error=False):
+        if self.exceptions:
+            self._check_fault(method, response)
+
+        # do post-processing using plugins (i.e. WSSE signature verification),
+        # they can return a future (i.e. check running in other process)
+        checks = []
+        for plugin in self.plugins:
+            check = plugin.postprocess(self, response, method, args, kwargs,
+                                       self.__headers, soap_uri)
+            if check is not None:
+                checks.append(check)
+        if self.call_context.defer_checks:
+            # the caller waits for them (see call_many)
+            self.call_context.checks = checks
+        else:
+            for check in checks:
+                check.result()
+
+        return response
+
+    def _check_fault(self, method, response):
+        """Raise a SoapFault if the response has a Fault element"""
+        if response("Fault", ns=list(soap_namespaces.values()), error=False):
             detailXml = response("detail", ns=list(soap_namespaces.values()), error=False)
             detail = None
 
@@ -275,16 +467,43 @@ class SoapClient(object):
                             unicode(response.faultstring),
                             detail)
 
-        # do post-processing using plugins (i.e. WSSE signature verification)
-        for plugin in self.plugins:
-            plugin.postprocess(self, response, method, args, kwargs,
-                                     self.__headers, soap_uri)
+    def send(self, method, xml, stream=False):
+        """Send SOAP request using HTTP
 
-        return response
-
-    def send(self, method, xml):
-        """Send SOAP request using HTTP"""
+        :param stream: return a file-like object to read the response content
+        """
         if self.location == 'test': return
+        location, http_method, headers = self._http_request(method, xml)
+        body = self._encode_request(xml, headers)
+
+        supports_feature = getattr(self.http, 'supports_feature', None)
+        if supports_feature and supports_feature('threadsafe'):
+            lock = None
+        else:
+            lock = self.__http_lock
+            lock.acquire()
+        try:
+            if stream:
+                response, content = self.http.request_stream(
+                    location, http_method, body=body, headers=headers)
+            else:
+                response, content = self.http.request(
+                    location, http_method, body=body, headers=headers)
+        finally:
+            if lock:
+                lock.release()
+        content = self._decode_response(response, content, stream)
+        context = self.call_context
+        context.response = response
+        context.content = content
+
+        log.debug('\n'.join(["%s: %s" % (k, v) for k, v in response.items()]))
+        if not stream:
+            log.debug(content)
+        return content
+
+    def _http_request(self, method, xml):
+        """Return the location, HTTP method and headers to send the request"""
         # location = '%s' % self.location #?op=%s" % (self.location, method)
         http_method = str('POST')
         location = str(self.location)
@@ -301,6 +520,10 @@ class SoapClient(object):
 
         if self.action is not None:
             headers['SOAPAction'] = '"' + soap_action + '"'
+        if self.compress:
+            headers['Content-Encoding'] = self.compress
+        if self.accept_encoding:
+            headers['Accept-Encoding'] = self.accept_encoding
 
         headers.update(self.http_headers)
         log.info("POST %s" % location)
@@ -313,15 +536,26 @@ class SoapClient(object):
 
             # httplib in python3 do the same inside itself, don't need to convert it here
             headers = dict((str(k), str(v)) for k, v in headers.items())
-
-        response, content = self.http.request(
-            location, http_method, body=xml, headers=headers)
-        self.response = response
-        self.content = content
-
-        log.debug('\n'.join(["%s: %s" % (k, v) for k, v in response.items()]))
-        log.debug(content)
-        return content
+        return location, http_method, headers
+
+    def _encode_request(self, xml, headers):
+        """Return the body to send (compressed according the headers)"""
+        encoding = headers.get(str('Content-Encoding'))
+        if encoding:
+            if not isinstance(xml, bytes):
+                xml = xml.encode('utf-8')
+            xml = compress(xml, encoding)
+            headers[str('Content-length')] = str(len(xml))
+        return xml
+
+    def _decode_response(self, response, content, stream=False):
+        """Decompress the response content (if the transport did not)"""
+        encoding = (response.get('content-encoding') or '').strip().lower()
+        if encoding not in CONTENT_ENCODINGS:
+            return content
+        if stream:
+            return DecompressingStream(content, encoding)
+        return decompress(content, encoding)
 
     def get_operation(self, method):
         # try to find operation in wsdl file
@@ -353,29 +587,188 @@ class SoapClient(object):
     def wsdl_call_with_args(self, method, args, kwargs):
         """Pre and post process SOAP call, input and output parameters using WSDL"""
         soap_uri = soap_namespaces[self.__soap_ns]
+        method, params, output = self._wsdl_prepare(method, args, kwargs)
+
+        # call remote procedure
+        response = self.call(method, *params)
+        return self._wsdl_result(method, response, output, soap_uri)
+
+    def call_many(self, method, calls, concurrency=4, ordered=True,
+                  max_pending=None, progress=None):
+        """Call a method for each kwargs dict of calls, concurrently (generator)
+
+        Results (or SoapFault exceptions) are yielded in the input order, or
+        as (index, result) when they complete if not ordered; other errors
+        are raised. The calls are consumed lazily: at most max_pending are
+        submitted ahead of the consumer (back-pressure). progress(done,
+        submitted) is called when each call finishes.
+        Use a thread safe transport (i.e. pooled) to send them concurrently.
+        Checks returned by the plugins as futures (i.e. signature verification
+        in a process pool) are waited when each result is yielded, so they
+        run while the next calls are sent. Sequentially (concurrency < 2),
+        the next call is only sent ahead of the consumer (one call) if
+        max_pending > 1.
+        """
+        if self.services:
+            # bind the operation (service port, location) once:
+            self.get_operation(method)
+
+            def run(kwargs):
+                return self.wsdl_call_with_args(method, (), dict(kwargs))
+        else:
+            def run(kwargs):
+                return self.call(method, **kwargs)
+
+        def execute(kwargs):
+            "Return the result (or fault) and the pending plugin checks"
+            context = self.call_context
+            context.defer_checks, context.checks = True, ()
+            try:
+                return run(kwargs), context.checks
+            except SoapFault as e:
+                return e, ()
+            finally:
+                context.defer_checks, context.checks = False, ()
+
+        def finish(index, result, checks):
+            "Wait for the checks of the result (their errors are raised)"
+            for check in checks:
+                check.result()
+            return result if ordered else (index, result)
+
+        if ThreadPoolExecutor is None or concurrency < 2:
+            lookahead = (max_pending or 1) > 1
+            checking = None     # previous result (checked while sending the next)
+            for index, kwargs in enumerate(calls):
+                try:
+                    result, checks = execute(kwargs)
+                except Exception as e:
+                    # the previous result comes first (in order)
+                    if checking:
+                        yield finish(*checking)
+                    raise e
+                if progress:
+                    progress(index + 1, index + 1)
+                if checking:
+                    yield finish(*checking)
+                    checking = None
+                if checks and lookahead:
+                    checking = index, result, checks
+                else:
+                    yield finish(index, result, checks)
+            if checking:
+                yield finish(*checking)
+            return
+
+        max_pending = max(max_pending or concurrency * 2, 1)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        calls = iter(calls)
+        pending = {}                # future: index
+        completed = {}              # index: result, checks, error (yielded in order)
+        submitted = done = next_index = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) + len(completed) < max_pending:
+                    try:
+                        kwargs = next(calls)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(execute, kwargs)] = submitted
+                    submitted += 1
+                if next_index in completed:
+                    result, checks, error = completed.pop(next_index)
+                    if error is not None:
+                        # raised in order (after the previous results)
+                        raise error
+                    yield finish(next_index, result, checks)
+                    next_index += 1
+                    continue
+                if not pending:
+                    break
+                finished, not_finished = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = pending.pop(future)
+                    try:
+                        result, checks = future.result()
+                        error = None
+                    except Exception as e:
+                        result, checks, error = None, (), e
+                    done += 1
+                    if progress:
+                        progress(done, submitted)
+                    if ordered:
+                        completed[index] = result, checks, error
+                    elif error is not None:
+                        raise error
+                    else:
+                        yield finish(index, result, checks)
+        finally:
+            # stopped by the consumer (or an error): do not start the rest
+            for future in pending:
+                future.cancel()
+            executor.shutdown()
+
+    def _wsdl_result(self, method, response, output, soap_uri):
+        """Convert the response body using the WSDL output types"""
+        body = response('Body', ns=soap_uri).children()
+        if self.compiled:
+            resp = self.get_unmarshall_plan(method, output)(body)
+        else:
+            resp = body.unmarshall(output, strict=self.strict)
+        return resp and list(resp.values())[0]  # pass Response tag children
+
+    def wsdl_call_stream(self, method, *args, **kwargs):
+        """Call a WSDL operation, converting the response while it is read
+
+        Arrays in the response are returned as generators (see
+        StreamUnmarshaller), so large result sets can be processed record by
+        record without loading the whole document in memory.
+        """
+        soap_uri = soap_namespaces[self.__soap_ns]
+        for plugin in self.plugins:
+            if not isinstance(plugin, UsernameToken):
+                # i.e. signature verification needs the whole document
+                raise RuntimeError("Plugin %s not supported when streaming" % plugin)
+        method, params, output = self._wsdl_prepare(method, args, kwargs)
+        params = tuple(params or ())
+        context = self.call_context
+        context.xml_request = self._build_request(method, params, {}, soap_uri)
+        context.xml_response = None
+        # blocking HTTP transport (also for AsyncSoapClient, see aio.py)
+        content = SoapClient.send(self, method, context.xml_request, stream=True)
+
+        def on_fault(xml):
+            if self.exceptions:
+                self._check_fault(method, SimpleXMLElement(xml, namespace=self.namespace))
+
+        unmarshaller = StreamUnmarshaller(content, output, strict=self.strict,
+                                          on_fault=on_fault)
+        resp = unmarshaller.unmarshall()
+        return resp and list(resp.values())[0]  # pass Response tag children
+
+    def _wsdl_prepare(self, method, args, kwargs):
+        """Return the method name, parameters and output types for the call"""
         operation = self.get_operation(method)
 
         # get i/o type declarations:
         input = operation['input']
         output = operation['output']
         header = operation.get('header')
+        context = self.call_context
         if 'action' in operation:
-            self.action = operation['action']
+            context.action = operation['action']
 
         if 'namespace' in operation:
-            self.namespace = operation['namespace'] or ''
-            self.qualified = operation['qualified']
+            context.namespace = operation['namespace'] or ''
+            context.qualified = operation['qualified']
 
         # construct header and parameters
         if header:
-            self.__call_headers = sort_dict(header, self.__headers)
+            context.call_headers = sort_dict(header, self.__headers)
         method, params = self.wsdl_call_get_params(method, input, args, kwargs)
-
-        # call remote procedure
-        response = self.call(method, *params)
-        # parse results:
-        resp = response('Body', ns=soap_uri).children().unmarshall(output, strict=self.strict)
-        return resp and list(resp.values())[0]  # pass Response tag children
+        return method, params, output
 
     def wsdl_call_get_params(self, method, input, args, kwargs):
         """Build params from input and args/kwargs"""
@@ -404,17 +797,23 @@ class SoapClient(object):
             valid, errors, warnings = self.wsdl_validate_params(input, all_args)
             if not valid:
                 raise ValueError('Invalid Args Structure. Errors: %s' % errors)
-            # sort and filter parameters according to wsdl input structure
-            tree = sort_dict(input, all_args)
-            root = list(tree.values())[0]
-            params = []
-            # make a params tuple list suitable for self.call(method, *params)
-            for k, v in root.items():
-                # fix referenced namespaces as info is lost when calling call
-                root_ns = root.namespaces[k]
-                if not root.references[k] and isinstance(v, Struct):
-                    v.namespaces[None] = root_ns
-                params.append((k, v))
+            if self.compiled:
+                # parameters will be sorted and written by the plan:
+                plan = self.get_marshall_plan(method, input)
+                params = plan.parameters(all_args[inputname])
+                self.call_context.params_plan = plan
+            else:
+                # sort and filter parameters according to wsdl input structure
+                tree = sort_dict(input, all_args)
+                root = list(tree.values())[0]
+                params = []
+                # make a params tuple list suitable for self.call(method, *params)
+                for k, v in root.items():
+                    # fix referenced namespaces as info is lost when calling call
+                    root_ns = root.namespaces[k]
+                    if not root.references[k] and isinstance(v, Struct):
+                        v.namespaces[None] = root_ns
+                    params.append((k, v))
             # TODO: check style and document attributes
             if self.__soap_server in ('axis', ):
                 # use the operation name
@@ -540,7 +939,21 @@ class SoapClient(object):
         self.namespace = ""
         self.documentation = unicode(wsdl('documentation', error=False)) or ''
 
-        # some wsdl are split down in several files, join them:
+        # some wsdl are split down in several files, download them at once:
+        imports = [(element['location'], self.wsdl_basedir, None)
+                   for element in wsdl.children() or []
+                   if element.get_local_name() in ('import') and element['location']]
+        local = threading.local()
+
+        def load(location, basedir):
+            http = getattr(local, 'http', None)
+            if http is None:
+                http = local.http = self.create_http()
+            return fetch(location, http, cache, force_download, basedir, self.http_headers)
+
+        documents = fetch_all(imports, load, workers=self.wsdl_workers)
+
+        # join them:
         imported_wsdls = {}
         for element in wsdl.children() or []:
             if element.get_local_name() in ('import'):
@@ -555,7 +968,9 @@ class SoapClient(object):
                 imported_wsdls[wsdl_location] = wsdl_namespace
                 log.debug('Importing wsdl %s from %s' % (wsdl_namespace, wsdl_location))
                 # Open uri and read xml:
-                xml = fetch(wsdl_location, self.http, cache, force_download, self.wsdl_basedir, self.http_headers)
+                xml = documents.get((wsdl_location, self.wsdl_basedir))
+                if xml is None:
+                    xml = fetch(wsdl_location, self.http, cache, force_download, self.wsdl_basedir, self.http_headers)
                 # Parse imported XML schema (recursively):
                 imported_wsdl = SimpleXMLElement(xml, namespace=self.xsd_uri)
                 # merge the imported wsdl into the main document:
@@ -607,14 +1022,22 @@ class SoapClient(object):
         #     </wsdl:types>
         # </wsdl:definitions>
 
+        schemas = []
         for types in wsdl('types', error=False) or []:
             # avoid issue if schema is not given in the main WSDL file
-            schemas = types('schema', ns=self.xsd_uri, error=False)
-            for schema in schemas or []:
-                preprocess_schema(schema, imported_schemas, elements, self.xsd_uri,
-                                  self.__soap_server, self.http, cache,
-                                  force_download, self.wsdl_basedir,
-                                  global_namespaces=global_namespaces)
+            schemas.extend(types('schema', ns=self.xsd_uri, error=False) or [])
+
+        # download all the imported schemas (recursively) before processing:
+        documents = prefetch_schemas(schemas, self.xsd_uri, self.create_http,
+                                     cache, force_download, self.wsdl_basedir,
+                                     self.wsdl_workers)
+
+        for schema in schemas:
+            preprocess_schema(schema, imported_schemas, elements, self.xsd_uri,
+                              self.__soap_server, self.http, cache,
+                              force_download, self.wsdl_basedir,
+                              global_namespaces=global_namespaces,
+                              documents=documents)
 
         # 2nd phase: alias, postdefined elements, extend bases, convert lists
         postprocess_element(elements, [])
@@ -834,51 +1257,62 @@ class SoapClient(object):
         log.debug('Parsing wsdl url: %s' % url)
         # Try to load a previously parsed wsdl:
         force_download = False
+        fetched = False
         if cache:
-            # make md5 hash of the url for caching...
-            filename_pkl = '%s.pkl' % hashlib.md5(url).hexdigest()
-            if isinstance(cache, basestring):
-                filename_pkl = os.path.join(cache, filename_pkl)
-            if os.path.exists(filename_pkl):
-                log.debug('Unpickle file %s' % (filename_pkl, ))
-                f = open(filename_pkl, 'r')
-                pkl = pickle.load(f)
-                f.close()
-                # sanity check:
-                if pkl['version'][:-1] != __version__.split(' ')[0][:-1] or pkl['url'] != url:
-                    warnings.warn('version or url mismatch! discarding cached wsdl', RuntimeWarning)
-                    log.debug('Version: %s %s' % (pkl['version'], __version__))
-                    log.debug('URL: %s %s' % (pkl['url'], url))
-                    force_download = True
-                else:
-                    self.namespace = pkl['namespace']
-                    self.documentation = pkl['documentation']
-                    return pkl['services']
+            if not isinstance(cache, WsdlCache):
+                # directory (or current one) to store the compiled wsdl
+                cache = WsdlCache(cache if isinstance(cache, basestring) else '.')
+
+            def fetch_document(location):
+                return fetch(location, self.http, False, False, self.wsdl_basedir, self.http_headers)
+
+            pkl = cache.load(url, self.__soap_server, fetch_document)
+            if pkl:
+                self.namespace = pkl['namespace']
+                self.documentation = pkl['documentation']
+                self.elements = pkl['elements']
+                return pkl['services']
+            # record the documents downloaded (content hash):
+            fetched = Fetched()
 
         # always return an unicode object:
         REVERSE_TYPE_MAP['string'] = str
 
-        wsdl = self._url_to_xml_tree(url, cache, force_download)
-        services = self._xml_tree_to_services(wsdl, cache, force_download)
+        wsdl = self._url_to_xml_tree(url, fetched, force_download)
+        services = self._xml_tree_to_services(wsdl, fetched, force_download)
 
         # dump the full service/port/operation map
         #log.debug(pprint.pformat(services))
 
         # Save parsed wsdl (cache)
         if cache:
-            f = open(filename_pkl, "wb")
-            pkl = {
-                'version': __version__.split(' ')[0],
-                'url': url,
+            cache.store(url, self.__soap_server, fetched, {
                 'namespace': self.namespace,
                 'documentation': self.documentation,
+                'elements': self.elements,
                 'services': services,
-            }
-            pickle.dump(pkl, f)
-            f.close()
+            })
 
         return services
 
+    def wsdl_bind(self, registry, url, cache=False):
+        """Get the parsed WSDL from the registry (parse it if not found)"""
+        def build():
+            services = self.wsdl_parse(url, cache=cache)
+            return {
+                'namespace': self.namespace,
+                'documentation': self.documentation,
+                'elements': self.elements,
+                'services': services,
+            }
+        # the dialect and base directory change the parsed model:
+        key = (url, self.__soap_server, self.wsdl_basedir)
+        model = registry.get(key, build)
+        self.namespace = model['namespace']
+        self.documentation = model['documentation']
+        self.elements = model['elements']
+        return model['services']
+
     def __setitem__(self, item, value):
         """Set SOAP Header value - this header will be sent for every request."""
         self.__headers[item] = value
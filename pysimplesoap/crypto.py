@@ -0,0 +1,313 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Pluggable cryptographic providers for xmlsec (cryptography, M2Crypto)"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+import binascii
+import hashlib
+import logging
+
+from . import __author__, __copyright__, __license__, __version__
+
+log = logging.getLogger(__name__)
+
+# XML Signature algorithms, name: (uri, key type, hash)
+SIGNATURE_ALGORITHMS = {
+    'rsa-sha1': ("http://www.w3.org/2000/09/xmldsig#rsa-sha1", 'rsa', 'sha1'),
+    'rsa-sha256': ("http://www.w3.org/2001/04/xmldsig-more#rsa-sha256", 'rsa', 'sha256'),
+    'rsa-sha512': ("http://www.w3.org/2001/04/xmldsig-more#rsa-sha512", 'rsa', 'sha512'),
+    'ecdsa-sha256': ("http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256", 'ec', 'sha256'),
+    'ecdsa-sha512': ("http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha512", 'ec', 'sha512'),
+}
+
+# Digest algorithms, name: uri
+DIGEST_ALGORITHMS = {
+    'sha1': "http://www.w3.org/2000/09/xmldsig#sha1",
+    'sha256': "http://www.w3.org/2001/04/xmlenc#sha256",
+    'sha512': "http://www.w3.org/2001/04/xmlenc#sha512",
+}
+
+
+def algorithm_name(uri, algorithms=SIGNATURE_ALGORITHMS):
+    "Return the name of an algorithm given its uri (None if not supported)"
+    for name, value in algorithms.items():
+        if (value[0] if isinstance(value, tuple) else value) == uri:
+            return name
+
+
+def int_to_bytes(n, size):
+    "Big-endian unsigned integer of size bytes"
+    return binascii.unhexlify('%0*x' % (size * 2, n))
+
+
+def bytes_to_int(data):
+    return int(binascii.hexlify(data), 16)
+
+
+#
+# We store metadata about what available crypto libraries we have available.
+# M2Crypto stays the default when it is installed: the legacy xmlsec helpers
+# (x509_parse_cert, load_private_key...) return the provider objects, so
+# existing code keeps getting M2Crypto ones (i.e. X509.get_subject).
+#
+_crypto_providers = {}      # name: class
+_preference = ['m2crypto', 'cryptography']
+
+
+class CryptoProvider(object):
+    """Interface of the cryptographic backends
+
+    Data (keys, certificates, messages) are bytes; the key and certificate
+    objects returned are not modified afterwards, so they can be loaded
+    once and shared by threads (see the xmlsec caches).
+    """
+    name = None
+    key_types = ('rsa', 'ec')   # supported by the signature algorithms
+
+    def supports(self, algorithm):
+        "Return True if the signature algorithm can be used with this provider"
+        return algorithm in SIGNATURE_ALGORITHMS and \
+            SIGNATURE_ALGORITHMS[algorithm][1] in self.key_types
+
+    def load_private_key(self, data, password=None):
+        "Return the private key from PEM data"
+        raise NotImplementedError
+
+    def load_public_key(self, data):
+        "Return the public key from PEM data"
+        raise NotImplementedError
+
+    def load_certificate(self, data, binary=False):
+        "Return the X509 certificate from PEM (or binary DER) data"
+        raise NotImplementedError
+
+    def public_key(self, cert):
+        "Return the public key of a certificate"
+        raise NotImplementedError
+
+    def public_key_pem(self, key):
+        "Return the PEM encoding of a public key"
+        raise NotImplementedError
+
+    def sign(self, key, data, algorithm):
+        "Return the signature value (XML Signature format) of the data"
+        raise NotImplementedError
+
+    def verify(self, key, data, signature, algorithm):
+        "Return True if the signature value of the data is valid"
+        raise NotImplementedError
+
+    def verify_certificate(self, cacert, cert):
+        "Return True if the certificate was signed by the authority"
+        raise NotImplementedError
+
+    def rsa_key_value(self, key):
+        "Return the modulus and exponent (bytes) of a RSA key, None if not RSA"
+        raise NotImplementedError
+
+    def issuer_serial(self, cert):
+        "Return the issuer name and serial number of a certificate"
+        raise NotImplementedError
+
+    def algorithm(self, name):
+        "Return the key type and hash name of a signature algorithm"
+        try:
+            uri, key_type, hash_name = SIGNATURE_ALGORITHMS[name]
+        except KeyError:
+            raise ValueError("unknown signature algorithm %s" % name)
+        if key_type not in self.key_types:
+            raise ValueError("%s is not supported by this provider" % name)
+        return key_type, hash_name
+
+
+#
+# cryptography support (RSA and ECDSA).
+#
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa, utils
+except ImportError:
+    pass
+else:
+    class CryptographyProvider(CryptoProvider):
+        name = 'cryptography'
+        hashes = {'sha1': hashes.SHA1, 'sha256': hashes.SHA256, 'sha512': hashes.SHA512}
+
+        def load_private_key(self, data, password=None):
+            if isinstance(password, unicode):
+                password = password.encode('utf-8')
+            return serialization.load_pem_private_key(data, password or None,
+                                                      default_backend())
+
+        def load_public_key(self, data):
+            return serialization.load_pem_public_key(data, default_backend())
+
+        def load_certificate(self, data, binary=False):
+            if binary:
+                return x509.load_der_x509_certificate(data, default_backend())
+            return x509.load_pem_x509_certificate(data, default_backend())
+
+        def public_key(self, cert):
+            return cert.public_key()
+
+        def public_key_pem(self, key):
+            return key.public_bytes(serialization.Encoding.PEM,
+                                    serialization.PublicFormat.SubjectPublicKeyInfo)
+
+        def sign(self, key, data, algorithm):
+            key_type, hash_name = self.algorithm(algorithm)
+            hash_algorithm = self.hashes[hash_name]()
+            if key_type == 'ec':
+                r, s = utils.decode_dss_signature(key.sign(data, ec.ECDSA(hash_algorithm)))
+                # XML Signature ECDSA values are r and s concatenated (RFC 4050)
+                size = (key.curve.key_size + 7) // 8
+                return int_to_bytes(r, size) + int_to_bytes(s, size)
+            return key.sign(data, padding.PKCS1v15(), hash_algorithm)
+
+        def verify(self, key, data, signature, algorithm):
+            key_type, hash_name = self.algorithm(algorithm)
+            hash_algorithm = self.hashes[hash_name]()
+            try:
+                if key_type == 'ec':
+                    size = len(signature) // 2
+                    signature = utils.encode_dss_signature(
+                        bytes_to_int(signature[:size]), bytes_to_int(signature[size:]))
+                    key.verify(signature, data, ec.ECDSA(hash_algorithm))
+                else:
+                    key.verify(signature, data, padding.PKCS1v15(), hash_algorithm)
+            except (InvalidSignature, ValueError, TypeError):
+                return False
+            return True
+
+        def verify_certificate(self, cacert, cert):
+            key = cacert.public_key()
+            try:
+                if isinstance(key, ec.EllipticCurvePublicKey):
+                    key.verify(cert.signature, cert.tbs_certificate_bytes,
+                               ec.ECDSA(cert.signature_hash_algorithm))
+                else:
+                    key.verify(cert.signature, cert.tbs_certificate_bytes,
+                               padding.PKCS1v15(), cert.signature_hash_algorithm)
+            except InvalidSignature:
+                return False
+            return cert.issuer == cacert.subject
+
+        def rsa_key_value(self, key):
+            if isinstance(key, rsa.RSAPrivateKey):
+                key = key.public_key()
+            if not isinstance(key, rsa.RSAPublicKey):
+                return None
+            numbers = key.public_numbers()
+            return (int_to_bytes(numbers.n, (numbers.n.bit_length() + 7) // 8),
+                    int_to_bytes(numbers.e, (numbers.e.bit_length() + 7) // 8))
+
+        def issuer_serial(self, cert):
+            return cert.issuer.rfc4514_string(), cert.serial_number
+
+    _crypto_providers['cryptography'] = CryptographyProvider
+
+
+#
+# M2Crypto support (RSA only).
+#
+try:
+    from M2Crypto import BIO, RSA, X509, m2
+except ImportError:
+    pass
+else:
+    class M2CryptoProvider(CryptoProvider):
+        name = 'm2crypto'
+        key_types = ('rsa', )
+
+        def load_private_key(self, data, password=None):
+            if isinstance(password, unicode):
+                password = password.encode('utf-8')
+            return RSA.load_key_bio(BIO.MemoryBuffer(data),
+                                    lambda *args, **kwargs: password)
+
+        def load_public_key(self, data):
+            return RSA.load_pub_key_bio(BIO.MemoryBuffer(data))
+
+        def load_certificate(self, data, binary=False):
+            return X509.load_cert_bio(BIO.MemoryBuffer(data),
+                                      X509.FORMAT_DER if binary else X509.FORMAT_PEM)
+
+        def public_key(self, cert):
+            return cert.get_pubkey().get_rsa()
+
+        def public_key_pem(self, key):
+            bio = BIO.MemoryBuffer()
+            key.save_pub_key_bio(bio)
+            return bio.read()
+
+        def sign(self, key, data, algorithm):
+            key_type, hash_name = self.algorithm(algorithm)
+            return key.sign(hashlib.new(hash_name, data).digest(), hash_name)
+
+        def verify(self, key, data, signature, algorithm):
+            key_type, hash_name = self.algorithm(algorithm)
+            try:
+                return key.verify(hashlib.new(hash_name, data).digest(), signature,
+                                  hash_name) == 1
+            except RSA.RSAError:
+                return False
+
+        def verify_certificate(self, cacert, cert):
+            return cert.verify(cacert.get_pubkey()) == 1
+
+        def rsa_key_value(self, key):
+            # MPI format: 4 bytes length prefix
+            modulus = binascii.unhexlify(m2.bn_to_hex(m2.mpi_to_bn(key.n)))
+            return modulus, key.e[4:]
+
+        def issuer_serial(self, cert):
+            return cert.get_issuer().as_text(), cert.get_serial_number()
+
+    _crypto_providers['m2crypto'] = M2CryptoProvider
+
+
+_provider = None
+
+
+def get_crypto_provider(name=None):
+    """Return the crypto provider (default: M2Crypto if installed, else cryptography)
+
+    ECDSA algorithms need the cryptography provider (see set_crypto_provider).
+    """
+    if name is None:
+        if _provider is not None:
+            return _provider
+        for name in _preference:
+            if name in _crypto_providers:
+                break
+        else:
+            raise RuntimeError("No crypto library available (cryptography or M2Crypto)")
+    try:
+        return _crypto_providers[name]()
+    except KeyError:
+        raise RuntimeError("Crypto provider %s is not available" % name)
+
+
+def set_crypto_provider(name=None):
+    """Set the default crypto provider (None: M2Crypto if installed, else cryptography)"""
+    global _provider
+    _provider = get_crypto_provider(name) if name else None
+    return _provider
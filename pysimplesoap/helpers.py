@@ -23,6 +23,7 @@ from decimal import Decimal
 import os
 import logging
 import hashlib
+import threading
 import warnings
 
 try:
@@ -32,6 +33,11 @@ except ImportError:
     from urllib import request as urllib2
     from urllib.parse import urlsplit
 
+try:
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+except ImportError:
+    ThreadPoolExecutor = None   # python 2 without futures: fetch sequentially
+
 from . import __author__, __copyright__, __license__, __version__
 
 
@@ -57,6 +63,11 @@ def fetch(url, http, cache=False, force_download=False, wsdl_basedir='', headers
                 log.error(e)
         raise RuntimeError('No scheme given for url: %s' % url)
 
+    # record the documents of a compiled wsdl (see cache.Fetched), no files:
+    record = getattr(cache, 'record', None)
+    if record is not None:
+        cache = False
+
     # make md5 hash of the url for caching...
     filename = '%s.xml' % hashlib.md5(url.encode('utf8')).hexdigest()
     if isinstance(cache, basestring):
@@ -81,9 +92,92 @@ def fetch(url, http, cache=False, force_download=False, wsdl_basedir='', headers
             f = open(filename, 'w')
             f.write(xml)
             f.close()
+    if record is not None:
+        record(url, xml)
     return xml
 
 
+def fetch_all(imports, load, discover=None, workers=8):
+    """Download a graph of documents concurrently (bounded thread pool)
+
+    imports is a list of (location, basedir, path) as returned by discover,
+    load(location, basedir) returns the document and discover(document, path)
+    its imports (fetched in turn). Each location is loaded once per basedir
+    (relative locations are different documents). Failures are logged and
+    skipped, so the document is fetched again (and the error raised) when
+    it is processed.
+    Returns a dict {(location, basedir): document}
+    """
+    documents = {}
+    if ThreadPoolExecutor is None or workers < 2 or not imports:
+        return documents
+    seen = set()
+    pending = {}                # future: (location, basedir, path)
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(imports):
+        for location, basedir, path in imports:
+            if (location, basedir) not in seen:
+                seen.add((location, basedir))
+                future = executor.submit(load, location, basedir)
+                pending[future] = location, basedir, path
+
+    try:
+        submit(imports)
+        while pending:
+            done, not_done = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                location, basedir, path = pending.pop(future)
+                try:
+                    document = future.result()
+                except Exception as e:
+                    log.debug('Prefetching %s failed: %s' % (location, e))
+                    continue
+                documents[location, basedir] = document
+                if discover:
+                    submit(discover(document, path))
+    finally:
+        executor.shutdown()
+    return documents
+
+
+def prefetch_schemas(schemas, xsd_uri, http_factory, cache, force_download,
+                     wsdl_basedir, workers=8):
+    """Fetch and parse the imported schemas (whole graph) concurrently
+
+    Each thread uses its own transport (created calling http_factory).
+    Returns the documents to be used by preprocess_schema.
+    """
+    from .simplexml import SimpleXMLElement    # here to avoid recursive imports
+
+    local = threading.local()
+
+    def load(location, basedir):
+        http = getattr(local, 'http', None)
+        if http is None:
+            http = local.http = http_factory()
+        xml = fetch(location, http, cache, force_download, basedir)
+        return SimpleXMLElement(xml, namespace=xsd_uri)
+
+    imports = []
+    for schema in schemas:
+        imports.extend(schema_imports(schema, wsdl_basedir))
+    return fetch_all(imports, load, schema_imports, workers)
+
+
+def schema_imports(schema, wsdl_basedir):
+    """Return the (location, basedir, path) of the schema imports / includes"""
+    imports = []
+    for element in schema.children() or []:
+        if element.get_local_name() in ('import', 'include',):
+            schema_location = element['schemaLocation']
+            if schema_location is not None:
+                # base path for relative schema locations (see preprocess_schema)
+                path = os.path.normpath(os.path.join(wsdl_basedir, schema_location))
+                imports.append((schema_location, wsdl_basedir, os.path.dirname(path)))
+    return imports
+
+
 def sort_dict(od, d):
     """Sort parameters (same order as xsd:sequence)"""
     if isinstance(od, dict):
@@ -370,8 +464,11 @@ get_namespace_prefix = lambda s: s and str((':' in s) and s.split(':')[0] or Non
 
 def preprocess_schema(schema, imported_schemas, elements, xsd_uri, dialect,
                       http, cache, force_download, wsdl_basedir,
-                      global_namespaces=None, qualified=False):
-    """Find schema elements and complex types"""
+                      global_namespaces=None, qualified=False, documents=None):
+    """Find schema elements and complex types
+
+    documents are the imported schemas already parsed (see prefetch_schemas)
+    """
 
     from .simplexml import SimpleXMLElement    # here to avoid recursive imports
 
@@ -404,18 +501,22 @@ def preprocess_schema(schema, imported_schemas, elements, xsd_uri, dialect,
                 continue
             imported_schemas[schema_location] = schema_namespace
             log.debug('Importing schema %s from %s' % (schema_namespace, schema_location))
-            # Open uri and read xml:
-            xml = fetch(schema_location, http, cache, force_download, wsdl_basedir)
+            imported_schema = None
+            if documents:
+                imported_schema = documents.get((schema_location, wsdl_basedir))
+            if imported_schema is None:
+                # Open uri and read xml:
+                xml = fetch(schema_location, http, cache, force_download, wsdl_basedir)
+                imported_schema = SimpleXMLElement(xml, namespace=xsd_uri)
 
             # recalculate base path for relative schema locations
             path = os.path.normpath(os.path.join(wsdl_basedir, schema_location))
             path = os.path.dirname(path)
 
             # Parse imported XML schema (recursively):
-            imported_schema = SimpleXMLElement(xml, namespace=xsd_uri)
             preprocess_schema(imported_schema, imported_schemas, elements,
                               xsd_uri, dialect, http, cache, force_download,
-                              path, global_namespaces, qualified)
+                              path, global_namespaces, qualified, documents)
 
         element_type = element.get_local_name()
         if element_type in ('element', 'complexType', "simpleType"):
@@ -650,6 +751,10 @@ class Struct(dict):
             self.qualified = other.qualified
             self.refers_to = other.refers_to
 
+    def __reduce__(self):
+        # pickle support (keys order and attributes, recursive structs)
+        return (Struct, (self.key, ), self.__dict__, None, iter(self.items()))
+
     def copy(self):
         "Make a duplicate"
         new = Struct(self.key)
@@ -0,0 +1,420 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Compiled (precomputed) conversion plans for WSDL types"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+import datetime
+import logging
+from decimal import Decimal
+
+from . import __author__, __copyright__, __license__, __version__
+from .helpers import TYPE_UNMARSHAL_FN, TYPE_MARSHAL_FN, Struct, sort_dict
+
+log = logging.getLogger(__name__)
+
+
+class UnmarshallPlan(object):
+    """Decoder equivalent to SimpleXMLElement.unmarshall for a type declaration
+
+    The type declaration (i.e. a WSDL output Struct) is analyzed once and
+    converted to a tree of closures keyed by tag local name, so the type
+    introspection is not repeated for each node of each response.
+    Nodes with multirefs (href), custom arrays (arrayType) or undeclared
+    tags (xsi:type, any, strict) are delegated to the generic unmarshall.
+    """
+
+    def __init__(self, types, strict=True):
+        self.types = types
+        self.strict = strict
+        self.__decoders = {}        # id(types): (types, decoder)
+        self.__decode = self.compile(types)
+
+    def __call__(self, xml):
+        "Convert the xml elements (siblings) like xml.unmarshall(types, strict)"
+        return self.__decode(xml, xml._elements)
+
+    def compile(self, types):
+        "Return the decoder function for the nodes of the type (cached)"
+        key = id(types)
+        if key in self.__decoders:
+            # already compiled (or being compiled: recursive types)
+            return self.__decoders[key][1]
+        generic = self.generic
+        fields = {}                 # tag name: store function
+
+        if isinstance(types, dict):
+            def decode(xml, nodes):
+                backend = xml._backend
+                d = {}
+                for node in nodes:
+                    name = str(backend.get_local_name(node))
+                    store = fields.get(name)
+                    if store is None or has_special_attributes(backend, node):
+                        generic(xml, node, types, d)
+                    else:
+                        store(xml, name, node, d)
+                return d
+        else:
+            def decode(xml, nodes):
+                backend = xml._backend
+                store = fields.get(None)
+                d = {}
+                for node in nodes:
+                    name = str(backend.get_local_name(node))
+                    if store is None or has_special_attributes(backend, node):
+                        generic(xml, node, types, d)
+                    else:
+                        store(xml, name, node, d)
+                return d
+
+        self.__decoders[key] = (types, decode)
+        if isinstance(types, dict):
+            for name, fn in types.items():
+                store = self.compile_store(fn)
+                if store is not None:
+                    fields[name] = store
+        else:
+            # same conversion for all the nodes
+            fields[None] = self.compile_store(types)
+        return decode
+
+    def compile_store(self, fn):
+        "Return a function converting a node and storing its value in a dict"
+        if isinstance(fn, list):
+            if not fn:
+                return None
+            item = fn[0]
+            decode_item = self.compile(item)
+            if not isinstance(item, dict):
+                # simple arrays []
+                def store(xml, name, node, d):
+                    value = d.setdefault(name, [])
+                    for child in xml._backend.children(node) or [node]:
+                        value.extend(decode_item(xml, [child]).values())
+            elif len(item) > 1:
+                # jetty style arrays [{k, v}]
+                def store(xml, name, node, d):
+                    value = d.setdefault(name, [])
+                    tmp_dict = {}
+                    for child in xml._backend.children(node):
+                        tmp_dict.update(decode_item(xml, [child]))
+                    value.append(tmp_dict)
+            else:
+                def store(xml, name, node, d):
+                    value = d.setdefault(name, [])
+                    for child in xml._backend.children(node) or [node]:
+                        value.append(decode_item(xml, [child]))
+        elif isinstance(fn, tuple):
+            if not fn:
+                return None
+            decode_item = self.compile(fn[0])
+            as_dict = len(fn) == 1 and isinstance(fn[0], dict)
+
+            def store(xml, name, node, d):
+                value = []
+                _d = {}
+                for child in xml._backend.children(node):
+                    if as_dict:
+                        _d.update(decode_item(xml, [child]))
+                    else:
+                        value.append(decode_item(xml, [child]))
+                if as_dict:
+                    value.append(_d)
+                if name in d:
+                    value = tuple(list(d[name]) + value)
+                else:
+                    value = tuple(value)
+                d[name] = value
+        elif isinstance(fn, dict):
+            decode_children = self.compile(fn)
+
+            def store(xml, name, node, d):
+                children = xml._backend.children(node)
+                d[name] = decode_children(xml, children) if children else None
+        elif fn is None:
+            # xsd:anyType not unmarshalled
+            def store(xml, name, node, d):
+                d[name] = xml._wrap([node])
+        else:
+            # get special deserialization function (if any)
+            convert = TYPE_UNMARSHAL_FN.get(fn, fn)
+
+            def store(xml, name, node, d):
+                text = xml._backend.get_text(node)
+                if text:
+                    try:
+                        if convert == str:
+                            # always return an unicode object
+                            value = unicode(text)
+                        else:
+                            value = convert(text)
+                    except (ValueError, TypeError) as e:
+                        raise ValueError("Tag: %s: %s" % (name, e))
+                else:
+                    value = None
+                d[name] = value
+        return store
+
+    def generic(self, xml, node, types, d):
+        "Convert the node using SimpleXMLElement.unmarshall and merge it"
+        for name, value in xml._wrap([node]).unmarshall(types, self.strict).items():
+            if isinstance(value, list) and isinstance(d.get(name), list):
+                d[name].extend(value)
+            elif isinstance(value, tuple) and name in d:
+                d[name] = tuple(list(d[name]) + list(value))
+            else:
+                d[name] = value
+
+
+def has_special_attributes(backend, node):
+    "Check for attributes changing the conversion (href, arrayType)"
+    attributes = backend.attributes(node)
+    if attributes:
+        for name in attributes.keys():
+            if name == 'href' or 'arrayType' in name:
+                return True
+    return False
+
+
+class MarshallPlan(object):
+    """Encoder equivalent to sort_dict + SimpleXMLElement.marshall for the
+    input parameters of an operation (WSDL input message)
+
+    Field order, null filtering and the namespace of each element are taken
+    from the input Struct once, so the parameters are written (XMLWriter)
+    with a straight walk over the known fields. Values that do not match
+    their declaration are serialized with the generic marshall rules.
+    """
+
+    def __init__(self, input):
+        self.input = input
+        self.name = list(input.keys())[0]
+        self.root = root = input[self.name]
+        self.__encoders = {}        # id(types): (types, encoder)
+        self.fields = {}            # parameter name: (type, ns, encoder)
+        for k, fn in root.items():
+            # namespace of the parameter element if it is a complex type
+            # (referenced elements keep their own namespace):
+            if root.references.get(k):
+                ns = getattr(fn, 'namespaces', {}).get(None, True)
+            else:
+                ns = root.namespaces.get(k)
+            self.fields[k] = (fn, ns, self.compile(fn))
+
+    def parameters(self, values):
+        "Return the (name, value) parameters in the WSDL order (not null)"
+        return [(k, values[k]) for k in self.root.keys()
+                if values.get(k) is not None]
+
+    def sort(self, parameters):
+        "Return the parameters sorted like wsdl_call_get_params (for the DOM)"
+        root = sort_dict(self.root, dict(parameters))
+        params = []
+        for k, v in root.items():
+            # fix referenced namespaces as info is lost when calling call
+            root_ns = root.namespaces[k]
+            if not root.references[k] and isinstance(v, Struct):
+                v.namespaces[None] = root_ns
+            params.append((k, v))
+        return params
+
+    def encode(self, writer, name, value, use_ns=True):
+        "Write a parameter (name, value) using the XMLWriter"
+        try:
+            fn, ns, encoder = self.fields[name]
+        except KeyError:
+            # not declared in the WSDL (i.e. called manually)
+            if hasattr(value, "namespaces") and use_ns:
+                ns = value.namespaces.get(None, True)
+            else:
+                ns = use_ns
+            return writer.marshall(name, value, ns=ns)
+        if not use_ns:
+            ns = use_ns
+        elif not (isinstance(fn, dict) and isinstance(value, dict)):
+            if hasattr(value, "namespaces"):
+                ns = value.namespaces.get(None, True)
+            else:
+                ns = use_ns
+        encoder(writer, name, value, ns)
+
+    def compile(self, types):
+        "Return the encoder function for values of the type (cached)"
+        key = id(types)
+        if key in self.__encoders:
+            # already compiled (or being compiled: recursive types)
+            return self.__encoders[key][1]
+
+        if isinstance(types, dict):
+            fields = []             # (name, ns, encoder)
+
+            def encode(writer, name, value, ns, add_child=True):
+                "Write the not null fields, return how many were written"
+                if not isinstance(value, dict):
+                    writer.marshall(name, sort_value(types, value), add_child, ns=ns)
+                    return 0
+                if add_child:
+                    writer.start(name, ns)
+                count = 0
+                for k, child_ns, encode_child in fields:
+                    v = value.get(k)
+                    if v is not None:
+                        encode_child(writer, k, v, child_ns)
+                        count += 1
+                if add_child:
+                    writer.end()
+                return count
+
+            self.__encoders[key] = (types, encode)
+            namespaces = getattr(types, 'namespaces', {})
+            for k, fn in types.items():
+                fields.append((k, namespaces.get(k), self.compile(fn)))
+
+        elif isinstance(types, list) and types and isinstance(types[0], dict):
+            encode_item = self.compile(types[0])
+
+            def encode(writer, name, value, ns, add_child=True):
+                if not isinstance(value, list):
+                    writer.marshall(name, sort_value(types, value), add_child, ns=ns)
+                    return
+                writer.start(name, ns)
+                for i, t in enumerate(value):
+                    count = encode_item(writer, name, t, ns, False)
+                    # "jetty" arrays: add new base node (if not last)
+                    if count > 1 and i < len(value) - 1:
+                        writer.end()
+                        writer.start(name, ns)
+                writer.end()
+
+            self.__encoders[key] = (types, encode)
+
+        else:
+            # simple types (and arrays of simple types)
+            def encode(writer, name, value, ns, add_child=True):
+                value_type = type(value)
+                if value_type is unicode or value_type is str:
+                    writer.add_child(name, value, ns=ns)
+                elif value_type in SIMPLE_TYPES:
+                    fn = TYPE_MARSHAL_FN.get(value_type, str)
+                    writer.add_child(name, fn(value), ns=ns)
+                else:
+                    writer.marshall(name, sort_value(types, value), add_child, ns=ns)
+
+            self.__encoders[key] = (types, encode)
+
+        return encode
+
+
+class ResponsePlan(object):
+    """Encoder equivalent to SimpleXMLElement.marshall for the values returned
+    by a registered function (server response, see templates.ResponseTemplate)
+
+    The encoder of each field is compiled once from the returns types, so
+    the values are written (XMLWriter) without inspecting each one against
+    the generic rules. As the DOM does, fields are written in the order of
+    the returned dict; values with their own namespaces or not matching
+    their declaration are serialized with the generic marshall rules.
+    """
+
+    def __init__(self, returns):
+        self.returns = returns
+        self.__encoders = {}        # id(types): (types, encoder)
+        self.fields = dict([(k, self.compile(fn)) for k, fn in returns.items()])
+
+    def encode(self, writer, name, value):
+        "Write a returned value (name, value) using the XMLWriter"
+        encoder = self.fields.get(name)
+        if encoder is None:
+            return writer.marshall(name, value)
+        encoder(writer, name, value, False)
+
+    def compile(self, types):
+        "Return the encoder function for values of the type (cached)"
+        key = id(types)
+        if key in self.__encoders:
+            # already compiled (or being compiled: recursive types)
+            return self.__encoders[key][1]
+
+        if isinstance(types, dict):
+            fields = {}             # name: encoder
+
+            def encode(writer, name, value, ns, add_child=True):
+                if not isinstance(value, dict) or hasattr(value, 'namespaces'):
+                    return writer.marshall(name, value, add_child, ns=ns)
+                if add_child:
+                    writer.start(writer.update_ns(name), ns)
+                for k, v in value.items():
+                    encode_child = fields.get(k)
+                    if encode_child is None:
+                        writer.marshall(k, v, ns=None)
+                    else:
+                        encode_child(writer, k, v, None)
+                if add_child:
+                    writer.end()
+
+            self.__encoders[key] = (types, encode)
+            for k, fn in types.items():
+                fields[k] = self.compile(fn)
+
+        elif isinstance(types, list) and types:
+            encode_item = self.compile(types[0])
+
+            def encode(writer, name, value, ns, add_child=True):
+                if not isinstance(value, list):
+                    return writer.marshall(name, value, add_child, ns=ns)
+                name = writer.update_ns(name)
+                writer.start(name, ns)
+                for i, t in enumerate(value):
+                    encode_item(writer, name, t, ns, False)
+                    # "jetty" arrays: add new base node (if not last)
+                    if isinstance(t, dict) and len(t) > 1 and i < len(value) - 1:
+                        writer.end()
+                        writer.start(name, ns)
+                writer.end()
+
+            self.__encoders[key] = (types, encode)
+
+        else:
+            # simple types
+            def encode(writer, name, value, ns, add_child=True):
+                value_type = type(value)
+                if value_type is unicode or value_type is str:
+                    writer.add_child(writer.update_ns(name), value, ns=ns)
+                elif value_type in SIMPLE_TYPES:
+                    fn = TYPE_MARSHAL_FN.get(value_type, str)
+                    writer.add_child(writer.update_ns(name), fn(value), ns=ns)
+                else:
+                    writer.marshall(name, value, add_child, ns=ns)
+
+            self.__encoders[key] = (types, encode)
+
+        return encode
+
+
+# python types serialized as text directly (not containers nor placeholders)
+SIMPLE_TYPES = set([int, float, bool, Decimal, datetime.datetime,
+                    datetime.date, datetime.time])
+
+
+def sort_value(types, value):
+    "Sort a parameter value (fields order) as sort_dict does"
+    if isinstance(value, dict):
+        return sort_dict(types, value)
+    elif isinstance(value, list):
+        return [sort_dict(types[0], v) for v in value]
+    return value
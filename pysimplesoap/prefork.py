@@ -0,0 +1,254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Pre-fork multi-process server runner for SoapDispatcher (POSIX only)"""
+
+
+from __future__ import unicode_literals
+
+import errno
+import logging
+import os
+import signal
+import socket
+import time
+try:
+    from BaseHTTPServer import HTTPServer
+except ImportError:
+    from http.server import HTTPServer
+
+from . import __author__, __copyright__, __license__, __version__
+from .server import SOAPHandler
+
+log = logging.getLogger(__name__)
+
+
+def cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+
+class WorkerHTTPServer(HTTPServer):
+    """HTTP server using a listening socket created by the master process"""
+
+    def __init__(self, sock, handler_class, dispatcher):
+        HTTPServer.__init__(self, sock.getsockname()[:2], handler_class,
+                            bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.dispatcher = dispatcher
+
+    def get_request(self):
+        # the listening socket is non-blocking (shared by the workers):
+        request, client_address = self.socket.accept()
+        request.setblocking(True)
+        return request, client_address
+
+
+class PreforkServer(object):
+    """Serve a SoapDispatcher with N forked worker processes
+
+    The WSDL, help documents and compiled plans are generated before
+    forking (shared by the workers). Crashed workers are restarted.
+    Signals (master process): SIGHUP reloads (replaces) the workers
+    gracefully, SIGTERM / SIGINT stop the server.
+    """
+    handler_class = SOAPHandler
+    backlog = 128
+    poll_interval = 0.5         # seconds (workers check if they should stop)
+    restart_delay = 1           # seconds (avoid respawning in a tight loop)
+
+    def __init__(self, dispatcher, address=('', 8008), workers=None,
+                 reuse_port=False, on_reload=None):
+        """
+        :param workers: number of processes (default: one per CPU)
+        :param reuse_port: each worker listens with its own socket
+            (SO_REUSEPORT, the kernel balances the connections), if supported
+        :param on_reload: function called (in the master) before reloading
+        """
+        self.dispatcher = dispatcher
+        self.address = address
+        self.count = workers or cpu_count()
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.on_reload = on_reload
+        self.socket = None
+        self.workers = {}       # pid: (generation, start time)
+        self.generation = 0
+        self.running = False
+        self.reloading = False
+
+    @property
+    def server_address(self):
+        return self.socket.getsockname()[:2]
+
+    def warm(self):
+        "Generate the documents, plans and response writers once (before forking)"
+        dispatcher = self.dispatcher
+        dispatcher.get_document()
+        for method, (function, returns, args, doc) in dispatcher.methods.items():
+            dispatcher.get_document(method, 'request')
+            dispatcher.get_document(method, 'response')
+            if dispatcher.compiled and args:
+                dispatcher.get_unmarshall_plan(method)
+            if dispatcher.compiled and not dispatcher.pretty and returns:
+                dispatcher.get_response_template(method)
+
+    def create_socket(self, listen=True):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(self.socket.getsockname()[:2] if self.socket else self.address)
+        if listen:
+            sock.listen(self.backlog)
+            sock.setblocking(False)
+        return sock
+
+    def bind(self):
+        "Create the socket (with SO_REUSEPORT, only to reserve the address)"
+        self.socket = self.create_socket(listen=not self.reuse_port)
+
+    def spawn(self):
+        "Fork a new worker process"
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (self.generation, time.time())
+            return pid
+        # child process:
+        status = 0
+        try:
+            self.run_worker()
+        except Exception:
+            log.exception("worker %s failed", os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def run_worker(self):
+        "Serve requests until the master asks to stop (SIGTERM)"
+        state = {'stopping': False}
+
+        def stop(signum, frame):
+            state['stopping'] = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        sock = self.create_socket() if self.reuse_port else self.socket
+        server = WorkerHTTPServer(sock, self.handler_class, self.dispatcher)
+        server.timeout = self.poll_interval
+        while not state['stopping']:
+            try:
+                server.handle_request()
+            except (OSError, IOError, socket.error) as e:
+                # interrupted by a signal (python 2)
+                if e.args[0] != errno.EINTR:
+                    raise
+        server.server_close()
+
+    def install_signals(self):
+        def stop(signum, frame):
+            self.running = False
+
+        def reload(signum, frame):
+            self.reloading = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+
+    def serve_forever(self, install_signals=True):
+        "Run the master process: fork and supervise the workers (blocking)"
+        if self.socket is None:
+            self.bind()
+        self.warm()
+        if install_signals:
+            self.install_signals()
+        self.running = True
+        log.info("Starting %d workers on %s:%s", self.count, *self.server_address)
+        try:
+            while self.running:
+                if self.reloading:
+                    self.reloading = False
+                    self.reload_workers()
+                self.reap()
+                while self.running and len(self.workers) < self.count:
+                    self.spawn()
+                time.sleep(0.05)
+        finally:
+            self.stop_workers()
+            self.socket.close()
+            self.socket = None
+
+    def reap(self):
+        "Remove the finished workers (they are replaced if they crashed)"
+        for pid in list(self.workers):
+            try:
+                finished, status = os.waitpid(pid, os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    continue
+                finished, status = pid, None
+            if not finished:
+                continue
+            generation, started = self.workers.pop(pid)
+            if generation == self.generation and self.running:
+                log.warning("worker %s exited unexpectedly (status %s)", pid, status)
+                if time.time() - started < self.restart_delay:
+                    time.sleep(self.restart_delay)
+
+    def reload_workers(self):
+        "Start a new generation of workers, then stop the old ones gracefully"
+        if self.on_reload:
+            self.on_reload(self)
+        self.warm()
+        old = [pid for pid, (generation, started) in self.workers.items()
+               if generation == self.generation]
+        self.generation += 1
+        for i in range(self.count):
+            self.spawn()
+        for pid in old:
+            self.kill(pid, signal.SIGTERM)
+
+    def kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def stop_workers(self, timeout=10):
+        "Ask the workers to finish their current request and wait for them"
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGTERM)
+        deadline = time.time() + timeout
+        while self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+            del self.workers[pid]
+
+    def reload(self):
+        "Request a graceful reload (as SIGHUP)"
+        self.reloading = True
+
+    def shutdown(self):
+        "Request the server to stop (as SIGTERM)"
+        self.running = False
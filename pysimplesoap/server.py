@@ -20,11 +20,17 @@ if sys.version > '3':
 
 
 import datetime
+import hashlib
 import sys
 import logging
 import warnings
 import re
 import traceback
+from xml.parsers import expat
+try:
+    from inspect import iscoroutine
+except ImportError:
+    iscoroutine = lambda obj: False     # python 2 (no coroutine functions)
 try:
     from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 except ImportError:
@@ -32,12 +38,112 @@ except ImportError:
 
 from . import __author__, __copyright__, __license__, __version__
 from .simplexml import SimpleXMLElement, TYPE_MAP, Date, Decimal
+from .plans import UnmarshallPlan
+from .templates import ResponseTemplate, UnsupportedValue
+from .transport import compress, DecompressingStream
 
 log = logging.getLogger(__name__)
 
 # Deprecated?
 NS_RX = re.compile(r'xmlns:(\w+)="(.+?)"')
 
+HTTP_STATUS = {200: 'OK', 304: 'Not Modified', 404: 'Not Found'}
+
+# responses smaller than this are not worth compressing:
+COMPRESS_SIZE = 1024
+
+# charsets parsed directly from the request body (without decoding it first)
+UTF8_CHARSETS = ('utf-8', 'utf8', 'us-ascii', 'ascii')
+
+SOAP_URIS = ("http://schemas.xmlsoap.org/soap/envelope/",
+             "http://www.w3.org/2003/05/soap-env",
+             "http://www.w3.org/2003/05/soap-envelope",)
+
+
+class Routed(Exception):
+    "Stop the routing pre-pass (the method element was found)"
+
+
+def route_request(xml, soap_uri):
+    """Scan the request only up to the first child of the Body
+
+    Return the Envelope namespace declarations [(attribute, uri)], the soap
+    uri (detected or the given one), the method local name and prefix.
+    None if not found (i.e. malformed or unusual requests).
+    """
+    return _route(lambda parse: parse(xml, True), soap_uri)
+
+
+def route_stream(stream, soap_uri, size=8192):
+    """Route a request being read (see route_request)
+
+    Return the routing and a stream to read the request again (from the
+    start, the bytes scanned are kept).
+    """
+    chunks = []
+
+    def feed(parse):
+        while True:
+            chunk = stream.read(size)
+            chunks.append(chunk)
+            parse(chunk, not chunk)
+            if not chunk:
+                break
+
+    return _route(feed, soap_uri), ReplayStream(chunks, stream)
+
+
+def _route(feed, soap_uri):
+    declarations = []
+    state = {'depth': 0, 'body': None}
+
+    def declare(prefix, uri):
+        if not state['depth']:
+            declarations.append(('xmlns:%s' % prefix if prefix else 'xmlns', uri))
+
+    def start(name, attrs):
+        state['depth'] += 1
+        if state['body'] is not None:
+            # first child of the Body: the method
+            raise Routed(name)
+        parts = name.split(' ')
+        if state['depth'] == 1:
+            for k, v in declarations:
+                if v in SOAP_URIS:
+                    state['soap_uri'] = v
+        elif len(parts) > 1 and parts[0] == state.get('soap_uri', soap_uri) and \
+                parts[1] == 'Body':
+            state['body'] = state['depth']
+
+    def end(name):
+        if state['body'] == state['depth']:
+            raise Routed(None)      # empty body
+        state['depth'] -= 1
+
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.namespace_prefixes = True
+    parser.StartNamespaceDeclHandler = declare
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        feed(parser.Parse)
+    except Routed as e:
+        name = e.args[0]
+    except RequestEntityTooLarge:
+        raise
+    except Exception:
+        return None
+    else:
+        return None
+    if name is None:
+        return None
+    parts = name.split(' ')
+    if len(parts) == 1:
+        local_name, prefix = parts[0], None
+    else:
+        local_name, prefix = parts[1], parts[2] if len(parts) > 2 else None
+    return declarations, state.get('soap_uri', soap_uri), local_name, prefix
+
 
 class SoapFault(Exception):
     def __init__(self, faultcode=None, faultstring=None, detail=None):
@@ -46,6 +152,186 @@ class SoapFault(Exception):
         self.detail = detail
 
 
+class RequestEntityTooLarge(Exception):
+    "The request body is bigger than the maximum allowed (HTTP 413)"
+
+
+class RequestBody(object):
+    """File-like object reading a request body from the connection
+
+    The body is delimited by its length (Content-Length), chunked transfer
+    encoding or the end of the stream (length None), and limited to
+    max_size bytes (RequestEntityTooLarge is raised when exceeded).
+    """
+
+    def __init__(self, rfile, length=None, chunked=False, max_size=None):
+        self.rfile = rfile
+        self.remaining = length             # bytes left (current chunk)
+        self.chunked = chunked
+        self.max_size = max_size
+        self.size = 0                       # bytes read
+        self.done = not chunked and length == 0
+
+    def read(self, size=-1):
+        chunks = []
+        while not self.done and (size < 0 or size > 0):
+            if self.chunked and not self.remaining:
+                self.remaining = self.__next_chunk()
+                if not self.remaining:
+                    break
+            wanted = self.remaining if self.remaining is not None else 65536
+            if size >= 0:
+                wanted = min(wanted, size)
+            chunk = self.rfile.read(wanted)
+            if not chunk:
+                self.done = True
+                break
+            self.size += len(chunk)
+            if self.max_size is not None and self.size > self.max_size:
+                self.done = True
+                raise RequestEntityTooLarge("body exceeds %d bytes" % self.max_size)
+            chunks.append(chunk)
+            if size >= 0:
+                size -= len(chunk)
+            if self.remaining is not None:
+                self.remaining -= len(chunk)
+                if not self.remaining and not self.chunked:
+                    self.done = True
+            if self.chunked and not self.remaining:
+                self.rfile.readline()       # CRLF after the chunk data
+        return b''.join(chunks)
+
+    def __next_chunk(self):
+        "Read the next chunk size (and the trailers after the last one)"
+        size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+        if not size:
+            while self.rfile.readline().strip():
+                pass
+            self.done = True
+        return size
+
+
+class ReplayStream(object):
+    "File-like object reading the given chunks and then the stream"
+
+    def __init__(self, chunks, stream):
+        self.chunks = [chunk for chunk in chunks if chunk]
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.chunks:
+            return self.stream.read(size)
+        if size < 0:
+            data = b''.join(self.chunks) + self.stream.read()
+            self.chunks = []
+            return data
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            self.chunks.insert(0, chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+
+def accepts_encoding(accept_encoding, encoding):
+    "Check if an Accept-Encoding header value allows the content encoding"
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        if name.strip().lower() in (encoding, '*'):
+            q = params.strip()
+            if not q.startswith('q='):
+                return True
+            try:
+                return float(q[2:] or 0) != 0
+            except ValueError:
+                # malformed quality value (as q=0, not acceptable)
+                return False
+    return False
+
+
+def compress_response(content, accept_encoding, min_size=COMPRESS_SIZE):
+    """Return the extra headers and the content of a response
+
+    The content is compressed if it is not smaller than min_size (None to
+    disable the compression) and the client accepts gzip or deflate.
+    """
+    if min_size is None or len(content) < min_size:
+        return [], content
+    for encoding in ('gzip', 'deflate'):
+        if accepts_encoding(accept_encoding, encoding):
+            return ([('Content-Encoding', encoding), ('Vary', 'Accept-Encoding')],
+                    compress(content, encoding))
+    return [('Vary', 'Accept-Encoding')], content
+
+
+def decode_body(stream, content_encoding, max_size=None):
+    """Return a stream to read the request body decompressed
+
+    The decompressed size is also limited to max_size (see RequestBody).
+    ValueError is raised if the content encoding is not supported.
+    """
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        return stream
+    return RequestBody(DecompressingStream(stream, encoding), None, max_size=max_size)
+
+
+class Document(object):
+    """Generated document (wsdl or help) with its etag and compressed content"""
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        self.gzip_etag = '"%s-gzip"' % self.etag[1:-1]
+        self.__gzipped = None
+
+    @property
+    def gzipped(self):
+        if self.__gzipped is None:
+            # the gzip header has no mtime (same content, same etag)
+            self.__gzipped = compress(self.content, 'gzip')
+        return self.__gzipped
+
+    def response(self, if_none_match=None, accept_encoding=None):
+        """Return status, headers and content of a GET response
+
+        304 (without content) if the client already has this version.
+        """
+        if accepts_encoding(accept_encoding, 'gzip'):
+            etag, content = self.gzip_etag, self.gzipped
+            headers = [('Content-Encoding', 'gzip')]
+        else:
+            etag, content = self.etag, self.content
+            headers = []
+        headers.extend([('Content-Type', 'text/xml'), ('ETag', etag),
+                        ('Vary', 'Accept-Encoding')])
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if etag in tags or 'W/' + etag in tags or '*' in tags:
+                return 304, headers, b''
+        headers.append(('Content-Length', str(len(content))))
+        return 200, headers, content
+
+
+class DispatchCall(object):
+    """State of a request between the dispatch phases"""
+
+    def __init__(self, dispatcher, xml, fault=None):
+        self.xml = xml
+        self.fault = {} if fault is None else fault
+        self.prefix = dispatcher.prefix
+        self.soap_ns = dispatcher.soap_ns
+        self.soap_uri = dispatcher.soap_uri
+        self.soap_fault_code = 'VersionMismatch'
+        self.name = None
+        self.function = None
+        self.args = None
+        self.returns_types = None
+        self.ret = None
+        # additional namespaces prefixes, switched keys-values (updated with
+        # the ones used by the client)
+        self.ns_reversed = dict(((v, k) for k, v in dispatcher.namespaces.items()))
+
+
 class SoapDispatcher(object):
     """Simple Dispatcher for SOAP Server"""
 
@@ -56,6 +342,7 @@ class SoapDispatcher(object):
                  namespaces={},
                  pretty=False,
                  debug=False,
+                 compiled=False,
                  **kwargs):
         """
         :param namespace: Target namespace; xmlns=targetNamespace
@@ -63,6 +350,9 @@ class SoapDispatcher(object):
         :param namespaces: Specify additional namespaces; example: {'external': 'http://external.mt.moboperator'}
         :param pretty: Prettifies generated xmls
         :param debug: Use to add tracebacks in generated xmls.
+        :param compiled: Unmarshall the parameters with a plan compiled once
+            per registered function (see plans.UnmarshallPlan), and write the
+            responses into cached envelopes (see templates.ResponseTemplate).
 
         Multiple namespaces
         ===================
@@ -106,6 +396,10 @@ class SoapDispatcher(object):
         self.namespaces = namespaces
         self.pretty = pretty
         self.debug = debug
+        self.compiled = compiled
+        self.documents = {}     # generated wsdl and help (cleared on changes)
+        self.plans = {}         # method: UnmarshallPlan of its parameters
+        self.templates = {}     # method: ResponseTemplate
 
     @staticmethod
     def _extra_namespaces(xml, ns):
@@ -121,6 +415,17 @@ class SoapDispatcher(object):
 
     def register_function(self, name, fn, returns=None, args=None, doc=None):
         self.methods[name] = fn, returns, args, doc or getattr(fn, "__doc__", "")
+        self.documents.clear()
+        self.plans.pop(name, None)
+        self.templates.pop(name, None)
+
+    def get_unmarshall_plan(self, method):
+        "Return the compiled unmarshaller for the parameters of the method"
+        plan = self.plans.get(method)
+        if plan is None:
+            function, returns, args, doc = self.methods[method]
+            plan = self.plans[method] = UnmarshallPlan(args)
+        return plan
 
     def response_element_name(self, method):
         return '%sResponse' % method
@@ -128,92 +433,144 @@ class SoapDispatcher(object):
     def dispatch(self, xml, action=None, fault=None):
         """Receive and process SOAP call, returns the xml"""
         # a dict can be sent in fault to expose it to the caller
-        # default values:
-        prefix = self.prefix
-        ret = None
-        if fault is None:
-            fault = {}
-        soap_ns, soap_uri = self.soap_ns, self.soap_uri
-        soap_fault_code = 'VersionMismatch'
-        name = None
+        call = self.parse_request(xml, action, fault)
+        self.execute(call)
+        return self.build_response(call)
 
+    def parse_request(self, xml, action=None, fault=None):
+        """Parse the request and its parameters (first phase of dispatch)"""
+        call = DispatchCall(self, xml, fault)
         # namespaces = [('model', 'http://model.common.mt.moboperator'), ('external', 'http://external.mt.moboperator')]
-        _ns_reversed = dict(((v, k) for k, v in self.namespaces.items()))  # Switch keys-values
+        _ns_reversed = call.ns_reversed
         # _ns_reversed = {'http://external.mt.moboperator': 'external', 'http://model.common.mt.moboperator': 'model'}
 
         try:
-            request = SimpleXMLElement(xml, namespace=self.namespace)
+            if hasattr(xml, 'read') and self.namespaces:
+                # the raw xml is scanned for the namespaces aliases (below)
+                xml = call.xml = xml.read()
+            # scan up to the method element (unknown methods are rejected
+            # before parsing the whole request)
+            if hasattr(xml, 'read'):
+                routed, xml = route_stream(xml, call.soap_uri)
+            else:
+                routed = route_request(xml, call.soap_uri)
+            if routed:
+                declarations, soap_uri, name, prefix = routed
+                request = None
+            else:
+                request = SimpleXMLElement(xml, namespace=self.namespace)
+                declarations = request[:]
 
             # detect soap prefix and uri (xmlns attributes of Envelope)
-            for k, v in request[:]:
-                if v in ("http://schemas.xmlsoap.org/soap/envelope/",
-                         "http://www.w3.org/2003/05/soap-env",
-                         "http://www.w3.org/2003/05/soap-envelope",):
-                    soap_ns = request.attributes()[k].localName
-                    soap_uri = request.attributes()[k].value
+            for k, v in declarations:
+                if v in SOAP_URIS:
+                    call.soap_ns = k.split(":")[-1]
+                    call.soap_uri = v
 
                 # If the value from attributes on Envelope is in additional namespaces
                 elif v in self.namespaces.values():
-                    _ns = request.attributes()[k].localName
-                    _uri = request.attributes()[k].value
+                    _ns = k.split(":")[-1]
+                    _uri = v
                     _ns_reversed[_uri] = _ns  # update with received alias
                     # Now we change 'external' and 'model' to the received forms i.e. 'ext' and 'mod'
                 # After that we know how the client has prefixed additional namespaces
 
-            ns = NS_RX.findall(xml)
-            for k, v in ns:
-                if v in self.namespaces.values():
-                    _ns_reversed[v] = k
+            if self.namespaces:
+                if not isinstance(xml, unicode):
+                    xml = xml.decode('utf-8')
+                ns = NS_RX.findall(xml)
+                for k, v in ns:
+                    if v in self.namespaces.values():
+                        _ns_reversed[v] = k
 
-            soap_fault_code = 'Client'
+            call.soap_fault_code = 'Client'
 
             # parse request message and get local method
-            method = request('Body', ns=soap_uri).children()(0)
+            if request is not None:
+                method = request('Body', ns=call.soap_uri).children()(0)
+                name = method.get_local_name()
+                prefix = method.get_prefix()
             if action:
                 # method name = action
-                name = action[len(self.action)+1:-1]
-                prefix = self.prefix
-            if not action or not name:
+                call.name = action[len(self.action)+1:-1]
+                call.prefix = self.prefix
+            if not action or not call.name:
                 # method name = input message name
-                name = method.get_local_name()
-                prefix = method.get_prefix()
+                call.name = name
+                call.prefix = prefix
+
+            log.debug('dispatch method: %s', call.name)
+            call.function, call.returns_types, args_types, doc = self.methods[call.name]
+            log.debug('returns_types %s', call.returns_types)
 
-            log.debug('dispatch method: %s', name)
-            function, returns_types, args_types, doc = self.methods[name]
-            log.debug('returns_types %s', returns_types)
+            if request is None and args_types != {}:
+                # now parse the whole request (only the parameters are needed)
+                call.soap_fault_code = 'VersionMismatch'
+                request = SimpleXMLElement(xml, namespace=self.namespace)
+                call.soap_fault_code = 'Client'
+                method = request('Body', ns=call.soap_uri).children()(0)
 
             # de-serialize parameters (if type definitions given)
-            if args_types:
-                args = method.children().unmarshall(args_types)
+            if args_types and self.compiled:
+                call.args = self.get_unmarshall_plan(call.name)(method.children())
+            elif args_types:
+                call.args = method.children().unmarshall(args_types)
             elif args_types is None:
-                args = {'request': method}  # send raw request
+                call.args = {'request': method}  # send raw request
             else:
-                args = {}  # no parameters
+                call.args = {}  # no parameters
 
-            soap_fault_code = 'Server'
-            # execute function
-            ret = function(**args)
-            log.debug('dispathed method returns: %s', ret)
+            call.soap_fault_code = 'Server'
 
-        except SoapFault as e:
-            fault.update({
-                'faultcode': "%s.%s" % (soap_fault_code, e.faultcode),
-                'faultstring': e.faultstring,
-                'detail': e.detail
+        except RequestEntityTooLarge:
+            raise
+        except Exception:
+            self.handle_error(call)
+        return call
+
+    def execute(self, call):
+        """Call the registered function (second phase of dispatch)"""
+        if call.fault:
+            return
+        try:
+            ret = call.function(**call.args)
+            if iscoroutine(ret):
+                ret.close()
+                raise TypeError("%s is a coroutine function, use aioserver" % call.name)
+            call.ret = ret
+            log.debug('dispathed method returns: %s', ret)
+        except Exception:
+            self.handle_error(call)
+
+    def handle_error(self, call):
+        """Store the exception being handled as the fault of the call"""
+        etype, evalue, etb = sys.exc_info()
+        if isinstance(evalue, SoapFault):
+            call.fault.update({
+                'faultcode': "%s.%s" % (call.soap_fault_code, evalue.faultcode),
+                'faultstring': evalue.faultstring,
+                'detail': evalue.detail
             })
+            return
+        log.error(traceback.format_exc())
+        if self.debug:
+            xml = call.xml
+            if hasattr(xml, 'read'):
+                xml = '(streamed)'
+            elif not isinstance(xml, unicode):
+                xml = xml.decode('UTF-8')
+            detail = u''.join(traceback.format_exception(etype, evalue, etb))
+            detail += u'\n\nXML REQUEST\n\n' + xml
+        else:
+            detail = None
+        call.fault.update({'faultcode': "%s.%s" % (call.soap_fault_code, etype.__name__),
+                           'faultstring': evalue,
+                           'detail': detail})
 
-        except Exception:  # This shouldn't be one huge try/except
-            import sys
-            etype, evalue, etb = sys.exc_info()
-            log.error(traceback.format_exc())
-            if self.debug:
-                detail = u''.join(traceback.format_exception(etype, evalue, etb))
-                detail += u'\n\nXML REQUEST\n\n' + xml.decode('UTF-8')
-            else:
-                detail = None
-            fault.update({'faultcode': "%s.%s" % (soap_fault_code, etype.__name__),
-                     'faultstring': evalue,
-                     'detail': detail})
+    def build_envelope(self, call):
+        """Return the response Envelope, Body and the namespaces map (DOM)"""
+        prefix, soap_ns, soap_uri = call.prefix, call.soap_ns, call.soap_uri
+        _ns_reversed = call.ns_reversed
 
         # build response message
         if not prefix:
@@ -247,33 +604,58 @@ class SoapDispatcher(object):
         response['xmlns:xsd'] = "http://www.w3.org/2001/XMLSchema"
 
         body = response.add_child("%s:Body" % soap_ns, ns=False)
+        return response, body, mapping
+
+    def add_response_element(self, call, body):
+        """Add the method response element to the Body"""
+        res = body.add_child(self.response_element_name(call.name), ns=self.namespace)
+        if not call.prefix:
+            res['xmlns'] = self.namespace  # add target namespace
+        return res
+
+    def response_values(self, call):
+        """Return the [(name, value)] to serialize (according returns types)"""
+        ret, returns_types = call.ret, call.returns_types
+        # TODO: full sanity check of type structure (recursive)
+        complex_type = isinstance(ret, dict)
+        if complex_type:
+            # check if type mapping correlates with return value
+            types_ok = all([k in returns_types for k in ret.keys()])
+            if not types_ok:
+                warnings.warn("Return value doesn't match type structure: "
+                             "%s vs %s" % (str(returns_types), str(ret)))
+        if not complex_type or not types_ok:
+            # backward compatibility for scalar and simple types
+            return [(list(returns_types.keys())[0], ret)]
+        else:
+            # new style for complex classes
+            return list(ret.items())
+
+    def build_response(self, call):
+        """Serialize the returned values or the fault (last phase of dispatch)"""
+        fault, ret, returns_types = call.fault, call.ret, call.returns_types
+
+        values = None
+        if not fault and returns_types:
+            # serialize returned values (response) if type definition available
+            values = self.response_values(call)
+            if self.compiled and not self.pretty:
+                try:
+                    return self.get_response_template(call.name).render(call, values)
+                except UnsupportedValue as e:
+                    log.debug("Using the DOM for the response: %s", e)
+
+        response, body, mapping = self.build_envelope(call)
 
         if fault:
             # generate a Soap Fault (with the python exception)
-            body.marshall("%s:Fault" % soap_ns, fault, ns=False)
+            body.marshall("%s:Fault" % call.soap_ns, fault, ns=False)
         else:
             # return normal value
-            res = body.add_child(self.response_element_name(name), ns=self.namespace)
-            if not prefix:
-                res['xmlns'] = self.namespace  # add target namespace
-
-            # serialize returned values (response) if type definition available
-            if returns_types:
-                # TODO: full sanity check of type structure (recursive)
-                complex_type = isinstance(ret, dict)
-                if complex_type:
-                    # check if type mapping correlates with return value
-                    types_ok = all([k in returns_types for k in ret.keys()])
-                    if not types_ok:
-                        warnings.warn("Return value doesn't match type structure: "
-                                     "%s vs %s" % (str(returns_types), str(ret)))
-                if not complex_type or not types_ok:
-                    # backward compatibility for scalar and simple types
-                    res.marshall(list(returns_types.keys())[0], ret, )
-                else:
-                    # new style for complex classes
-                    for k, v in ret.items():
-                        res.marshall(k, v)
+            res = self.add_response_element(call, body)
+            if values is not None:
+                for k, v in values:
+                    res.marshall(k, v)
             elif returns_types is None:
                 # merge xmlelement returned
                 res.import_node(ret)
@@ -282,12 +664,49 @@ class SoapDispatcher(object):
 
         return response.as_xml(pretty=self.pretty)
 
+    def get_response_template(self, method):
+        "Return the compiled response writer of the method (for its returns types)"
+        returns = self.methods[method][1]
+        template = self.templates.get(method)
+        if template is None or template.returns is not returns:
+            template = self.templates[method] = ResponseTemplate(self, returns)
+        return template
+
     # Introspection functions:
 
     def list_methods(self):
         """Return a list of aregistered operations"""
         return [(method, doc) for method, (function, returns, args, doc) in self.methods.items()]
 
+    def get_document(self, method=None, message='request'):
+        """Return the wsdl (no method) or method help message as a Document
+
+        Generated once (cached until a function is registered).
+        """
+        key = (method, message if method else None)
+        document = self.documents.get(key)
+        if document is None:
+            if method is None:
+                content = self.wsdl()
+            else:
+                req, res, doc = self.help(method)
+                content = req if message == 'request' else res
+            document = self.documents[key] = Document(content)
+        return document
+
+    def document_response(self, path, query=None, if_none_match=None,
+                          accept_encoding=None):
+        """Return status, headers and content for a GET request (wsdl / help)"""
+        if path and path not in self.methods:
+            content = ("Method not found: %s" % path).encode('utf-8')
+            return 404, [('Content-Type', 'text/plain'),
+                         ('Content-Length', str(len(content)))], content
+        # return wsdl if no method supplied, or the method help (?request or
+        # ?response messages)
+        message = 'request' if not query or query == 'request' else 'response'
+        document = self.get_document(path or None, message)
+        return document.response(if_none_match, accept_encoding)
+
     def help(self, method=None):
         """Generate sample request and response messages"""
         (function, returns, args, doc) = self.methods[method]
@@ -446,6 +865,16 @@ class SoapDispatcher(object):
 
 
 class SOAPHandler(BaseHTTPRequestHandler):
+    max_body_size = 10 * 1024 * 1024   # bigger requests get a 413 response
+    compress_size = COMPRESS_SIZE       # compress bigger responses (None: never)
+
+    def handle_expect_100(self):
+        # reject big requests before the client sends the body
+        length = self.headers.get('content-length')
+        if length and int(length) > self.max_body_size:
+            self.send_error(413)
+            return False
+        return BaseHTTPRequestHandler.handle_expect_100(self)
 
     def do_GET(self):
         """User viewable help information and wsdl"""
@@ -453,47 +882,69 @@ class SOAPHandler(BaseHTTPRequestHandler):
         if self.path != "/" and args[0] not in self.server.dispatcher.methods.keys():
             self.send_error(404, "Method not found: %s" % args[0])
         else:
-            if self.path == "/":
-                # return wsdl if no method supplied
-                response = self.server.dispatcher.wsdl()
-            else:
-                # return supplied method help (?request or ?response messages)
-                req, res, doc = self.server.dispatcher.help(args[0])
-                if len(args) == 1 or args[1] == "request":
-                    response = req
-                else:
-                    response = res
-            self.send_response(200)
-            self.send_header("Content-type", "text/xml")
+            status, headers, response = self.server.dispatcher.document_response(
+                args[0], args[1] if len(args) > 1 else None,
+                self.headers.get('if-none-match'), self.headers.get('accept-encoding'))
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
             self.end_headers()
             self.wfile.write(response)
 
     def do_POST(self):
         """SOAP POST gateway"""
-        request = self.rfile.read(int(self.headers.get('content-length')))
-        # convert xml request to unicode (according to request headers)
+        length = self.headers.get('content-length')
+        chunked = 'chunked' in (self.headers.get('transfer-encoding') or '').lower()
+        if not chunked and length and int(length) > self.max_body_size:
+            self.close_connection = 1
+            self.send_error(413)
+            return
+        request = RequestBody(self.rfile, None if chunked else int(length or 0),
+                              chunked, self.max_body_size)
+        try:
+            request = decode_body(request, self.headers.get('content-encoding'),
+                                  self.max_body_size)
+        except ValueError:
+            self.close_connection = 1
+            self.send_error(415, "Unsupported Content-Encoding")
+            return
         if sys.version < '3':
             encoding = self.headers.getparam("charset")
         else:
             encoding = self.headers.get_param("charset")
-        request = request.decode(encoding)
         fault = {}
-        # execute the method
-        response = self.server.dispatcher.dispatch(request, fault=fault)
+        # execute the method (the body is parsed while it is read)
+        try:
+            if encoding and encoding.lower() not in UTF8_CHARSETS:
+                # convert xml request to unicode (according to request headers)
+                request = request.read().decode(encoding)
+            response = self.server.dispatcher.dispatch(request, fault=fault)
+        except RequestEntityTooLarge:
+            self.close_connection = 1
+            self.send_error(413)
+            return
+        headers, response = compress_response(
+            response, self.headers.get('accept-encoding'), self.compress_size)
         # check if fault dict was completed (faultcode, faultstring, detail)
         if fault:
             self.send_response(500)
         else:
             self.send_response(200)
         self.send_header("Content-type", "text/xml")
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(response)
 
 
 class WSGISOAPHandler(object):
+    max_body_size = 10 * 1024 * 1024   # bigger requests get a 413 response
+    compress_size = COMPRESS_SIZE       # compress bigger responses (None: never)
 
-    def __init__(self, dispatcher):
+    def __init__(self, dispatcher, max_body_size=None):
         self.dispatcher = dispatcher
+        if max_body_size is not None:
+            self.max_body_size = max_body_size
 
     def __call__(self, environ, start_response):
         return self.handler(environ, start_response)
@@ -510,29 +961,43 @@ class WSGISOAPHandler(object):
     def do_get(self, environ, start_response):
         path = environ.get('PATH_INFO').lstrip('/')
         query = environ.get('QUERY_STRING')
-        if path != "" and path not in self.dispatcher.methods.keys():
-            start_response('404 Not Found', [('Content-Type', 'text/plain')])
-            return ["Method not found: %s" % path]
-        elif path == "":
-            # return wsdl if no method supplied
-            response = self.dispatcher.wsdl()
-        else:
-            # return supplied method help (?request or ?response messages)
-            req, res, doc = self.dispatcher.help(path)
-            if len(query) == 0 or query == "request":
-                response = req
-            else:
-                response = res
-        start_response('200 OK', [('Content-Type', 'text/xml'), ('Content-Length', str(len(response)))])
+        status, headers, response = self.dispatcher.document_response(
+            path, query, environ.get('HTTP_IF_NONE_MATCH'),
+            environ.get('HTTP_ACCEPT_ENCODING'))
+        start_response('%d %s' % (status, HTTP_STATUS[status]), headers)
         return [response]
 
     def do_post(self, environ, start_response):
-        length = int(environ['CONTENT_LENGTH'])
-        request = environ['wsgi.input'].read(length)
-        response = self.dispatcher.dispatch(request)
-        start_response('200 OK', [('Content-Type', 'text/xml'), ('Content-Length', str(len(response)))])
+        length = environ.get('CONTENT_LENGTH')
+        if length:
+            length = int(length)
+        elif not environ.get('wsgi.input_terminated'):
+            length = 0
+        else:
+            length = None       # i.e. chunked, read until the end
+        if length and length > self.max_body_size:
+            return self.request_too_large(start_response)
+        request = RequestBody(environ['wsgi.input'], length,
+                              max_size=self.max_body_size)
+        try:
+            request = decode_body(request, environ.get('HTTP_CONTENT_ENCODING'),
+                                  self.max_body_size)
+        except ValueError:
+            start_response('415 Unsupported Media Type', [('Content-Type', 'text/plain')])
+            return [b'Unsupported Content-Encoding']
+        try:
+            response = self.dispatcher.dispatch(request)
+        except RequestEntityTooLarge:
+            return self.request_too_large(start_response)
+        headers, response = compress_response(
+            response, environ.get('HTTP_ACCEPT_ENCODING'), self.compress_size)
+        start_response('200 OK', [('Content-Type', 'text/xml'), ('Content-Length', str(len(response)))] + headers)
         return [response]
 
+    def request_too_large(self, start_response):
+        start_response('413 Request Entity Too Large', [('Content-Type', 'text/plain')])
+        return [b'Request Entity Too Large']
+
 
 if __name__ == "__main__":
 
@@ -592,6 +1057,16 @@ if __name__ == "__main__":
         wsgid = make_server('', 8008, application)
         wsgid.serve_forever()
 
+    if '--prefork-serve' in sys.argv:
+        log.info("Starting pre-fork server...")
+        from .prefork import PreforkServer
+        PreforkServer(dispatcher, ("", 8008)).serve_forever()
+
+    if '--aio-serve' in sys.argv:
+        log.info("Starting asyncio server...")
+        from .aioserver import AsyncSoapServer
+        AsyncSoapServer(dispatcher).serve_forever('', 8008)
+
     if '--consume' in sys.argv:
         from .client import SoapClient
         client = SoapClient(
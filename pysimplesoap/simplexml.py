@@ -25,6 +25,7 @@ import time
 import xml.dom.minidom
 
 from . import __author__, __copyright__, __license__, __version__
+from .backends import get_xml_backend, get_XMLBackend
 
 # Utility functions used for marshalling, moved aside for readability
 from .helpers import TYPE_MAP, TYPE_MARSHAL_FN, TYPE_UNMARSHAL_FN, \
@@ -37,10 +38,13 @@ class SimpleXMLElement(object):
     """Simple XML manipulation (simil PHP)"""
 
     def __init__(self, text=None, elements=None, document=None,
-                 namespace=None, prefix=None, namespaces_map={}, jetty=False):
+                 namespace=None, prefix=None, namespaces_map={}, jetty=False,
+                 backend=None):
         """
         :param namespaces_map: How to map our namespace prefix to that given by the client;
           {prefix: received_prefix}
+        :param backend: XML tree implementation ('minidom', 'etree'), see
+          backends.set_xml_backend to change the default
         """
         self.__namespaces_map = namespaces_map
         _rx = "|".join(namespaces_map.keys())  # {'external': 'ext', 'model': 'mod'} -> 'external|model'
@@ -50,47 +54,52 @@ class SimpleXMLElement(object):
         self.__ns = namespace
         self.__prefix = prefix
         self.__jetty = jetty                           # special list support
+        if isinstance(backend, basestring):
+            backend = get_xml_backend(backend)
+        self.__backend = backend or get_XMLBackend()
 
         if text is not None:
             try:
-                self.__document = xml.dom.minidom.parseString(text)
+                self.__document = self.__backend.parse(text)
             except:
                 log.error(text)
                 raise
-            self.__elements = [self.__document.documentElement]
+            self.__elements = [self.__backend.document_element(self.__document)]
         else:
             self.__elements = elements
             self.__document = document
 
     def add_child(self, name, text=None, ns=True):
         """Adding a child tag to a node"""
+        backend = self.__backend
         if not ns or self.__ns is False:
             ##log.debug('adding %s without namespace', name)
-            element = self.__document.createElement(name)
+            element = backend.create_element(self.__document, name)
         else:
             ##log.debug('adding %s ns "%s" %s', name, self.__ns, ns)
             if isinstance(ns, basestring):
-                element = self.__document.createElement(name)
+                element = backend.create_element(self.__document, name)
                 if ns:
-                    element.setAttribute("xmlns", ns)
+                    backend.set_attribute(element, "xmlns", ns)
             elif self.__prefix:
-                element = self.__document.createElementNS(self.__ns, "%s:%s" % (self.__prefix, name))
+                element = backend.create_element(self.__document, "%s:%s" % (self.__prefix, name), self.__ns)
             else:
-                element = self.__document.createElementNS(self.__ns, name)
+                element = backend.create_element(self.__document, name, self.__ns)
         # don't append null tags!
         if text is not None:
             if isinstance(text, xml.dom.minidom.CDATASection):
-                element.appendChild(self.__document.createCDATASection(text.data))
+                backend.append_cdata(self.__document, element, text.data)
             else:
-                element.appendChild(self.__document.createTextNode(text))
-        self._element.appendChild(element)
+                backend.append_text(self.__document, element, text)
+        backend.append_child(self.__document, self._element, element)
         return SimpleXMLElement(
             elements=[element],
             document=self.__document,
             namespace=self.__ns,
             prefix=self.__prefix,
             jetty=self.__jetty,
-            namespaces_map=self.__namespaces_map
+            namespaces_map=self.__namespaces_map,
+            backend=self.__backend
         )
 
     def __setattr__(self, tag, text):
@@ -103,68 +112,57 @@ class SimpleXMLElement(object):
 
     def __delattr__(self, tag):
         """Remove a child tag (non recursive!)"""
-        elements = [__element for __element in self._element.childNodes
-                    if __element.nodeType == __element.ELEMENT_NODE]
+        elements = self.__backend.children(self._element)
         for element in elements:
-            self._element.removeChild(element)
+            self.__backend.remove_child(self.__document, self._element, element)
 
     def add_comment(self, data):
         """Add an xml comment to this child"""
-        comment = self.__document.createComment(data)
-        self._element.appendChild(comment)
+        self.__backend.append_comment(self.__document, self._element, data)
 
     def as_xml(self, filename=None, pretty=False):
         """Return the XML representation of the document"""
-        if not pretty:
-            return self.__document.toxml('UTF-8')
-        else:
-            return self.__document.toprettyxml(encoding='UTF-8')
+        return self.__backend.to_xml(self.__document, pretty)
 
     if sys.version > '3':
         def __repr__(self):
             """Return the XML representation of this tag"""
-            return self._element.toxml()
+            return self.__backend.element_xml(self._element)
     else:
         def __repr__(self):
             """Return the XML representation of this tag"""
             # NOTE: do not use self.as_xml('UTF-8') as it returns the whole xml doc
-            return self._element.toxml('UTF-8')
+            return self.__backend.element_xml(self._element).encode('UTF-8')
 
     def get_name(self):
         """Return the tag name of this node"""
-        return self._element.tagName
+        return self.__backend.get_name(self._element)
 
     def get_local_name(self):
         """Return the tag local name (prefix:name) of this node"""
-        return self._element.localName
+        return self.__backend.get_local_name(self._element)
 
     def get_prefix(self):
         """Return the namespace prefix of this node"""
-        return self._element.prefix
+        return self.__backend.get_prefix(self._element)
 
     def get_namespace_uri(self, ns):
         """Return the namespace uri for a prefix"""
-        element = self._element
-        while element is not None and element.attributes is not None:
-            try:
-                return element.attributes['xmlns:%s' % ns].value
-            except KeyError:
-                element = element.parentNode
+        return self.__backend.namespace_uri(self.__document, self._element, ns)
 
     def attributes(self):
         """Return a dict of attributes for this tag"""
         #TODO: use slice syntax [:]?
-        return self._element.attributes
+        return self.__backend.attributes(self._element)
 
     def __getitem__(self, item):
         """Return xml tag attribute value or a slice of attributes (iter)"""
         ##log.debug('__getitem__(%s)', item)
         if isinstance(item, basestring):
-            if self._element.hasAttribute(item):
-                return self._element.attributes[item].value
+            return self.__backend.get_attribute(self._element, item)
         elif isinstance(item, slice):
             # return a list with name:values
-            return list(self._element.attributes.items())[item]
+            return self.__backend.attribute_items(self._element)[item]
         else:
             # return element by index (position)
             element = self.__elements[item]
@@ -174,12 +172,13 @@ class SimpleXMLElement(object):
                 namespace=self.__ns,
                 prefix=self.__prefix,
                 jetty=self.__jetty,
-                namespaces_map=self.__namespaces_map
+                namespaces_map=self.__namespaces_map,
+                backend=self.__backend
             )
 
     def add_attribute(self, name, value):
         """Set an attribute value from a string"""
-        self._element.setAttribute(name, value)
+        self.__backend.set_attribute(self._element, name, value)
 
     def __setitem__(self, item, value):
         """Set an attribute value"""
@@ -192,7 +191,7 @@ class SimpleXMLElement(object):
 
     def __delitem__(self, item):
         "Remove an attribute"
-        self._element.removeAttribute(item)
+        self.__backend.remove_attribute(self._element, item)
 
     def __call__(self, tag=None, ns=None, children=False, root=False,
                  error=True, ):
@@ -201,12 +200,13 @@ class SimpleXMLElement(object):
             if root:
                 # return entire document
                 return SimpleXMLElement(
-                    elements=[self.__document.documentElement],
+                    elements=[self.__backend.document_element(self.__document)],
                     document=self.__document,
                     namespace=self.__ns,
                     prefix=self.__prefix,
                     jetty=self.__jetty,
-                    namespaces_map=self.__namespaces_map
+                    namespaces_map=self.__namespaces_map,
+                    backend=self.__backend
                 )
             if tag is None:
                 # if no name given, iterate over siblings (same level)
@@ -221,15 +221,15 @@ class SimpleXMLElement(object):
             if ns and not elements:
                 for ns_uri in isinstance(ns, (tuple, list)) and ns or (ns, ):
                     ##log.debug('searching %s by ns=%s', tag, ns_uri)
-                    elements = self._element.getElementsByTagNameNS(ns_uri, tag)
+                    elements = self.__backend.find_ns(self.__document, self._element, ns_uri, tag)
                     if elements:
                         break
             if self.__ns and not elements:
                 ##log.debug('searching %s by ns=%s', tag, self.__ns)
-                elements = self._element.getElementsByTagNameNS(self.__ns, tag)
+                elements = self.__backend.find_ns(self.__document, self._element, self.__ns, tag)
             if not elements:
                 ##log.debug('searching %s', tag)
-                elements = self._element.getElementsByTagName(tag)
+                elements = self.__backend.find(self.__document, self._element, tag)
             if not elements:
                 ##log.debug(self._element.toxml())
                 if error:
@@ -242,7 +242,8 @@ class SimpleXMLElement(object):
                 namespace=self.__ns,
                 prefix=self.__prefix,
                 jetty=self.__jetty,
-                namespaces_map=self.__namespaces_map)
+                namespaces_map=self.__namespaces_map,
+                backend=self.__backend)
         except AttributeError as e:
             raise AttributeError("Tag not found: %s (%s)" % (tag, e))
 
@@ -260,20 +261,18 @@ class SimpleXMLElement(object):
                     namespace=self.__ns,
                     prefix=self.__prefix,
                     jetty=self.__jetty,
-                    namespaces_map=self.__namespaces_map)
+                    namespaces_map=self.__namespaces_map,
+                    backend=self.__backend)
         except:
             raise
 
     def __dir__(self):
         """List xml children tags names"""
-        return [node.tagName for node
-                in self._element.childNodes
-                if node.nodeType != node.TEXT_NODE]
+        return self.__backend.child_names(self._element)
 
     def children(self):
         """Return xml children tags element"""
-        elements = [__element for __element in self._element.childNodes
-                    if __element.nodeType == __element.ELEMENT_NODE]
+        elements = self.__backend.children(self._element)
         if not elements:
             return None
             #raise IndexError("Tag %s has no children" % self._element.tagName)
@@ -283,7 +282,8 @@ class SimpleXMLElement(object):
             namespace=self.__ns,
             prefix=self.__prefix,
             jetty=self.__jetty,
-            namespaces_map=self.__namespaces_map
+            namespaces_map=self.__namespaces_map,
+            backend=self.__backend
         )
 
     def __len__(self):
@@ -292,15 +292,11 @@ class SimpleXMLElement(object):
 
     def __contains__(self, item):
         """Search for a tag name in this element or child nodes"""
-        return self._element.getElementsByTagName(item)
+        return self.__backend.find(self.__document, self._element, item)
 
     def __unicode__(self):
         """Returns the unicode text nodes of the current element"""
-        rc = ''
-        for node in self._element.childNodes:
-            if node.nodeType == node.TEXT_NODE or node.nodeType == node.CDATA_SECTION_NODE:
-                rc = rc + node.data
-        return rc
+        return self.__backend.get_text(self._element)
 
     if sys.version > '3':
         __str__ = __unicode__
@@ -317,9 +313,23 @@ class SimpleXMLElement(object):
         try:
             return float(self.__str__())
         except:
-            raise IndexError(self._element.toxml())
+            raise IndexError(self.__backend.element_xml(self._element))
 
     _element = property(lambda self: self.__elements[0])
+    _elements = property(lambda self: self.__elements)
+    _backend = property(lambda self: self.__backend)
+
+    def _wrap(self, elements):
+        """Return a SimpleXMLElement for other nodes of the same document"""
+        return SimpleXMLElement(
+            elements=elements,
+            document=self.__document,
+            namespace=self.__ns,
+            prefix=self.__prefix,
+            jetty=self.__jetty,
+            namespaces_map=self.__namespaces_map,
+            backend=self.__backend
+        )
 
     def unmarshall(self, types, strict=True):
         #import pdb; pdb.set_trace()
@@ -521,12 +531,13 @@ class SimpleXMLElement(object):
             self.add_child(name, fn(value), ns=ns)
 
     def import_node(self, other):
-        x = self.__document.importNode(other._element, True)  # deep copy
-        self._element.appendChild(x)
+        if other.__backend is not self.__backend:
+            # nodes cannot be shared between implementations, parse it again
+            other = SimpleXMLElement(repr(other), backend=self.__backend)
+        self.__backend.import_node(self.__document, self._element,
+                                   other.__document, other._element)
 
     def write_c14n(self, output=None, exclusive=True):
         "Generate the canonical version of the XML node"
-        from . import c14n
-        xml = c14n.Canonicalize(self._element, output,
-                                unsuppressedPrefixes=[] if exclusive else None)
-        return xml
+        return self.__backend.canonicalize(self.__document, self._element,
+                                           output, exclusive)
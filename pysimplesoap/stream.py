@@ -0,0 +1,305 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Streaming (incremental) SOAP response unmarshalling"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+import logging
+from io import BytesIO
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+from . import __author__, __copyright__, __license__, __version__
+from .helpers import TYPE_UNMARSHAL_FN, REVERSE_TYPE_MAP
+
+log = logging.getLogger(__name__)
+
+XSD_URI = "http://www.w3.org/2001/XMLSchema"
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+
+def get_local_name(tag):
+    "Return the local name of an ElementTree tag ({uri}name)"
+    return tag.rsplit("}", 1)[-1]
+
+
+def get_namespace_uri(tag):
+    "Return the namespace uri of an ElementTree tag ({uri}name)"
+    return tag[1:].split("}", 1)[0] if tag[:1] == "{" else None
+
+
+def get_text(element):
+    "Return the text nodes of the element (like unicode(SimpleXMLElement))"
+    return (element.text or '') + ''.join([child.tail or '' for child in element])
+
+
+class _Frame(object):
+    "Partially parsed complex element (dict) waiting for its children"
+
+    def __init__(self, element, name, types, value):
+        self.element = element
+        self.name = name
+        self.types = types
+        self.value = value
+
+
+class StreamUnmarshaller(object):
+    """Convert a SOAP response to python values while it is being read
+
+    It follows the SimpleXMLElement.unmarshall rules, but elements are
+    discarded as soon as they are converted, so memory usage does not depend
+    on the document size.
+
+    Arrays (list types) are returned as generators that parse the records
+    on demand. Like itertools.groupby, the stream is shared: the values that
+    follow an array in the document are added to the parent dict once the
+    generator is exhausted, so arrays should be consumed in document order.
+
+    Multirefs (href) are not supported as they can point anywhere.
+    """
+
+    def __init__(self, source, types, strict=True, on_fault=None):
+        if isinstance(source, bytes):
+            source = BytesIO(source)
+        self.source = source
+        self.types = types
+        self.strict = strict
+        self.on_fault = on_fault        # callback receiving the Body xml
+        self.__events = ElementTree.iterparse(source, events=('start', 'end'))
+        self.__pending = []
+        self.__stack = []
+
+    def unmarshall(self):
+        "Return the converted Body children (arrays are parsed lazily)"
+        depth = 0
+        for event, element in self.__events:
+            if event == 'start':
+                depth += 1
+                if depth == 2 and get_local_name(element.tag) == 'Body':
+                    break
+            else:
+                depth -= 1
+        else:
+            raise RuntimeError("SOAP Body not found in the response")
+        body = element
+        event, element = self.__next()
+        self.__pending.append((event, element))
+        if event == 'start' and get_local_name(element.tag) == 'Fault' and self.on_fault:
+            self.__consume(body)
+            self.on_fault(ElementTree.tostring(body))
+            result = self.unmarshall_elements(list(body), self.types)
+            self.close()
+            return result
+        result = {}
+        self.__stack.append(_Frame(body, None, self.types, result))
+        self.__advance()
+        return result
+
+    def close(self):
+        "Stop parsing and release the source (i.e. the http response)"
+        self.__stack = []
+        if hasattr(self.source, 'close'):
+            self.source.close()
+
+    def __next(self):
+        "Return the next parser event (start or end, element)"
+        if self.__pending:
+            return self.__pending.pop()
+        return next(self.__events)
+
+    def __consume(self, element):
+        "Parse until the end of the element (so the subtree is complete)"
+        while True:
+            event, node = self.__next()
+            if event == 'end' and node is element:
+                return
+
+    def __advance(self):
+        "Parse until the next array (returned as a generator) or the end"
+        while self.__stack:
+            frame = self.__stack[-1]
+            event, element = self.__next()
+            if event == 'end':
+                # the complex element is complete
+                self.__stack.pop()
+                if not self.__stack:
+                    self.close()
+                    break
+                parent = self.__stack[-1]
+                if not frame.value and parent.value.get(frame.name) is frame.value:
+                    parent.value[frame.name] = None     # no children
+                parent.element.remove(element)
+                continue
+            name = str(get_local_name(element.tag))
+            fn = self.get_type(frame.types, name, element)
+            if isinstance(fn, list):
+                frame.value[name] = self.__iter_array(frame, name, fn, element)
+                return
+            elif isinstance(fn, dict):
+                value = frame.value[name] = {}
+                self.__stack.append(_Frame(element, name, fn, value))
+            else:
+                self.__consume(element)
+                self.store(frame.value, name, fn, element)
+                frame.element.remove(element)
+
+    def __iter_children(self, element):
+        "Yield each complete child (or the element itself if it has none)"
+        found = False
+        while True:
+            event, child = self.__next()
+            if event == 'end':
+                break
+            found = True
+            self.__consume(child)
+            yield child
+            element.remove(child)
+        if not found:
+            yield element
+
+    def __iter_array(self, frame, name, fn, element):
+        "Generator of array items (consecutive repeated elements)"
+        while True:
+            if fn and not isinstance(fn[0], dict):
+                # simple arrays []
+                for child in self.__iter_children(element):
+                    for value in self.unmarshall_elements([child], fn[0]).values():
+                        yield value
+            elif len(fn[0]) > 1:
+                # jetty style arrays [{k, v}]
+                self.__consume(element)
+                value = {}
+                for child in list(element):
+                    value.update(self.unmarshall_elements([child], fn[0]))
+                yield value
+            else:
+                for child in self.__iter_children(element):
+                    yield self.unmarshall_elements([child], fn[0])
+            frame.element.remove(element)
+            # check if the array continues (the same tag is repeated):
+            event, element = self.__next()
+            if event != 'start' or get_local_name(element.tag) != name:
+                self.__pending.append((event, element))
+                break
+        self.__advance()
+
+    def get_type(self, types, name, node):
+        "Look for the conversion function of the element (None == any)"
+        if not isinstance(types, dict):
+            return types
+        try:
+            fn = types[name]
+        except KeyError:
+            pass
+        else:
+            # custom array only in the response (not defined in the WSDL):
+            # <results soapenc:arrayType="xsd:string[199]>
+            if not isinstance(fn, list) and [k for k in node.keys() if 'arrayType' in k]:
+                fn = [fn]
+            return fn
+        if node.get(XSI_TYPE) is not None:
+            xsd_type = node.get(XSI_TYPE).split(":")[1]
+            try:
+                # get fn type from SOAP-ENC:arrayType="xsd:string[28]"
+                if xsd_type == 'Array':
+                    array_type = [v for k, v in node.items() if 'arrayType' in k][0]
+                    xsd_type = array_type.split(":")[1]
+                    if "[" in xsd_type:
+                        xsd_type = xsd_type[:xsd_type.index("[")]
+                    return [REVERSE_TYPE_MAP[xsd_type]]
+                else:
+                    return REVERSE_TYPE_MAP[xsd_type]
+            except:
+                return None  # ignore multirefs!
+        elif get_namespace_uri(node.tag) == XSD_URI:
+            # self-defined schema, return the SimpleXMLElement
+            return None
+        elif None in types:
+            # <s:any/>, return the SimpleXMLElement
+            return None
+        elif self.strict:
+            raise TypeError("Tag: %s invalid (type not found)" % (name,))
+        else:
+            # if not strict, use default type conversion
+            return str
+
+    def unmarshall_elements(self, nodes, types):
+        "Convert complete elements (siblings) to a python dict"
+        d = {}
+        for node in nodes:
+            name = str(get_local_name(node.tag))
+            fn = self.get_type(types, name, node)
+            self.store(d, name, fn, node)
+        return d
+
+    def store(self, d, name, fn, node):
+        "Convert a complete element and store its value in the dict"
+        if isinstance(fn, list):
+            # append to existing list (if any) - unnested dict arrays -
+            value = d.setdefault(name, [])
+            children = list(node) or [node]
+            if fn and not isinstance(fn[0], dict):
+                for child in children:
+                    value.extend(self.unmarshall_elements([child], fn[0]).values())
+            elif len(fn[0]) > 1:
+                tmp_dict = {}
+                for child in list(node):
+                    tmp_dict.update(self.unmarshall_elements([child], fn[0]))
+                value.append(tmp_dict)
+            else:
+                for child in children:
+                    value.append(self.unmarshall_elements([child], fn[0]))
+        elif isinstance(fn, tuple):
+            value = []
+            _d = {}
+            as_dict = len(fn) == 1 and isinstance(fn[0], dict)
+            for child in list(node):
+                if as_dict:
+                    _d.update(self.unmarshall_elements([child], fn[0]))
+                else:
+                    value.append(self.unmarshall_elements([child], fn[0]))
+            if as_dict:
+                value.append(_d)
+            if name in d:
+                value = tuple(list(d[name]) + value)
+            else:
+                value = tuple(value)
+        elif isinstance(fn, dict):
+            children = list(node)
+            value = self.unmarshall_elements(children, fn) if children else None
+        elif fn is None:
+            # xsd:anyType not unmarshalled
+            from .simplexml import SimpleXMLElement  # avoid recursive imports
+            value = SimpleXMLElement(ElementTree.tostring(node))
+        else:
+            text = get_text(node)
+            if text:
+                try:
+                    # get special deserialization function (if any)
+                    fn = TYPE_UNMARSHAL_FN.get(fn, fn)
+                    if fn == str:
+                        value = unicode(text)
+                    else:
+                        value = fn(text)
+                except (ValueError, TypeError) as e:
+                    raise ValueError("Tag: %s: %s" % (name, e))
+            else:
+                value = None
+        d[name] = value
@@ -0,0 +1,275 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 3, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+# for more details.
+
+"""Precompiled SOAP envelope templates and fast xml serialization"""
+
+
+from __future__ import unicode_literals
+import sys
+if sys.version > '3':
+    basestring = unicode = str
+
+import logging
+import xml.dom.minidom
+
+from . import __author__, __copyright__, __license__, __version__
+from .helpers import TYPE_MAP, TYPE_MARSHAL_FN
+from .backends import xml_escape
+
+log = logging.getLogger(__name__)
+
+# placeholder inserted in the method element to split the envelope skeleton
+BODY_MARKER = "pysimplesoap:body"
+
+
+class UnsupportedValue(TypeError):
+    "Value cannot be serialized by the fast writer (use the DOM instead)"
+
+
+class XMLWriter(object):
+    """Serialize python values straight into xml text
+
+    It mimics SimpleXMLElement.add_child / marshall (namespaces, empty tags,
+    comments, CDATA, special types) but writes the tags into a list of
+    strings instead of building (and later serializing) a DOM tree.
+    """
+
+    def __init__(self, namespace=None, prefix=None, namespaces_map=None):
+        self.namespace = namespace      # default namespace (as SimpleXMLElement)
+        self.prefix = prefix            # default prefix (createElementNS)
+        self.namespaces_map = namespaces_map or {}
+        self.parts = []
+        self.write = self.parts.append
+        self.__stack = []               # open tags (name, start tag pending)
+        self.__names = {}               # name: name with the client prefix
+
+    def getvalue(self):
+        "Return the xml text written so far"
+        return "".join(self.parts)
+
+    def tag_name(self, name, ns=True):
+        "Return the start tag (without the closing bracket) for a child"
+        if not ns or self.namespace is False:
+            return name, "<%s" % name
+        elif isinstance(ns, basestring):
+            return name, '<%s xmlns="%s"' % (name, xml_escape(ns))
+        elif self.prefix:
+            name = "%s:%s" % (self.prefix, name)
+            return name, "<%s" % name
+        else:
+            return name, "<%s" % name
+
+    def __content(self):
+        "Close the pending start tag of the parent (if any)"
+        if self.__stack and self.__stack[-1][1]:
+            self.__stack[-1][1] = False
+            self.write(">")
+
+    def start(self, name, ns=True):
+        "Open a child tag (closed later with end)"
+        self.__content()
+        tag, start = self.tag_name(name, ns)
+        self.write(start)
+        self.__stack.append([tag, True])
+
+    def end(self):
+        "Close the current tag (empty tags are written as <tag/>)"
+        tag, pending = self.__stack.pop()
+        if pending:
+            self.write("/>")
+        else:
+            self.write("</%s>" % tag)
+
+    def text(self, text):
+        "Add a text (or CDATA) node to the current tag"
+        self.__content()
+        if isinstance(text, xml.dom.minidom.CDATASection):
+            if "]]>" in text.data:
+                raise ValueError("']]>' not allowed in a CDATA section")
+            self.write("<![CDATA[%s]]>" % text.data)
+        elif text:
+            self.write(xml_escape(text))
+
+    def comment(self, data):
+        "Add a comment to the current tag"
+        self.__content()
+        if "--" in data:
+            raise ValueError("'--' is not allowed in a comment node")
+        self.write("<!--%s-->" % data)
+
+    def add_child(self, name, text=None, ns=True):
+        "Add a complete child tag (with optional text)"
+        self.start(name, ns)
+        if text is not None:
+            # empty strings are text nodes too (<tag></tag>)
+            self.__content()
+            self.text(text)
+        self.end()
+
+    def update_ns(self, name):
+        "Replace the defined namespace alias with those used by the client"
+        if self.namespaces_map and ":" in name:
+            updated = self.__names.get(name)
+            if updated is None:
+                updated = name
+                pref = name.split(":")[0]
+                if pref in self.namespaces_map:
+                    updated = name.replace(pref, self.namespaces_map[pref])
+                self.__names[name] = updated
+            return updated
+        return name
+
+    def marshall(self, name, value, add_child=True, add_comments=False,
+                 ns=False, add_children_ns=True):
+        "Analyze python value and write the serialized XML element"
+        name = self.update_ns(name)
+
+        if isinstance(value, dict):
+            if add_child:
+                self.start(name, ns)
+            for k, v in value.items():
+                if not add_children_ns:
+                    ns = False
+                elif hasattr(value, 'namespaces'):
+                    # for children, use the wsdl element target namespace:
+                    ns = value.namespaces.get(k)
+                else:
+                    # simple type
+                    ns = None
+                self.marshall(k, v, add_comments=add_comments, ns=ns)
+            if add_child:
+                self.end()
+        elif isinstance(value, tuple):
+            # tuples are looked up by name in the DOM, not supported here
+            raise UnsupportedValue("tuple %s" % name)
+        elif isinstance(value, list):
+            self.start(name, ns)
+            if not add_children_ns:
+                ns = False
+            if add_comments:
+                self.comment("Repetitive array of:")
+            for i, t in enumerate(value):
+                self.marshall(name, t, False, add_comments=add_comments, ns=ns)
+                # "jetty" arrays: add new base node (if not last)
+                if isinstance(t, dict) and len(t) > 1 and i < len(value) - 1:
+                    self.end()
+                    self.start(name, ns)
+            self.end()
+        elif isinstance(value, (xml.dom.minidom.CDATASection, basestring)):
+            self.add_child(name, value, ns=ns)
+        elif value is None:
+            self.add_child(name, ns=ns)
+        elif value in TYPE_MAP.keys():
+            # add commented placeholders for simple tipes (for examples/help only)
+            self.start(name, ns)
+            self.comment(TYPE_MAP[value])
+            self.end()
+        else:
+            # get special serialization function (if any)
+            fn = TYPE_MARSHAL_FN.get(type(value), str)
+            self.add_child(name, fn(value), ns=ns)
+
+
+class EnvelopeTemplate(object):
+    """Cached SOAP request skeleton for an operation
+
+    The envelope is built and serialized once using the DOM, then it is split
+    where the method parameters go, so each request only needs to write the
+    parameters between the head and the tail.
+    """
+
+    def __init__(self, xml, method, namespace=None, prefix=None):
+        from .simplexml import SimpleXMLElement  # avoid recursive imports
+        self.method = method
+        self.namespace = namespace
+        self.prefix = prefix
+        request = SimpleXMLElement(xml, namespace=namespace, prefix=prefix)
+        # request without parameters (serialized as an empty tag)
+        self.empty = request.as_xml()
+        # mark where the parameters should be written:
+        getattr(request, method).add_comment(BODY_MARKER)
+        skeleton = request.as_xml()
+        if not isinstance(skeleton, unicode):
+            skeleton = skeleton.decode("utf8")
+        self.head, self.tail = skeleton.split("<!--%s-->" % BODY_MARKER)
+
+    def render(self, parameters, ns=True, plan=None):
+        """Return the xml request for the parameters [(name, value), ...]
+
+        :param plan: MarshallPlan to write the (unsorted) WSDL parameters
+        """
+        if not parameters:
+            return self.empty
+        writer = XMLWriter(self.namespace, self.prefix)
+        writer.write(self.head)
+        for k, v in parameters:
+            if plan is not None:
+                plan.encode(writer, k, v, ns)
+                continue
+            if hasattr(v, "namespaces") and ns:
+                v_ns = v.namespaces.get(None, True)
+            else:
+                v_ns = ns
+            writer.marshall(k, v, ns=v_ns)
+        writer.write(self.tail)
+        return writer.getvalue().encode("utf8")
+
+
+class ResponseTemplate(object):
+    """Cached SOAP response skeletons for a registered function (server)
+
+    The envelope of each dialect (client soap prefix, uri and namespace
+    aliases) is built and serialized with the DOM once, so the returned
+    values are written directly between its head and tail, using the
+    writer compiled for the returns types (see plans.ResponsePlan).
+    """
+    maxsize = 64            # dialects kept (i.e. different client prefixes)
+
+    def __init__(self, dispatcher, returns=None):
+        from .plans import ResponsePlan  # avoid recursive imports
+        self.dispatcher = dispatcher
+        self.returns = returns
+        self.plan = ResponsePlan(returns) if returns else None
+        self.skeletons = {}     # dialect: (empty, head, tail, namespaces map)
+
+    def get_skeleton(self, call):
+        "Return the (cached) envelope for the call dialect"
+        key = (call.name, call.prefix, call.soap_ns, call.soap_uri,
+               tuple(sorted(call.ns_reversed.items())))
+        skeleton = self.skeletons.get(key)
+        if skeleton is None:
+            response, body, mapping = self.dispatcher.build_envelope(call)
+            res = self.dispatcher.add_response_element(call, body)
+            # response without values (serialized as an empty tag)
+            empty = response.as_xml()
+            res.add_comment(BODY_MARKER)
+            xml = response.as_xml()
+            if not isinstance(xml, unicode):
+                xml = xml.decode("utf8")
+            head, tail = xml.split("<!--%s-->" % BODY_MARKER)
+            if len(self.skeletons) >= self.maxsize:
+                self.skeletons.clear()
+            skeleton = self.skeletons[key] = (empty, head, tail, mapping)
+        return skeleton
+
+    def render(self, call, values):
+        """Return the xml response for the returned values [(name, value)]"""
+        empty, head, tail, mapping = self.get_skeleton(call)
+        writer = XMLWriter(namespaces_map=mapping)
+        for k, v in values:
+            if self.plan is not None:
+                self.plan.encode(writer, k, v)
+            else:
+                writer.marshall(k, v)
+        if not writer.parts:
+            return empty
+        return (head + writer.getvalue() + tail).encode("utf8")
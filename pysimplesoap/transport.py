@@ -14,16 +14,26 @@
 
 
 import logging
+import select
+import socket
 import ssl
 import sys
+import threading
+import time
+import zlib
 from distutils.version import LooseVersion
+from io import BytesIO
 
 try:
     import urllib2
+    import httplib
     from cookielib import CookieJar
+    from urlparse import urlsplit
 except ImportError:
     from urllib import request as urllib2
+    from http import client as httplib
     from http.cookiejar import CookieJar
+    from urllib.parse import urlsplit
 
 from . import __author__, __copyright__, __license__, __version__, TIMEOUT
 from .simplexml import SimpleXMLElement, TYPE_MAP, Struct
@@ -57,7 +67,80 @@ _http_facilities = {}  # functionalitylabel: [sequence of libname] mapping
 class TransportBase:
     @classmethod
     def supports_feature(cls, feature_name):
-        return cls._wrapper_name in _http_facilities[feature_name]
+        return cls._wrapper_name in _http_facilities.get(feature_name, [])
+
+    def request_stream(self, url, method="GET", body=None, headers={}):
+        """Return the response and a file-like object to read the content
+
+        Transports supporting the "stream" feature do not buffer the content.
+        """
+        response, content = self.request(url, method, body, headers)
+        return response, BytesIO(content)
+
+
+#
+# Content-Encoding (compressed request / response bodies) support.
+#
+CONTENT_ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'x-gzip': 16 + zlib.MAX_WBITS,
+                     'deflate': zlib.MAX_WBITS}
+
+
+def compress(data, encoding='gzip', level=6):
+    "Compress a body (gzip or deflate content encoding), without extra copies"
+    compressor = zlib.compressobj(level, zlib.DEFLATED, CONTENT_ENCODINGS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding):
+    "Decompress a gzip or deflate encoded body"
+    return DecompressingStream(BytesIO(data), encoding).read()
+
+
+class DecompressingStream(object):
+    """File-like object decompressing a gzip or deflate encoded stream
+
+    Raw deflate data (sent by some servers as "deflate") is also accepted.
+    """
+
+    def __init__(self, stream, encoding, chunk_size=65536):
+        if encoding not in CONTENT_ENCODINGS:
+            raise ValueError("unsupported content encoding %s" % encoding)
+        self.stream = stream
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.decompressor = zlib.decompressobj(CONTENT_ENCODINGS[encoding])
+        self.started = False
+        self.buffer = b''
+        self.eof = False
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self.buffer += self.decompressor.flush()
+                self.eof = True
+            else:
+                self.buffer += self.decompress(chunk)
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def decompress(self, chunk):
+        if not self.started and self.encoding == 'deflate':
+            self.started = True
+            try:
+                return self.decompressor.decompress(chunk)
+            except zlib.error:
+                # raw deflate (without the zlib header)
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.decompressor.decompress(chunk)
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+
 
 #
 # httplib2 support.
@@ -151,12 +234,267 @@ class urllib2Transport(TransportBase):
                 raise
             return f.info(), f.read()
 
+    def request_stream(self, url, method="GET", body=None, headers={}):
+        req = urllib2.Request(url, body, headers)
+        try:
+            f = self.request_opener(req, timeout=self._timeout)
+            return f.info(), f
+        except urllib2.HTTPError as f:
+            if f.code != 500:
+                raise
+            # the SOAP fault is in the error response body
+            return f.info(), f
+
 _http_connectors['urllib2'] = urllib2Transport
 _http_facilities.setdefault('sessions', []).append('urllib2')
+_http_facilities.setdefault('stream', []).append('urllib2')
+_http_facilities.setdefault('threadsafe', []).append('urllib2')
 
 if sys.version_info >= (2, 6):
     _http_facilities.setdefault('timeout', []).append('urllib2')
 
+#
+# persistent connections (HTTP/1.1 keep-alive) support.
+#
+class ConnectionPool(object):
+    """Keep-alive connections to a host (reused, at most maxsize at once)"""
+
+    def __init__(self, scheme, netloc, timeout=None, context=None,
+                 maxsize=4, idle_timeout=60):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self.context = context
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.idle = []              # (connection, last used time), oldest first
+        self.count = 0              # connections open (idle or in use)
+        self.condition = threading.Condition()
+
+    def connect(self):
+        "Open a new connection to the host"
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        if self.scheme == 'https':
+            if self.context is not None:
+                kwargs['context'] = self.context
+            return httplib.HTTPSConnection(self.netloc, **kwargs)
+        return httplib.HTTPConnection(self.netloc, **kwargs)
+
+    def get(self):
+        "Return an idle connection (or a new one) and if it was reused"
+        deadline = None
+        with self.condition:
+            while True:
+                self.expire()
+                while self.idle:
+                    conn, used = self.idle.pop()
+                    if is_connection_alive(conn):
+                        return conn, True
+                    conn.close()
+                    self.count -= 1
+                if self.count < self.maxsize:
+                    self.count += 1
+                    break
+                # all the connections are in use, wait for one:
+                if self.timeout is not None:
+                    if deadline is None:
+                        deadline = time.time() + self.timeout
+                    elif time.time() >= deadline:
+                        raise RuntimeError('no connection available for %s' % self.netloc)
+                    self.condition.wait(max(deadline - time.time(), 0))
+                else:
+                    self.condition.wait()
+        try:
+            return self.connect(), False
+        except Exception:
+            self.discard(None)
+            raise
+
+    def put(self, conn):
+        "Return the connection to the pool (to be reused)"
+        with self.condition:
+            self.idle.append((conn, time.time()))
+            self.condition.notify()
+
+    def discard(self, conn):
+        "Close a connection not usable anymore"
+        if conn is not None:
+            conn.close()
+        with self.condition:
+            self.count -= 1
+            self.condition.notify()
+
+    def expire(self):
+        "Close the connections idle for too long (oldest first)"
+        now = time.time()
+        while self.idle and now - self.idle[0][1] >= self.idle_timeout:
+            conn, used = self.idle.pop(0)
+            conn.close()
+            self.count -= 1
+
+    def close(self):
+        "Close all the idle connections"
+        with self.condition:
+            while self.idle:
+                conn, used = self.idle.pop()
+                conn.close()
+                self.count -= 1
+
+
+def is_connection_alive(conn):
+    "Health check: an idle connection should not be readable (closed by peer)"
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        return not select.select([sock], [], [], 0)[0]
+    except (ValueError, select.error):
+        return False
+
+
+class PooledResponse(object):
+    """File-like response content, the connection is reused when read"""
+
+    def __init__(self, pool, conn, response):
+        self.pool = pool
+        self.conn = conn
+        self.response = response
+
+    def read(self, size=-1):
+        if self.response is None:
+            return b""
+        if size is None or size < 0:
+            data = self.response.read()
+        else:
+            data = self.response.read(size)
+        if not data or self.response.isclosed():
+            self.release()
+        return data
+
+    def release(self):
+        "Return the connection to the pool (or close it if not reusable)"
+        if self.response is not None:
+            response, self.response = self.response, None
+            if response.isclosed() and not response.will_close:
+                self.pool.put(self.conn)
+            else:
+                response.close()
+                self.pool.discard(self.conn)
+
+    close = release
+
+
+_connection_pools = {}      # (scheme, netloc, timeout, cacert): ConnectionPool
+_connection_pools_lock = threading.Lock()
+
+
+def closed_without_response(error):
+    "Return True if the connection was closed before any response byte"
+    remote_disconnected = getattr(httplib, 'RemoteDisconnected', None)
+    if remote_disconnected is not None:
+        return isinstance(error, remote_disconnected)
+    # python 2: empty status line
+    return isinstance(error, httplib.BadStatusLine) and error.line in ("''", '')
+
+
+class PooledTransport(TransportBase):
+    """HTTP/1.1 transport reusing persistent connections (per host pools)
+
+    The pools are shared by all the instances in the process, so each host
+    gets at most pool_size connections; idle ones are closed after
+    idle_timeout seconds or if the server closed them.
+    """
+    _wrapper_version = "pooled %s" % __version__
+    _wrapper_name = 'pooled'
+    pool_size = 4               # maximum connections per host
+    idle_timeout = 60           # seconds to keep an idle connection
+
+    def __init__(self, timeout=None, proxy=None, cacert=None, sessions=False):
+        if proxy:
+            raise RuntimeError('proxy is not supported with pooled transport')
+        if sessions:
+            raise RuntimeError('sessions is not supported with pooled transport')
+        self._timeout = timeout
+        self.cacert = cacert
+
+    def get_pool(self, scheme, netloc):
+        "Return the shared connection pool for the host"
+        key = (scheme, netloc, self._timeout, self.cacert)
+        with _connection_pools_lock:
+            pool = _connection_pools.get(key)
+            if pool is None:
+                context = None
+                if scheme == 'https' and hasattr(ssl, 'create_default_context'):
+                    context = ssl.create_default_context(cafile=self.cacert)
+                    if not self.cacert:
+                        # same as urllib2 transport (no verification)
+                        context.check_hostname = False
+                        context.verify_mode = ssl.CERT_NONE
+                pool = ConnectionPool(scheme, netloc, self._timeout, context,
+                                      self.pool_size, self.idle_timeout)
+                _connection_pools[key] = pool
+            return pool
+
+    def request_stream(self, url, method="GET", body=None, headers={}):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme not in ('http', 'https'):
+            raise RuntimeError('%s scheme is not supported with pooled transport' % scheme)
+        if query:
+            path = '%s?%s' % (path, query)
+        pool = self.get_pool(scheme, netloc)
+        while True:
+            conn, reused = pool.get()
+            try:
+                conn.request(method, path or '/', body, headers)
+            except socket.timeout:
+                pool.discard(conn)
+                raise
+            except (httplib.HTTPException, socket.error):
+                pool.discard(conn)
+                # the server could have closed an idle connection, retry:
+                if not reused:
+                    raise
+                continue
+            except Exception:
+                pool.discard(conn)
+                raise
+            try:
+                response = conn.getresponse()
+                break
+            except Exception as e:
+                pool.discard(conn)
+                # the request was sent: only retry if the server closed the
+                # idle connection without answering (never if a response began)
+                if not (reused and closed_without_response(e)):
+                    raise
+        info = dict([(k.lower(), v) for k, v in response.getheaders()])
+        info['status'] = str(response.status)
+        content = PooledResponse(pool, conn, response)
+        if response.status >= 400 and response.status != 500:
+            raise urllib2.HTTPError(url, response.status, response.reason,
+                                    response.msg, BytesIO(content.read()))
+        return info, content
+
+    def request(self, url, method="GET", body=None, headers={}):
+        info, content = self.request_stream(url, method, body, headers)
+        return info, content.read()
+
+_http_connectors['pooled'] = PooledTransport
+_http_facilities.setdefault('timeout', []).append('pooled')
+_http_facilities.setdefault('cacert', []).append('pooled')
+_http_facilities.setdefault('stream', []).append('pooled')
+_http_facilities.setdefault('keepalive', []).append('pooled')
+_http_facilities.setdefault('threadsafe', []).append('pooled')
+
+
+def close_connection_pools():
+    "Close the idle persistent connections (i.e. before forking)"
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.close()
+
 #
 # pycurl support.
 # experimental: pycurl seems faster + better proxy support (NTLM) + ssl features
@@ -182,9 +520,15 @@ else:
             self.timeout = timeout
             self.proxy = proxy or {}
             self.cacert = cacert
+            self.curl = None
 
         def request(self, url, method, body, headers):
-            c = pycurl.Curl()
+            # reuse the handle (and its connection cache, keep-alive):
+            c = self.curl
+            if c is None:
+                c = self.curl = pycurl.Curl()
+            else:
+                c.reset()
             c.setopt(pycurl.URL, url)
             if 'proxy_host' in self.proxy:
                 c.setopt(pycurl.PROXY, self.proxy['proxy_host'])
@@ -211,9 +555,13 @@ else:
                 log.debug(hdrs)
                 c.setopt(pycurl.HTTPHEADER, hdrs)
             c.perform()
-            c.close()
             return {}, self.buf.getvalue()
 
+        def close(self):
+            if self.curl is not None:
+                self.curl.close()
+                self.curl = None
+
     _http_connectors['pycurl'] = pycurlTransport
     _http_facilities.setdefault('proxy', []).append('pycurl')
     _http_facilities.setdefault('cacert', []).append('pycurl')
@@ -232,6 +580,10 @@ class DummyTransport:
         log.debug(body)
         return {}, self.xml_response
 
+    def request_stream(self, location, method, body, headers):
+        response, content = self.request(location, method, body, headers)
+        return response, BytesIO(content)
+
 
 def get_http_wrapper(library=None, features=[]):
     # If we are asked for a specific library, return it.
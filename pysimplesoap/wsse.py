@@ -18,6 +18,7 @@ import sys
 if sys.version > '3':
     basestring = unicode = str
 
+import base64
 import datetime
 from decimal import Decimal
 import os
@@ -125,15 +126,28 @@ BIN_TOKEN_TMPL = """<?xml version="1.0" encoding="UTF-8"?>
 """
 
 class BinaryTokenSignature:
-    "WebService Security extension to add a basic signature to xml request"
+    """WebService Security extension to add a basic signature to xml request
 
-    def __init__(self, certificate="", private_key="", password=None, cacert=None):
+    The responses are verified in the calling thread, or in the executor
+    given (i.e. a concurrent.futures.ProcessPoolExecutor, so the
+    canonicalization and the crypto of several responses run in parallel):
+    postprocess then returns the future, that SoapClient waits before
+    returning the result (call_many sends the next calls meanwhile).
+    """
+
+    # signature algorithms accepted in the responses (see xmlsec):
+    algorithms = ('rsa-sha1', 'rsa-sha256', 'rsa-sha512', 'ecdsa-sha256', 'ecdsa-sha512')
+
+    def __init__(self, certificate="", private_key="", password=None, cacert=None,
+                 algorithm='rsa-sha1', executor=None):
         # read the X509v3 certificate (PEM)
         self.certificate = ''.join([line for line in open(certificate)
                                          if not line.startswith("---")])
         self.private_key = private_key
         self.password = password
         self.cacert = cacert
+        self.algorithm = algorithm
+        self.executor = executor
 
     def preprocess(self, client, request, method, args, kwargs, headers, soap_uri):
         "Sign the outgoing SOAP request"
@@ -143,73 +157,94 @@ class BinaryTokenSignature:
         # prepare body xml attributes to be signed (reference)
         body['wsu:Id'] = "id-14"
         body['xmlns:wsu'] = WSU_URI
-        # workaround: copy namespaces so lxml can parse the xml to be signed
-        for attr, value in request[:]:
-            if attr.startswith("xmlns"):
-                body[attr] = value
-        # use the internal tag xml representation (not the full xml document)
-        ref_xml = repr(body)
-        # sign using RSA-SHA1 (XML Security)
+        # sign (XML Security), the body node is canonicalized and hashed
+        # in place (the envelope namespaces are in its context)
         from . import xmlsec
-        vars = xmlsec.rsa_sign(ref_xml, "#id-14", 
-                               self.private_key, self.password)
+        vars = xmlsec.sign(body, "#id-14", self.private_key, self.password,
+                           algorithm=self.algorithm)
         vars['certificate'] = self.certificate
         # generate the xml (filling the placeholders)
         wsse = SimpleXMLElement(BIN_TOKEN_TMPL % vars)
         header.import_node(wsse)
 
     def postprocess(self, client, response, method, args, kwargs, headers, soap_uri):
-        "Verify the signature of the incoming response"
-        from . import xmlsec
-        # get xml elements:
-        body = response('Body', ns=soap_uri, )
-        header = response('Header', ns=soap_uri, )
-        wsse = header("Security", ns=WSSE_URI)
-        cert = wsse("BinarySecurityToken", ns=WSSE_URI)
-        # check that the cert (binary token) is coming in the correct format:
-        self.__check(cert["EncodingType"], Base64Binary_URI)
-        self.__check(cert["ValueType"], X509v3_URI)
-        # extract the certificate (in DER to avoid new line & padding issues!)
-        cert_der = str(cert).decode("base64")
-        public_key = xmlsec.x509_extract_rsa_public_key(cert_der, binary=True)
-        # validate the certificate using the certification authority:
+        "Verify the signature of the incoming response (see verify_signature)"
         if not self.cacert:
             warnings.warn("No CA provided, WSSE not validating certificate")
-        elif not xmlsec.x509_verify(self.cacert, cert_der, binary=True):
-            raise RuntimeError("WSSE certificate validation failed")
-        # check body xml attributes was signed correctly (reference)
-        self.__check(body['xmlns:wsu'], WSU_URI)
-        ref_uri = body['wsu:Id']
-        signature = wsse("Signature", ns=XMLDSIG_URI)
-        signed_info = signature("SignedInfo", ns=XMLDSIG_URI)
-        signature_value = signature("SignatureValue", ns=XMLDSIG_URI)
-        # TODO: these sanity checks should be moved to xmlsec?
-        self.__check(signed_info("Reference", ns=XMLDSIG_URI)['URI'], "#" + ref_uri)
-        self.__check(signed_info("SignatureMethod", ns=XMLDSIG_URI)['Algorithm'], 
-                     XMLDSIG_URI + "rsa-sha1")
-        self.__check(signed_info("Reference", ns=XMLDSIG_URI)("DigestMethod", ns=XMLDSIG_URI)['Algorithm'], 
-                     XMLDSIG_URI + "sha1")
-        # TODO: check KeyInfo uses the correct SecurityTokenReference
-        # workaround: copy namespaces so lxml can parse the xml to be signed
-        for attr, value in response[:]:
-            if attr.startswith("xmlns"):
-                body[attr] = value
-        # use the internal tag xml representation (not the full xml document)
-        ref_xml = xmlsec.canonicalize(repr(body))
-        # verify the signed hash
-        computed_hash =  xmlsec.sha1_hash_digest(ref_xml)
-        digest_value = str(signed_info("Reference", ns=XMLDSIG_URI)("DigestValue", ns=XMLDSIG_URI))
-        if computed_hash != digest_value:
-            raise RuntimeError("WSSE SHA1 hash digests mismatch")
-        # workaround: prepare the signed info (assure the parent ns is present)
-        signed_info['xmlns'] = XMLDSIG_URI
-        xml = repr(signed_info)
-        # verify the signature using RSA-SHA1 (XML Security)
-        ok = xmlsec.rsa_verify(xml, str(signature_value), public_key)
-        if not ok:
-            raise RuntimeError("WSSE RSA-SHA1 signature verification failed")
-        # TODO: remove any unsigned part from the xml?
-        
-    def __check(self, value, expected, msg="WSSE sanity check failed"):
-        if value != expected:
-            raise RuntimeError(msg)
+        if self.executor is None:
+            verify_signature(response, soap_uri, self.cacert, self.algorithms)
+            return None
+        # the DOM can not be sent to other process, it is parsed there again
+        return self.executor.submit(verify_signature, response.as_xml(), soap_uri,
+                                    self.cacert, self.algorithms)
+
+
+def verify_signature(response, soap_uri, cacert=None,
+                     algorithms=BinaryTokenSignature.algorithms):
+    """Verify the binary token signature of a response (xml or SimpleXMLElement)
+
+    Raise RuntimeError if it is not valid (the certificate is validated
+    using the certification authority cacert, if given).
+    """
+    from . import xmlsec
+    if not isinstance(response, SimpleXMLElement):
+        response = SimpleXMLElement(response)
+    # get xml elements:
+    body = response('Body', ns=soap_uri, )
+    header = response('Header', ns=soap_uri, )
+    wsse = header("Security", ns=WSSE_URI)
+    cert = wsse("BinarySecurityToken", ns=WSSE_URI)
+    # check that the cert (binary token) is coming in the correct format:
+    _check(cert["EncodingType"], Base64Binary_URI)
+    _check(cert["ValueType"], X509v3_URI)
+    # check body xml attributes was signed correctly (reference)
+    _check(body['xmlns:wsu'], WSU_URI)
+    ref_uri = body['wsu:Id']
+    signature = wsse("Signature", ns=XMLDSIG_URI)
+    signed_info = signature("SignedInfo", ns=XMLDSIG_URI)
+    signature_value = signature("SignatureValue", ns=XMLDSIG_URI)
+    # TODO: these sanity checks should be moved to xmlsec?
+    _check(signed_info("Reference", ns=XMLDSIG_URI)['URI'], "#" + ref_uri)
+    algorithm = xmlsec.algorithm_name(
+        signed_info("SignatureMethod", ns=XMLDSIG_URI)['Algorithm'])
+    _check(algorithm in algorithms, True)
+    # i.e. ECDSA is not supported by M2Crypto:
+    provider = xmlsec.get_crypto_provider()
+    _check(provider.supports(algorithm), True,
+           "WSSE %s signature algorithm not supported by %s" % (algorithm, provider.name))
+    # extract the certificate (in DER to avoid new line & padding issues!)
+    cert_der = base64.b64decode(str(cert))
+    try:
+        public_key = xmlsec.x509_extract_public_key(cert_der, binary=True)
+    except Exception as e:
+        raise RuntimeError("WSSE certificate public key extraction failed: %s" % e)
+    # validate the certificate using the certification authority:
+    if cacert and not xmlsec.x509_verify(cacert, cert_der, binary=True):
+        raise RuntimeError("WSSE certificate validation failed")
+    digest_algorithm = xmlsec.algorithm_name(
+        signed_info("Reference", ns=XMLDSIG_URI)("DigestMethod", ns=XMLDSIG_URI)['Algorithm'],
+        xmlsec.DIGEST_ALGORITHMS)
+    _check(digest_algorithm is not None, True)
+    # TODO: check KeyInfo uses the correct SecurityTokenReference
+    # verify the signed hash (canonicalizing the body node in place)
+    computed_hash = xmlsec.canonical_digest(body, algorithm=digest_algorithm)
+    digest_value = str(signed_info("Reference", ns=XMLDSIG_URI)("DigestValue", ns=XMLDSIG_URI))
+    if computed_hash != digest_value:
+        raise RuntimeError("WSSE %s hash digests mismatch" % digest_algorithm.upper())
+    # workaround: prepare the signed info (assure the parent ns is present)
+    signed_info['xmlns'] = XMLDSIG_URI
+    xml = repr(signed_info)
+    # verify the signature (XML Security)
+    try:
+        ok = xmlsec.verify(xml, str(signature_value), public_key, algorithm=algorithm)
+    except Exception:
+        # the key does not match the algorithm (provider error)
+        ok = False
+    if not ok:
+        raise RuntimeError("WSSE %s signature verification failed" % algorithm.upper())
+    # TODO: remove any unsigned part from the xml?
+
+
+def _check(value, expected, msg="WSSE sanity check failed"):
+    if value != expected:
+        raise RuntimeError(msg)
@@ -15,8 +15,16 @@ from __future__ import print_function
 import base64
 import hashlib
 import os
-from cStringIO import StringIO
-from M2Crypto import BIO, EVP, RSA, X509, m2
+import sys
+from io import BytesIO
+
+from .c14n import HashSink
+from .cache import LRUCache, source_key, digest
+from .crypto import (SIGNATURE_ALGORITHMS, DIGEST_ALGORITHMS, algorithm_name,
+                     get_crypto_provider, set_crypto_provider)
+
+if sys.version > '3':
+    basestring = str
 
 # if lxml is not installed, use c14n.py native implementation
 try:
@@ -24,20 +32,29 @@ try:
 except ImportError:
     lxml = None
     
+# loaded keys and certificates (by provider, content, or path and modification
+# time), the provider objects are immutable and shared by the threads:
+key_cache = LRUCache(maxsize=32, ttl=3600)
+cert_cache = LRUCache(maxsize=128, ttl=3600)
+# results of the verification of peer certificates already seen:
+verify_cache = LRUCache(maxsize=1024, ttl=300)
+
 # Features:
-#  * Uses M2Crypto and lxml (libxml2) but it is independent from libxmlsec1
+#  * Uses cryptography or M2Crypto (see crypto.py) and lxml (libxml2) but it
+#    is independent from libxmlsec1
+#  * Signature algorithms: RSA-SHA1, RSA-SHA256/512, ECDSA-SHA256/512
 #  * Sign, Verify, Encrypt & Decrypt XML documents
 
 # Enveloping templates ("by reference": signature is parent):
 SIGN_REF_TMPL = """
 <SignedInfo xmlns="http://www.w3.org/2000/09/xmldsig#">
   <CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" />
-  <SignatureMethod Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1" />
+  <SignatureMethod Algorithm="%(signature_method)s" />
   <Reference URI="%(ref_uri)s">
     <Transforms>
       <Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" />
     </Transforms>
-    <DigestMethod Algorithm="http://www.w3.org/2000/09/xmldsig#sha1" />
+    <DigestMethod Algorithm="%(digest_method)s" />
     <DigestValue>%(digest_value)s</DigestValue>
   </Reference>
 </SignedInfo>
@@ -56,13 +73,13 @@ SIGNED_TMPL = """
 SIGN_ENV_TMPL = """
 <SignedInfo xmlns="http://www.w3.org/2000/09/xmldsig#">
   <CanonicalizationMethod Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/>
-  <SignatureMethod Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1"/>
+  <SignatureMethod Algorithm="%(signature_method)s"/>
   <Reference URI="">
     <Transforms>
        <Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"/>
        <Transform Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/>
     </Transforms>
-    <DigestMethod Algorithm="http://www.w3.org/2000/09/xmldsig#sha1"/>
+    <DigestMethod Algorithm="%(digest_method)s"/>
     <DigestValue>%(digest_value)s</DigestValue>
   </Reference>
 </SignedInfo>
@@ -98,10 +115,12 @@ KEY_INFO_X509_TMPL = """
 def canonicalize(xml, c14n_exc=True):
     "Return the canonical (c14n) form of the xml document for hashing"
     # UTF8, normalization of line feeds/spaces, quoting, attribute ordering...
-    output = StringIO()
+    output = BytesIO()
+    if not isinstance(xml, bytes):
+        xml = xml.encode('utf-8')
     if lxml is not None:
         # use faster libxml2 / lxml canonicalization function if available
-        et = lxml.etree.parse(StringIO(xml))
+        et = lxml.etree.parse(BytesIO(xml))
         et.write_c14n(output, exclusive=c14n_exc)
     else:
         # use pure-python implementation: c14n.py (avoid recursive import)
@@ -110,94 +129,189 @@ def canonicalize(xml, c14n_exc=True):
     return output.getvalue()
 
 
+def b64encode(data):
+    "Return the base64 text of the data (for the templates)"
+    return base64.b64encode(data).decode('ascii')
+
+
 def sha1_hash_digest(payload):
     "Create a SHA1 hash and return the base64 string"
     return base64.b64encode(hashlib.sha1(payload).digest())
 
 
-def rsa_sign(xml, ref_uri, private_key, password=None, cert=None, c14n_exc=True,
-             sign_template=SIGN_REF_TMPL, key_info_template=KEY_INFO_RSA_TMPL):
-    "Sign an XML document usign RSA (templates: enveloped -ref- or enveloping)"
+def canonical_digest(element, c14n_exc=True, algorithm='sha1'):
+    """Return the base64 digest of the canonical form of a SimpleXMLElement
+
+    The in-memory node is hashed while it is canonicalized (in one pass,
+    it is not serialized nor parsed again, see c14n.HashSink).
+    """
+    sink = HashSink(algorithm)
+    element.write_c14n(sink, exclusive=c14n_exc)
+    return b64encode(sink.digest())
+
+
+def sign(xml, ref_uri, private_key, password=None, cert=None, c14n_exc=True,
+         sign_template=SIGN_REF_TMPL, key_info_template=None,
+         algorithm='rsa-sha256', provider=None):
+    """Sign an XML document (templates: enveloped -ref- or enveloping)
 
-    # normalize the referenced xml (to compute the SHA1 hash)
-    ref_xml = canonicalize(xml, c14n_exc)
+    algorithm is one of SIGNATURE_ALGORITHMS (the digest uses the same hash).
+    The default key info is the RSAKeyValue for RSA keys (none otherwise).
+    xml can be a SimpleXMLElement node: its digest is computed directly
+    (see canonical_digest) and ref_xml is not returned.
+    """
+    signature_method, key_type, hash_name = SIGNATURE_ALGORITHMS[algorithm]
+    if key_info_template is None:
+        key_info_template = KEY_INFO_RSA_TMPL if key_type == 'rsa' else ''
+    if isinstance(xml, (basestring, bytes)):
+        # normalize the referenced xml (to compute the hash)
+        ref_xml = canonicalize(xml, c14n_exc)
+        digest_value = b64encode(hashlib.new(hash_name, ref_xml).digest())
+    else:
+        ref_xml = None
+        digest_value = canonical_digest(xml, c14n_exc, hash_name)
     # create the signed xml normalized (with the referenced uri and hash value)
-    signed_info = sign_template % {'ref_uri': ref_uri, 
-                                   'digest_value': sha1_hash_digest(ref_xml)}
+    signed_info = sign_template % {'ref_uri': ref_uri,
+                                   'signature_method': signature_method,
+                                   'digest_method': DIGEST_ALGORITHMS[hash_name],
+                                   'digest_value': digest_value}
     signed_info = canonicalize(signed_info, c14n_exc)
-    # Sign the SHA1 digest of the signed xml using RSA cipher
-    pkey = RSA.load_key(private_key, lambda *args, **kwargs: password)
-    signature = pkey.sign(hashlib.sha1(signed_info).digest())
+    # sign the signed xml (the provider computes the digest)
+    provider = get_crypto_provider(provider)
+    pkey = load_private_key(private_key, password, provider.name)
+    signature = provider.sign(pkey, signed_info, algorithm)
     # build the mapping (placeholders) to create the final xml signed message
-    return {
-            'ref_xml': ref_xml, 'ref_uri': ref_uri,
-            'signed_info': signed_info,
-            'signature_value': base64.b64encode(signature),
-            'key_info': key_info(pkey, cert, key_info_template),
+    vars = {
+            'ref_uri': ref_uri,
+            'signed_info': signed_info.decode('utf-8'),
+            'signature_value': b64encode(signature),
+            'key_info': key_info(pkey, cert, key_info_template, provider.name),
             }
+    if ref_xml is not None:
+        vars['ref_xml'] = ref_xml.decode('utf-8')
+    return vars
+
+
+def rsa_sign(xml, ref_uri, private_key, password=None, cert=None, c14n_exc=True,
+             sign_template=SIGN_REF_TMPL, key_info_template=KEY_INFO_RSA_TMPL,
+             algorithm='rsa-sha1'):
+    "Sign an XML document usign RSA (see sign)"
+    return sign(xml, ref_uri, private_key, password, cert, c14n_exc,
+                sign_template, key_info_template, algorithm)
+
+
+def verify(xml, signature, key, c14n_exc=True, algorithm='rsa-sha256',
+           provider=None):
+    "Verify a XML document signature (base64), return True if valid"
+    provider = get_crypto_provider(provider)
+    # load the public key (from buffer or filename)
+    if isinstance(key, (basestring, bytes)):
+        key = load_public_key(key, provider.name)
+    # normalize the signed xml to be verified
+    return provider.verify(key, canonicalize(xml, c14n_exc),
+                           base64.b64decode(signature), algorithm)
 
 
 def rsa_verify(xml, signature, key, c14n_exc=True):
     "Verify a XML document signature usign RSA-SHA1, return True if valid"
+    return verify(xml, signature, key, c14n_exc, algorithm='rsa-sha1')
 
-    # load the public key (from buffer or filename)
-    if key.startswith("-----BEGIN PUBLIC KEY-----"):
-        bio = BIO.MemoryBuffer(key)
-        rsa = RSA.load_pub_key_bio(bio)
-    else:
-        rsa = RSA.load_pub_key(certificate)
-    # create the digital envelope
-    pubkey = EVP.PKey()
-    pubkey.assign_rsa(rsa)
-    # do the cryptographic validation (using the default sha1 hash digest)
-    pubkey.reset_context(md='sha1')
-    pubkey.verify_init()
-    # normalize and feed the signed xml to be verified
-    pubkey.verify_update(canonicalize(xml, c14n_exc))
-    ret = pubkey.verify_final(base64.b64decode(signature))
-    return ret == 1
-
-
-def key_info(pkey, cert, key_info_template):
+
+def key_info(pkey, cert, key_info_template, provider=None):
     "Convert private key (PEM) to XML Signature format (RSAKeyValue/X509Data)"
-    exponent = base64.b64encode(pkey.e[4:])
-    modulus = m2.bn_to_hex(m2.mpi_to_bn(pkey.n)).decode("hex").encode("base64")
-    x509 = x509_parse_cert(cert) if cert else None
+    provider = get_crypto_provider(provider)
+    rsa_key_value = provider.rsa_key_value(pkey)
+    if rsa_key_value is None and '%(modulus)s' in key_info_template:
+        raise ValueError("RSAKeyValue key info requires a RSA key")
+    modulus, exponent = rsa_key_value or (b"", b"")
+    issuer_name, serial_number = "", ""
+    if cert:
+        x509 = x509_parse_cert(cert, provider=provider.name)
+        issuer_name, serial_number = provider.issuer_serial(x509)
     return key_info_template % {
-        'modulus': modulus,
-        'exponent': exponent,
-        'issuer_name': x509.get_issuer().as_text() if x509 else "",
-        'serial_number': x509.get_serial_number() if x509 else "",
+        'modulus': b64encode(modulus),
+        'exponent': b64encode(exponent),
+        'issuer_name': issuer_name,
+        'serial_number': serial_number,
         }
 
 
+# Key loading (cached, see key_cache):
+
+
+def read_source(source):
+    "Return the content (bytes) of a plain text PEM or filename"
+    if isinstance(source, bytes):
+        if source.startswith(b"-----BEGIN"):
+            return source
+        source = source.decode(sys.getfilesystemencoding())
+    elif source.startswith("-----BEGIN"):
+        return source.encode('ascii')
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def load_private_key(private_key, password=None, provider=None):
+    """Return the private key (RSA or EC) from plain text PEM or filename
+
+    The key is a provider object (M2Crypto RSA if it is the default, as in
+    previous versions).
+    """
+    provider = get_crypto_provider(provider)
+    load = lambda: provider.load_private_key(read_source(private_key), password)
+    # the password is part of the key (a wrong one must fail again)
+    key = (provider.name, 'private', source_key(private_key), digest(password or ''))
+    return key_cache.get(key, load)
+
+
+def load_public_key(key, provider=None):
+    "Return the public key (RSA or EC) from plain text PEM or filename"
+    provider = get_crypto_provider(provider)
+    load = lambda: provider.load_public_key(read_source(key))
+    return key_cache.get((provider.name, 'public', source_key(key)), load)
+
+
+def clear_caches():
+    "Discard the loaded keys, certificates and verification results"
+    for cache in (key_cache, cert_cache, verify_cache):
+        cache.clear()
+
+
 # Miscellaneous certificate utility functions:
 
 
-def x509_parse_cert(cert, binary=False):
-    "Create a X509 certificate from binary DER, plain text PEM or filename"
-    if binary:
-        bio = BIO.MemoryBuffer(cert)
-        x509 = X509.load_cert_bio(bio, X509.FORMAT_DER)
-    elif cert.startswith("-----BEGIN CERTIFICATE-----"):
-        bio = BIO.MemoryBuffer(cert)
-        x509 = X509.load_cert_bio(bio, X509.FORMAT_PEM)
-    else:
-        x509 = X509.load_cert(cert, 1)
-    return x509
+def x509_parse_cert(cert, binary=False, provider=None):
+    """Create a X509 certificate from binary DER, plain text PEM or filename
+
+    The certificate is a provider object (M2Crypto X509 if it is the default,
+    as in previous versions).
+    """
+    provider = get_crypto_provider(provider)
+    key = (provider.name, ) + (('der', digest(cert)) if binary else source_key(cert))
+    return cert_cache.get(key, lambda: provider.load_certificate(
+        cert if binary else read_source(cert), binary))
 
 
-def x509_extract_rsa_public_key(cert, binary=False):
+def x509_extract_public_key(cert, binary=False, provider=None):
     "Return the public key (PEM format) from a X509 certificate"
-    x509 = x509_parse_cert(cert, binary)
-    return x509.get_pubkey().get_rsa().as_pem()
+    provider = get_crypto_provider(provider)
+    x509 = x509_parse_cert(cert, binary, provider.name)
+    return provider.public_key_pem(provider.public_key(x509))
 
+x509_extract_rsa_public_key = x509_extract_public_key
 
-def x509_verify(cacert, cert, binary=False):
+
+def x509_verify(cacert, cert, binary=False, provider=None):
     "Validate the certificate's authenticity using a certification authority"
-    ca = x509_parse_cert(cacert)
-    crt = x509_parse_cert(cert, binary)
-    return crt.verify(ca.get_pubkey())
+    provider = get_crypto_provider(provider)
+    def verify():
+        ca = x509_parse_cert(cacert, provider=provider.name)
+        crt = x509_parse_cert(cert, binary, provider.name)
+        return provider.verify_certificate(ca, crt)
+    # the result is remembered for a while (see verify_cache)
+    key = (provider.name, source_key(cacert),
+           ('der', digest(cert)) if binary else source_key(cert))
+    return verify_cache.get(key, verify)
 
 
 if __name__ == "__main__":
@@ -207,6 +321,9 @@ if __name__ == "__main__":
     print (output)
     vars = rsa_sign(sample_xml, '#object', "no_encriptada.key", "password")
     print (SIGNED_TMPL % vars)
+    vars = sign(sample_xml, '#object', "no_encriptada.key", "password",
+                algorithm='rsa-sha256')
+    print (SIGNED_TMPL % vars)
 
     # basic test of enveloped signature (the reference is the document itself)
     sample_xml = """<?xml version="1.0" encoding="UTF-8"?><Object>data%s</Object>"""
@@ -215,6 +332,6 @@ if __name__ == "__main__":
     print (sample_xml % (SIGNATURE_TMPL % vars))
 
     # basic signature verification:
-    public_key = x509_extract_rsa_public_key(open("zunimercado.crt").read())
+    public_key = x509_extract_public_key("zunimercado.crt")
     assert rsa_verify(vars['signed_info'], vars['signature_value'], public_key,
                       c14n_exc=False)
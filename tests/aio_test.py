@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import sys
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import HTTPServer
+except ImportError:
+    from http.server import HTTPServer
+
+from pysimplesoap.client import SoapFault
+from pysimplesoap.server import SoapDispatcher, SOAPHandler
+from .transport_test import KeepAliveHandler, ThreadingServer
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from pysimplesoap.aio import AsyncSoapClient, AsyncTransport
+
+
+def adder(a, b):
+    "Add two values"
+    if a < 0:
+        raise ValueError("negative")
+    return {'ab': a + b}
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio client requires python 3.5+")
+class TestAsyncSoapClient(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def serve(self, server):
+        self.servers.append(server)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return "http://127.0.0.1:%d/" % server.server_address[1]
+
+    def serve_soap(self):
+        server = ThreadingServer(("127.0.0.1", 0), SOAPHandler)
+        location = "http://127.0.0.1:%d/" % server.server_address[1]
+        server.dispatcher = SoapDispatcher(
+            "Sample", location=location, action=location,
+            namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True)
+        server.dispatcher.register_function(
+            'Adder', adder, returns={'ab': int}, args={'a': int, 'b': int})
+        return self.serve(server)
+
+    def run_loop(self, *coroutines):
+        "Run the coroutines concurrently, return their results"
+        return self.loop.run_until_complete(asyncio.gather(*coroutines))
+
+    def test_call(self):
+        location = self.serve_soap()
+        client = AsyncSoapClient(location=location, action=location,
+                                 namespace="http://example.com/sample.wsdl",
+                                 ns="ns0")
+        responses = self.run_loop(*[client.Adder(a=i, b=1) for i in range(20)])
+        self.assertEqual([int(response.ab) for response in responses],
+                         list(range(1, 21)))
+
+    def test_wsdl_call(self):
+        location = self.serve_soap()
+        client = AsyncSoapClient(wsdl=location)
+        responses = self.run_loop(*[client.Adder(a=i, b=i) for i in range(10)])
+        self.assertEqual([r['ab'] for r in responses],
+                         [i * 2 for i in range(10)])
+        self.assertRaises(SoapFault, self.run_loop, client.Adder(a=-1, b=0))
+
+    def test_wsdl_call_stream(self):
+        # blocking (see AsyncSoapClient), run outside of the loop:
+        client = AsyncSoapClient(wsdl=self.serve_soap())
+        self.assertEqual(client.wsdl_call_stream('Adder', a=1, b=2)['ab'], 3)
+        future = self.loop.run_in_executor(None, lambda: client.wsdl_call_stream(
+            'Adder', a=2, b=2))
+        self.assertEqual(self.loop.run_until_complete(future)['ab'], 4)
+
+    def test_keep_alive(self):
+        url = self.serve(ThreadingServer(("127.0.0.1", 0), KeepAliveHandler))
+        url = url.rstrip("/")
+        server = self.servers[-1]
+        server.clients = []
+        http = AsyncTransport(timeout=10)
+        http.pool_size = 2
+        for i in range(3):
+            [(response, content)] = self.run_loop(http.request(url + "/", "POST", b"<a/>", {}))
+            self.assertEqual(content, b"<echo><a/></echo>")
+        responses = self.run_loop(*[http.request(url + "/slow", "POST", b"<b/>", {})
+                                    for i in range(6)])
+        self.assertEqual([content for response, content in responses],
+                         [b"<echo><b/></echo>"] * 6)
+        self.assertEqual(len(server.clients), 9)
+        self.assertTrue(len(set(server.clients)) <= 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import socket
+import sys
+import threading
+import time
+import unittest
+
+from pysimplesoap.client import SoapClient, SoapFault
+from pysimplesoap.server import SoapDispatcher
+from pysimplesoap.transport import PooledTransport, set_http_wrapper, compress, decompress
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from pysimplesoap.aioserver import AsyncSoapServer, ASGISOAPHandler, get_charset
+    # coroutine function (python 2 can not parse async def):
+    exec('''async def sleeper(seconds):
+    "Wait (without blocking the loop)"
+    await asyncio.sleep(seconds)
+    if seconds < 0:
+        raise ValueError("negative")
+    return {'seconds': seconds}
+''')
+
+
+def adder(a, b):
+    "Add two values"
+    return {'ab': a + b}
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio server requires python 3.5+")
+class TestAsyncSoapServer(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.location = "http://127.0.0.1:%d/"
+        self.dispatcher = dispatcher = SoapDispatcher(
+            "Sample", namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True)
+        dispatcher.register_function('Adder', adder, returns={'ab': int},
+                                     args={'a': int, 'b': int})
+        dispatcher.register_function('Sleeper', sleeper, returns={'seconds': float},
+                                     args={'seconds': float})
+        self.server = AsyncSoapServer(dispatcher)
+        server = self.loop.run_until_complete(self.server.start('127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self.location = dispatcher.location = dispatcher.action = \
+            "http://127.0.0.1:%d/" % self.port
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+        set_http_wrapper()
+
+    def request(self, data):
+        "Send raw data, return the (raw) response"
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=10)
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        sock.close()
+        return b"".join(chunks)
+
+    def test_wsdl_call(self):
+        client = SoapClient(wsdl=self.location)
+        self.assertEqual(client.Adder(a=1, b=2)['ab'], 3)
+        self.assertEqual(client.Sleeper(seconds=0.01)['seconds'], 0.01)
+        self.assertRaises(SoapFault, client.Sleeper, seconds=-1)
+
+    def test_concurrency(self):
+        set_http_wrapper('pooled')
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0")
+        start = time.time()
+        results = list(client.call_many('Sleeper', [{'seconds': 0.2}] * 20,
+                                        concurrency=20))
+        # the coroutines were waiting at the same time:
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual([float(r.seconds) for r in results], [0.2] * 20)
+
+    def test_keep_alive(self):
+        http = PooledTransport(timeout=10)
+        for i in range(3):
+            response, content = http.request(self.location + "Adder?response", "GET")
+            self.assertEqual(response['status'], "200")
+            self.assertTrue(b"AdderResponse" in content)
+        pool = http.get_pool("http", "127.0.0.1:%d" % self.port)
+        self.assertEqual(pool.count, 1)
+
+    def test_not_modified(self):
+        etag = self.dispatcher.get_document().etag.encode("ascii")
+        response = self.request(b"GET / HTTP/1.0\r\nIf-None-Match: " + etag + b"\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 304 "))
+        self.assertTrue(response.endswith(b"\r\n\r\n"))
+        response = self.request(b"GET / HTTP/1.0\r\nAccept-Encoding: gzip\r\n\r\n")
+        self.assertTrue(b"\r\nContent-Encoding: gzip\r\n" in response)
+
+    def test_errors(self):
+        response = self.request(b"GET /Missing HTTP/1.0\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 404 "))
+        response = self.request(b"PUT / HTTP/1.0\r\nContent-Length: 0\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 405 "))
+        self.server.max_body_size = 10
+        response = self.request(b"POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 413 "))
+        response = self.request(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                                b"8\r\n<a></a>\n\r\n8\r\n<a></a>\n\r\n0\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 413 "))
+
+    def test_timeouts(self):
+        # a slow upload is not limited by the keep-alive (idle) timeout:
+        self.server.keepalive_timeout = 0.1
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=10)
+        sock.sendall(b"GET /Adder?response HTTP/1.1\r\nContent-Length: 4\r\n\r\n")
+        time.sleep(0.3)
+        sock.sendall(b"<a/>")
+        self.assertTrue(sock.recv(65536).startswith(b"HTTP/1.1 200 "))
+        # idle connection closed (silently):
+        time.sleep(0.3)
+        self.assertEqual(sock.recv(65536), b"")
+        sock.close()
+        # incomplete request:
+        self.server.body_timeout = 0.1
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=10)
+        sock.sendall(b"POST / HTTP/1.1\r\nContent-Length: 100\r\n\r\n<a/>")
+        self.assertTrue(sock.recv(65536).startswith(b"HTTP/1.1 408 "))
+        sock.close()
+
+    def test_internal_error(self):
+        def handle(*args):
+            raise RuntimeError("unexpected")
+        self.server.handle = handle
+        response = self.request(b"GET / HTTP/1.1\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 500 "))
+        self.assertTrue(b"Connection: close" in response)
+
+    def test_chunked(self):
+        xml = (b'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+               b'<soap:Body><ns0:Adder xmlns:ns0="http://example.com/sample.wsdl">'
+               b'<a>2</a><b>5</b></ns0:Adder></soap:Body></soap:Envelope>')
+        chunks = b"".join([b"%x\r\n%s\r\n" % (len(xml[i:i + 50]), xml[i:i + 50])
+                           for i in range(0, len(xml), 50)])
+        response = self.request(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n"
+                                b"Connection: close\r\n\r\n" + chunks + b"0\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 "))
+        self.assertTrue(b"<ab>7</ab>" in response)
+
+    def test_sync_dispatch(self):
+        # coroutine functions can not be called by the regular dispatch:
+        fault = {}
+        self.dispatcher.dispatch(
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+            '<soap:Body><ns0:Sleeper xmlns:ns0="http://example.com/sample.wsdl">'
+            '<seconds>0</seconds></ns0:Sleeper></soap:Body></soap:Envelope>', fault=fault)
+        self.assertEqual(fault['faultcode'], "Server.TypeError")
+
+    def test_charset(self):
+        self.assertEqual(get_charset('text/xml; charset="ISO-8859-1"'), "ISO-8859-1")
+        self.assertEqual(get_charset('text/xml'), "utf-8")
+
+
+ADDER_REQUEST = (b'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+                 b'<soap:Body><ns0:Adder xmlns:ns0="http://example.com/sample.wsdl">'
+                 b'<a>2</a><b>5</b></ns0:Adder></soap:Body></soap:Envelope>')
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio server requires python 3.5+")
+class TestASGISOAPHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        dispatcher = SoapDispatcher(
+            "Sample", location="http://localhost/", action="http://localhost/",
+            namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True)
+        dispatcher.register_function('Adder', adder, returns={'ab': int},
+                                     args={'a': int, 'b': int})
+        dispatcher.register_function('Sleeper', sleeper, returns={'seconds': float},
+                                     args={'seconds': float})
+        self.app = ASGISOAPHandler(dispatcher)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def future(self, result=None):
+        future = self.loop.create_future()
+        future.set_result(result)
+        return future
+
+    def call(self, method, path, chunks=(), query=b"", headers=()):
+        "Run the application, return the status, headers and body sent"
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query, 'headers': list(headers)}
+        messages = [{'type': 'http.request', 'body': chunk,
+                     'more_body': i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+        sent = []
+        self.messages = messages
+        receive = lambda: self.future(messages.pop(0))
+        send = lambda message: self.future(sent.append(message))
+        self.loop.run_until_complete(self.app(scope, receive, send))
+        start, body = sent
+        return start['status'], dict(start['headers']), body['body']
+
+    def test_post(self):
+        # the request body is received in several messages:
+        chunks = [ADDER_REQUEST[i:i + 40] for i in range(0, len(ADDER_REQUEST), 40)]
+        status, headers, body = self.call(
+            "POST", "/", chunks, headers=[(b"content-type", b"text/xml; charset=utf-8")])
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-length"], str(len(body)).encode("ascii"))
+        self.assertTrue(b"<ab>7</ab>" in body)
+        status, headers, body = self.call("POST", "/", [ADDER_REQUEST.replace(
+            b"Adder", b"Sleeper").replace(b"<a>2</a><b>5</b>", b"<seconds>-1</seconds>")])
+        self.assertEqual(status, 500)
+        self.assertTrue(b"Server.ValueError" in body)
+        # compressed request and response:
+        self.app.compress_size = 0
+        status, headers, body = self.call("POST", "/", [compress(ADDER_REQUEST)], headers=[
+            (b"content-encoding", b"gzip"), (b"accept-encoding", b"gzip")])
+        self.assertEqual((status, headers[b"content-encoding"]), (200, b"gzip"))
+        self.assertTrue(b"<ab>7</ab>" in decompress(body, "gzip"))
+        status, headers, body = self.call("POST", "/", [ADDER_REQUEST],
+                                          headers=[(b"content-encoding", b"br")])
+        self.assertEqual(status, 415)
+
+    def test_streamed(self):
+        # unknown methods are rejected before receiving the whole body:
+        request = ADDER_REQUEST.replace(b"Adder", b"Missing").replace(
+            b"<a>2</a>", b"<a>2</a>" * 5000)
+        chunks = [request[i:i + 1000] for i in range(0, len(request), 1000)]
+        status, headers, body = self.call("POST", "/", chunks)
+        self.assertEqual(status, 500)
+        self.assertTrue(b"Client.KeyError" in body)
+        self.assertTrue(self.messages)
+
+    def test_get(self):
+        status, headers, body = self.call("GET", "/")
+        self.assertEqual((status, headers[b"content-type"]), (200, b"text/xml"))
+        self.assertTrue(b"wsdl:definitions" in body)
+        status, headers, body = self.call("GET", "/Adder", query=b"response")
+        self.assertTrue(b"AdderResponse" in body)
+        self.assertEqual(self.call("GET", "/Missing")[0], 404)
+        self.assertEqual(self.call("DELETE", "/")[0], 405)
+
+    def test_max_body_size(self):
+        self.app.max_body_size = 100
+        self.assertEqual(self.call("POST", "/", [b"<a/>" * 20] * 2)[0], 413)
+        self.assertEqual(self.call("POST", "/", [b"<a/>"],
+                                   headers=[(b"content-length", b"1000")])[0], 413)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+        self.loop.run_until_complete(self.app(
+            {'type': 'lifespan'}, lambda: self.future(messages.pop(0)),
+            lambda message: self.future(sent.append(message['type']))))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import os
+import unittest
+from decimal import Decimal
+from xml.dom.minidom import CDATASection
+from pysimplesoap.backends import get_xml_backend, set_xml_backend, get_XMLBackend
+from pysimplesoap.client import SoapClient
+from pysimplesoap.simplexml import SimpleXMLElement
+from .dummy_utils import DummyHTTP, TEST_DIR
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+<soap:Body>
+    <!-- comment -->
+    <ns1:AdderResponse xmlns:ns1="urn:sample" id="1">
+        <AddResult xsi:type="xsd:int">3</AddResult>
+        <Text><![CDATA[a < b]]> &amp; c</Text>
+        <Empty></Empty>
+    </ns1:AdderResponse>
+</soap:Body>
+</soap:Envelope>"""
+
+
+class TestXMLBackends(unittest.TestCase):
+
+    def parse(self, text, **kwargs):
+        "Return the document parsed by each backend"
+        return [SimpleXMLElement(text, backend=backend, **kwargs)
+                for backend in ('minidom', 'etree')]
+
+    def test_serialization(self):
+        for pretty in (False, True):
+            dom, et = self.parse(XML)
+            self.assertEqual(et.as_xml(pretty=pretty), dom.as_xml(pretty=pretty))
+            self.assertEqual(repr(et("AdderResponse", ns="urn:sample")),
+                             repr(dom("AdderResponse", ns="urn:sample")))
+
+    def test_access(self):
+        for xml in self.parse(XML):
+            response = xml('AdderResponse', ns="urn:sample")
+            self.assertEqual(response.get_name(), "ns1:AdderResponse")
+            self.assertEqual(response.get_local_name(), "AdderResponse")
+            self.assertEqual(response.get_prefix(), "ns1")
+            self.assertEqual(response['id'], "1")
+            self.assertEqual(response['missing'], None)
+            self.assertEqual(response.get_namespace_uri("soap"),
+                             "http://schemas.xmlsoap.org/soap/envelope/")
+            self.assertEqual(int(response.AddResult), 3)
+            self.assertEqual(str(response.Text), "a < b & c")
+            self.assertEqual(response.AddResult['xsi:type'], "xsd:int")
+            self.assertEqual([str(c.get_name()) for c in response.children()],
+                             ['AddResult', 'Text', 'Empty'])
+            self.assertTrue('AddResult' in xml)
+            self.assertFalse(xml('AdderResponse', ns="urn:other", error=False))
+
+    def test_marshall(self):
+        cdata = CDATASection()
+        cdata.data = "<python>"
+        values = {'a': 1, 'b': Decimal("2.5"), 'c': datetime.date(2015, 1, 2),
+                  'd': [{'e': 1}, {'e': 2}], 'f': {'g': None, 'h': ''},
+                  'i': cdata, 'j': '"quoted" & escaped'}
+        results = []
+        for xml in self.parse('<root xmlns="urn:sample"/>', namespace="urn:sample"):
+            xml.marshall('values', values)
+            xml.values.add_comment("comment")
+            xml.values['x'] = "1"
+            del xml.values['x']
+            types = {'values': {'a': int, 'b': Decimal, 'c': datetime.date,
+                                'd': [{'e': int}], 'f': {'g': str, 'h': str},
+                                'i': str, 'j': str}}
+            unmarshalled = xml.children().unmarshall(types)['values']
+            self.assertEqual(unmarshalled['d'], [{'e': 1}, {'e': 2}])
+            self.assertEqual(unmarshalled['i'], "<python>")
+            self.assertEqual(unmarshalled['j'], values['j'])
+            # elements created with the document namespace can be searched:
+            xml.add_child('created', '1')
+            self.assertEqual(int(xml('created', ns="urn:sample")), 1)
+            results.append(xml.as_xml())
+        self.assertEqual(results[1], results[0])
+
+    def test_import_node(self):
+        results = []
+        for xml, other in zip(self.parse(XML), self.parse("<a:x xmlns:a='urn:a'><a:y/></a:x>")):
+            body = xml('Body', ns="http://schemas.xmlsoap.org/soap/envelope/")
+            body.import_node(other)
+            self.assertTrue(body('y', ns="urn:a"))
+            del body.AdderResponse
+            results.append(xml.as_xml())
+        self.assertEqual(results[1], results[0])
+
+    def test_default_backend(self):
+        self.assertTrue(get_XMLBackend() is get_xml_backend('minidom'))
+        self.assertRaises(RuntimeError, get_xml_backend, 'unknown')
+        try:
+            set_xml_backend('etree')
+            requests = []
+            for compiled in (False, True):
+                client = SoapClient(location="http://localhost/", action="urn:sample/",
+                                    namespace="urn:sample", compiled=compiled)
+                client.http = DummyHTTP(XML.encode("utf8"))
+                response = client.Adder(a=1, b=[{'c': 2}, {'c': 3}])
+                self.assertEqual(int(response.AddResult), 3)
+                requests.append(client.xml_request)
+            self.assertEqual(requests[0], requests[1])
+        finally:
+            set_xml_backend()
+
+    def test_wsdl(self):
+        services = []
+        for backend in ('minidom', 'etree'):
+            try:
+                set_xml_backend(backend)
+                wsdl = "file:" + os.path.join(TEST_DIR, "data", "vco.wsdl")
+                services.append(SoapClient(wsdl=wsdl, cache=False).services)
+            finally:
+                set_xml_backend()
+        self.assertEqual(repr(services[1]), repr(services[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import sys
+import unittest
+import xml.dom.minidom
+
+from pysimplesoap import c14n
+from pysimplesoap.simplexml import SimpleXMLElement
+
+# W3C Canonical XML 1.0 examples (http://www.w3.org/TR/xml-c14n, section 3)
+
+PIS_COMMENTS = """<?xml version="1.0"?>
+
+<?xml-stylesheet   href="doc.xsl"
+   type="text/xsl"   ?>
+
+<!DOCTYPE doc SYSTEM "doc.dtd">
+
+<doc>Hello, world!<!-- Comment 1 --></doc>
+
+<?pi-without-data     ?>
+
+<!-- Comment 2 -->
+
+<!-- Comment 3 -->"""
+
+PIS_COMMENTS_C14N = """<?xml-stylesheet href="doc.xsl"
+   type="text/xsl"   ?>
+<doc>Hello, world!</doc>
+<?pi-without-data?>"""
+
+PIS_COMMENTS_C14N_WITH_COMMENTS = """<?xml-stylesheet href="doc.xsl"
+   type="text/xsl"   ?>
+<doc>Hello, world!<!-- Comment 1 --></doc>
+<?pi-without-data?>
+<!-- Comment 2 -->
+<!-- Comment 3 -->"""
+
+WHITESPACE = """<doc>
+   <clean>   </clean>
+   <dirty>   A   B   </dirty>
+   <mixed>
+      A
+      <clean>   </clean>
+      B
+      <dirty>   A   B   </dirty>
+      C
+   </mixed>
+</doc>"""
+
+# the DTD default attribute is written in e9 (minidom does not add it)
+TAGS = """<!DOCTYPE doc [<!ATTLIST e9 attr CDATA "default">]>
+<doc>
+   <e1   />
+   <e2   ></e2>
+   <e3   name = "elem3"   id="elem3"   />
+   <e4   name="elem4"   id="elem4"   ></e4>
+   <e5 a:attr="out" b:attr="sorted" attr2="all" attr="I'm"
+      xmlns:b="http://www.ietf.org"
+      xmlns:a="http://www.w3.org"
+      xmlns="http://example.org"/>
+   <e6 xmlns="" xmlns:a="http://www.w3.org">
+      <e7 xmlns="http://www.ietf.org">
+         <e8 xmlns="" xmlns:a="http://www.w3.org">
+            <e9 xmlns="" xmlns:a="http://www.ietf.org" attr="default"/>
+         </e8>
+      </e7>
+   </e6>
+</doc>"""
+
+TAGS_C14N = """<doc>
+   <e1></e1>
+   <e2></e2>
+   <e3 id="elem3" name="elem3"></e3>
+   <e4 id="elem4" name="elem4"></e4>
+   <e5 xmlns="http://example.org" xmlns:a="http://www.w3.org" xmlns:b="http://www.ietf.org" attr="I'm" attr2="all" b:attr="sorted" a:attr="out"></e5>
+   <e6 xmlns:a="http://www.w3.org">
+      <e7 xmlns="http://www.ietf.org">
+         <e8 xmlns="">
+            <e9 xmlns:a="http://www.ietf.org" attr="default"></e9>
+         </e8>
+      </e7>
+   </e6>
+</doc>"""
+
+# without the NMTOKENS / ID attributes (normalized by validating parsers)
+CHARACTERS = """<doc>
+   <text>First line&#x0d;&#10;Second line</text>
+   <value>&#x32;</value>
+   <compute><![CDATA[value>"0" && value<"10" ?"valid":"error"]]></compute>
+   <compute expr='value>"0" &amp;&amp; value&lt;"10" ?"valid":"error"'>valid</compute>
+   <norm attr=' &apos;   &#x20;&#13;&#xa;&#9;   &apos; '/>
+</doc>"""
+
+CHARACTERS_C14N = """<doc>
+   <text>First line&#xD;
+Second line</text>
+   <value>2</value>
+   <compute>value&gt;"0" &amp;&amp; value&lt;"10" ?"valid":"error"</compute>
+   <compute expr="value>&quot;0&quot; &amp;&amp; value&lt;&quot;10&quot; ?&quot;valid&quot;:&quot;error&quot;">valid</compute>
+   <norm attr=" '    &#xD;&#xA;&#x9;   ' "></norm>
+</doc>"""
+
+ENTITIES = """<!DOCTYPE doc [
+<!ATTLIST doc attrExtEnt ENTITY #IMPLIED>
+<!ENTITY ent1 "Hello">
+<!ENTITY entExt SYSTEM "earth.gif" NDATA gif>
+<!NOTATION gif SYSTEM "viewgif.exe">
+]>
+<doc attrExtEnt="entExt">
+   &ent1;, world!
+</doc>"""
+
+ENTITIES_C14N = """<doc attrExtEnt="entExt">
+   Hello, world!
+</doc>"""
+
+UTF8 = b"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<doc>&#169;</doc>"""
+
+UTF8_C14N = b"<doc>\xc2\xa9</doc>"
+
+# W3C Exclusive XML Canonicalization examples (section 2.2)
+
+EXC_1 = """<n0:local xmlns:n0="foo:bar" xmlns:n3="ftp://example.org">
+  <n1:elem2 xmlns:n1="http://example.net" xml:lang="en">
+     <n3:stuff xmlns:n3="ftp://example.org"/>
+  </n1:elem2>
+</n0:local>"""
+
+EXC_2 = """<n2:pdu xmlns:n1="http://example.com"
+           xmlns:n2="http://foo.example"
+           xml:lang="fr"
+           xml:space="retain">
+  <n1:elem2 xmlns:n1="http://example.net" xml:lang="en">
+     <n3:stuff xmlns:n3="ftp://example.org"/>
+  </n1:elem2>
+</n2:pdu>"""
+
+EXC_ELEM2_C14N = """<n1:elem2 xmlns:n1="http://example.net" xml:lang="en">
+     <n3:stuff xmlns:n3="ftp://example.org"></n3:stuff>
+  </n1:elem2>"""
+
+INC_1_ELEM2_C14N = """<n1:elem2 xmlns:n0="foo:bar" xmlns:n1="http://example.net" xmlns:n3="ftp://example.org" xml:lang="en">
+     <n3:stuff></n3:stuff>
+  </n1:elem2>"""
+
+INC_2_ELEM2_C14N = """<n1:elem2 xmlns:n1="http://example.net" xmlns:n2="http://foo.example" xml:lang="en" xml:space="retain">
+     <n3:stuff xmlns:n3="ftp://example.org"></n3:stuff>
+  </n1:elem2>"""
+
+
+def utf8(text):
+    return text.encode("utf-8")
+
+
+def parse(text):
+    if not isinstance(text, bytes):
+        text = utf8(text)
+    return xml.dom.minidom.parseString(text)
+
+
+def elem2(document):
+    return document.getElementsByTagName("n1:elem2")[0]
+
+
+class TestCanonicalize(unittest.TestCase):
+
+    def test_pis_comments(self):
+        document = parse(PIS_COMMENTS)
+        self.assertEqual(c14n.Canonicalize(document), utf8(PIS_COMMENTS_C14N))
+        self.assertEqual(c14n.Canonicalize(document, comments=1),
+                         utf8(PIS_COMMENTS_C14N_WITH_COMMENTS))
+
+    def test_whitespace(self):
+        self.assertEqual(c14n.Canonicalize(parse(WHITESPACE)), utf8(WHITESPACE))
+
+    def test_tags(self):
+        document = parse(TAGS)
+        self.assertEqual(c14n.Canonicalize(document), utf8(TAGS_C14N))
+
+    def test_characters(self):
+        self.assertEqual(c14n.Canonicalize(parse(CHARACTERS)), utf8(CHARACTERS_C14N))
+
+    def test_entities(self):
+        self.assertEqual(c14n.Canonicalize(parse(ENTITIES)), utf8(ENTITIES_C14N))
+
+    def test_utf8(self):
+        self.assertEqual(c14n.Canonicalize(parse(UTF8)), UTF8_C14N)
+
+    def test_exclusive(self):
+        for document in (EXC_1, EXC_2):
+            self.assertEqual(c14n.Canonicalize(elem2(parse(document)), unsuppressedPrefixes=[]),
+                             utf8(EXC_ELEM2_C14N))
+        # inclusive canonicalization of the same element (for comparison):
+        self.assertEqual(c14n.Canonicalize(elem2(parse(EXC_1))), utf8(INC_1_ELEM2_C14N))
+        self.assertEqual(c14n.Canonicalize(elem2(parse(EXC_2))), utf8(INC_2_ELEM2_C14N))
+
+    def test_inclusive_prefixes(self):
+        document = parse('<a:x xmlns:a="urn:a" xmlns:b="urn:b" xmlns="urn:d">'
+                         '<a:y><z b:attr="1"/></a:y></a:x>')
+        node = document.getElementsByTagName("a:y")[0]
+        self.assertEqual(c14n.Canonicalize(node, unsuppressedPrefixes=[]),
+                         b'<a:y xmlns:a="urn:a"><z xmlns="urn:d" xmlns:b="urn:b" b:attr="1">'
+                         b'</z></a:y>')
+        self.assertEqual(c14n.Canonicalize(node, unsuppressedPrefixes=["b", "#default"]),
+                         b'<a:y xmlns="urn:d" xmlns:a="urn:a" xmlns:b="urn:b">'
+                         b'<z b:attr="1"></z></a:y>')
+
+    def test_exclusive_unprefixed_attribute(self):
+        # plain attributes do not use the default namespace:
+        document = parse('<p:a xmlns="urn:d" xmlns:p="urn:p" attr="1"/>')
+        self.assertEqual(c14n.Canonicalize(document, unsuppressedPrefixes=[]),
+                         b'<p:a xmlns:p="urn:p" attr="1"></p:a>')
+        document = parse('<a xmlns="urn:d" xmlns:p="urn:p" attr="1"/>')
+        self.assertEqual(c14n.Canonicalize(document, unsuppressedPrefixes=[]),
+                         b'<a xmlns="urn:d" attr="1"></a>')
+
+    def test_deep(self):
+        # the document is walked iteratively (no recursion limit):
+        depth = sys.getrecursionlimit() * 2
+        text = "<a>" * depth + "x" + "</a>" * depth
+        self.assertEqual(c14n.Canonicalize(parse(text)), utf8(text))
+
+    def test_hash_sink(self):
+        document = parse("<doc>%s</doc>" % ("<item a='1'>á</item>" * 20000))
+        text = c14n.Canonicalize(document)
+        self.assertTrue(len(text) > c14n.BLOCK_SIZE)
+        sink = c14n.HashSink("sha256")
+        chunks = []
+        sink.write, write = lambda data: (chunks.append(data), write(data)), sink.write
+        c14n.Canonicalize(document, sink)
+        # written in several blocks, the text is not built:
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(sink.digest(), hashlib.sha256(text).digest())
+        self.assertEqual(c14n.digest(document), hashlib.sha1(text).digest())
+
+    def test_write_c14n(self):
+        for backend in ("minidom", "etree"):
+            element = SimpleXMLElement(EXC_1, backend=backend)
+            self.assertEqual(element("elem2", ns="http://example.net").write_c14n(),
+                             utf8(EXC_ELEM2_C14N))
+
+    def test_in_memory(self):
+        # nodes added to a parsed request (created with qualified names,
+        # without DOM namespace information) are canonicalized as if parsed
+        for backend in ("minidom", "etree"):
+            request = SimpleXMLElement(
+                '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                'xmlns:ns0="urn:sample"><soap:Header/><soap:Body/></soap:Envelope>',
+                backend=backend)
+            body = request("Body", ns="http://schemas.xmlsoap.org/soap/envelope/")
+            method = body.add_child("ns0:Method", ns=False)
+            method.add_child("value", "1 < 2", ns=False)
+            method["xml:lang"] = "en"
+            body['wsu:Id'] = "id-14"
+            body['xmlns:wsu'] = "urn:wsu"
+            sink = c14n.HashSink()
+            body.write_c14n(sink)
+            parsed = SimpleXMLElement(request.as_xml(), backend=backend)
+            expected = parsed("Body", ns="http://schemas.xmlsoap.org/soap/envelope/").write_c14n()
+            self.assertEqual(sink.digest(), hashlib.sha1(expected).digest())
+            self.assertTrue(expected.startswith(
+                b'<soap:Body xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                b'xmlns:wsu="urn:wsu" wsu:Id="id-14"><ns0:Method xmlns:ns0="urn:sample" '
+                b'xml:lang="en">'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import os
+import unittest
+from decimal import Decimal
+from pysimplesoap.client import SoapClient
+from pysimplesoap.helpers import Struct
+from pysimplesoap.plans import UnmarshallPlan, MarshallPlan
+from pysimplesoap.simplexml import SimpleXMLElement
+from .dummy_utils import DummyHTTP, TEST_DIR
+
+
+class TestUnmarshallPlan(unittest.TestCase):
+
+    def check(self, xml, types, strict=True, compare=lambda value: value):
+        "Compare the plan results with SimpleXMLElement.unmarshall"
+        for backend in ('minidom', 'etree'):
+            element = SimpleXMLElement(xml, backend=backend)
+            plan = UnmarshallPlan(types, strict)
+            expected = compare(element.unmarshall(types, strict))
+            self.assertEqual(compare(plan(element)), expected)
+            # plans are reusable:
+            self.assertEqual(compare(plan(element)), expected)
+
+    def test_simple_types(self):
+        self.check('<span><name>foo</name><value>3</value><empty/>'
+                   '<when>2015-01-02</when><ok>true</ok><price>1.01</price></span>',
+                   {'span': {'name': str, 'value': int, 'empty': str,
+                             'when': datetime.date, 'ok': bool, 'price': Decimal}})
+        self.assertRaises(ValueError, self.check,
+                          '<span><value>x</value></span>', {'span': {'value': int}})
+
+    def test_arrays(self):
+        self.check('<span><name>foo</name><name>bar</name></span>',
+                   {'span': [{'name': str}]})
+        self.check('<results><foo>bar</foo><foo>baz</foo></results>',
+                   {'results': {'foo': [str]}})
+        self.check('<activations><items><number>01234</number><status>1</status></items>'
+                   '<items><number>04321</number><status>0</status></items></activations>',
+                   {'activations': [{'items': {'number': str, 'status': int}}]})
+        # jetty style arrays:
+        self.check('<r><vat><amount>1</amount><rate>21</rate></vat>'
+                   '<vat><amount>2</amount><rate>10</rate></vat></r>',
+                   {'r': {'vat': [{'amount': int, 'rate': int}]}})
+
+    def test_tuples(self):
+        self.check('<foo><boo><bar>abc</bar><baz>1</baz></boo>'
+                   '<boo><bar>qwe</bar><baz>2</baz></boo></foo>',
+                   {'foo': {'boo': ({'bar': str, 'baz': int}, )}})
+
+    def test_generic_fallback(self):
+        # undeclared tags, custom arrays, xsi:type, multirefs and any:
+        xml = """<r xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+                    xmlns:soapenc="http://schemas.xmlsoap.org/soap/encoding/">
+            <a>1</a>
+            <extra xsi:type="xsd:int">2</extra>
+            <list soapenc:arrayType="xsd:string[2]"><i>x</i><i>y</i></list>
+            <ref href="#id0"/>
+            <multiRef id="id0" xsi:type="ns:Ref"><v>3</v></multiRef>
+        </r>"""
+        self.check(xml, {'r': {'a': int, 'list': str, 'ref': {'v': int},
+                               'multiRef': {'v': int}}}, strict=False)
+        self.assertRaises(TypeError, self.check, '<r><x>1</x></r>', {'r': {'a': int}})
+        # elements returned as is (xsd:any):
+        self.check('<r><a>1</a><x><y>2</y></x></r>', {'r': {'a': int, None: None}},
+                   compare=repr)
+
+    def test_recursive_types(self):
+        node = Struct()
+        node['name'] = str
+        node['children'] = [node]
+        self.check('<tree><name>a</name><children><name>b</name><children>'
+                   '<name>c</name></children></children></tree>', {'tree': node})
+
+    def test_wsdl_call(self):
+        wsdl = "file:" + os.path.join(TEST_DIR, "data", "vco.wsdl")
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+<soap:Body><findResponse xmlns="http://webservice.vso.dunes.ch"><findReturn>
+<totalCount>2</totalCount><elements>%s</elements>
+</findReturn></findResponse></soap:Body>
+</soap:Envelope>""" % "".join(["<item><type>t</type><id>%d</id></item>" % i for i in range(2)])
+        results = []
+        for compiled in (False, True):
+            client = SoapClient(wsdl=wsdl, compiled=compiled)
+            client.http = DummyHTTP(xml.encode("utf8"))
+            results.append(client.find(type="t", query="q"))
+            results.append(client.find(type="t", query="q"))
+        self.assertEqual(results[2], results[0])
+        self.assertEqual(results[3], results[0])
+        self.assertEqual(results[0]['findReturn']['elements']['item'][1]['id'], '1')
+
+
+# response contents required by the WSDL output (arrays):
+RETURNS = {'getWorkflowTokenStatus':
+           '<getWorkflowTokenStatusReturn>1</getWorkflowTokenStatusReturn>'}
+
+
+class TestMarshallPlan(unittest.TestCase):
+
+    def requests(self, method, **kwargs):
+        "Return the xml request built by the generic and compiled clients"
+        wsdl = "file:" + os.path.join(TEST_DIR, "data", "vco.wsdl")
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+<soap:Body><%sResponse xmlns="http://webservice.vso.dunes.ch">%s</%sResponse></soap:Body>
+</soap:Envelope>""" % (method, RETURNS.get(method, ""), method)
+        requests = []
+        for compiled in (False, True, True):
+            if compiled is not True or not requests[1:]:
+                client = SoapClient(wsdl=wsdl, compiled=compiled)
+            client.http = DummyHTTP(xml.encode("utf8"))
+            getattr(client, method)(**kwargs)
+            requests.append(client.xml_request)
+        return requests
+
+    def check(self, method, **kwargs):
+        requests = self.requests(method, **kwargs)
+        self.assertEqual(requests[1], requests[0])
+        # plans are reusable:
+        self.assertEqual(requests[2], requests[0])
+        return requests[0]
+
+    def test_simple(self):
+        xml = self.check("find", query="q & <x>", type="t")
+        # WSDL order and null values filtered:
+        self.assertTrue(b"<type>t</type><query>q &amp; &lt;x&gt;</query></find>" in xml)
+        self.check("hasRights", taskId="1", right=3, username=None)
+
+    def test_arrays(self):
+        self.check("executeWorkflow", workflowId="1", username="u", password="p",
+                   workflowInputs=[{'name': 'a', 'type': 'string', 'value': '1'},
+                                   {'value': '2', 'name': 'b'}])
+        self.check("getWorkflowTokenStatus", workflowTokenIds=["1", "2"])
+        self.check("echoWorkflow", workflowMessage={
+            'name': 'w', 'id': '1',
+            'inParameters': {'item': [{'name': 'a', 'type': 'string'}]}})
+
+    def test_fallback(self):
+        # values not matching the declaration use the generic marshall:
+        self.check("getWorkflowTokenStatus", workflowTokenIds="1")
+        self.check("echo", message=Decimal("1.5"))
+        self.check("hasRights", taskId=1, right="3", password=True)
+
+    def test_parameters(self):
+        wsdl = "file:" + os.path.join(TEST_DIR, "data", "vco.wsdl")
+        client = SoapClient(wsdl=wsdl)
+        port = list(list(client.services.values())[0]['ports'].values())[0]
+        plan = MarshallPlan(port['operations']['find']['input'])
+        self.assertEqual(plan.name, "find")
+        self.assertEqual(plan.parameters({'query': 'q', 'type': 't', 'username': None}),
+                         [('type', 't'), ('query', 'q')])
+
+
+if __name__ == '__main__':
+    unittest.main()
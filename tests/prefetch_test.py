@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import threading
+import time
+import unittest
+from pysimplesoap.client import SoapClient
+from pysimplesoap.helpers import fetch_all, prefetch_schemas
+from pysimplesoap.simplexml import SimpleXMLElement
+from pysimplesoap.transport import get_Http
+from .dummy_utils import TEST_DIR
+
+IMPORTS_DIR = os.path.join(TEST_DIR, "data", "imports")
+XSD_URI = "http://www.w3.org/2001/XMLSchema"
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_wsdl_imports(self):
+        wsdl = "file:" + os.path.join(IMPORTS_DIR, "main.wsdl")
+        services = [repr(SoapClient(wsdl=wsdl, wsdl_workers=workers).services)
+                    for workers in (0, 4)]
+        self.assertEqual(services[1], services[0])
+        client = SoapClient(wsdl=wsdl)
+        operation = client.get_operation("Echo")
+        self.assertEqual(list(operation['input']['Echo']['value'].keys()),
+                         ['name', 'amount'])
+
+    def test_prefetch_schemas(self):
+        f = open(os.path.join(IMPORTS_DIR, "main.wsdl"), "rb")
+        wsdl = SimpleXMLElement(f.read(), namespace="http://schemas.xmlsoap.org/wsdl/")
+        f.close()
+        schemas = wsdl.types('schema', ns=XSD_URI)
+        documents = prefetch_schemas(schemas, XSD_URI, lambda: get_Http()(timeout=10),
+                                     False, False, IMPORTS_DIR, workers=4)
+        xsd_dir = os.path.join(IMPORTS_DIR, "xsd")
+        # nested imports are resolved relative to the importing schema:
+        self.assertEqual(sorted(documents.keys()),
+                         [("common/base.xsd", xsd_dir),
+                          ("xsd/common/base.xsd", IMPORTS_DIR),
+                          ("xsd/types.xsd", IMPORTS_DIR)])
+        self.assertEqual(prefetch_schemas(schemas, XSD_URI, None, False, False,
+                                          IMPORTS_DIR, workers=1), {})
+
+    def test_fetch_all(self):
+        lock = threading.Lock()
+        running = []
+        concurrency = []
+
+        def load(location, basedir):
+            with lock:
+                running.append(location)
+                concurrency.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(location)
+            if location == "error":
+                raise RuntimeError("not found")
+            return int(location)
+
+        def discover(document, path):
+            # each document imports the next ones (and an already seen one):
+            return [("%d" % i, path, path) for i in (0, document * 2 + 1, document * 2 + 2)
+                    if i < 10] + [("error", path, path)]
+
+        documents = fetch_all([("0", "", "")], load, discover, workers=3)
+        self.assertEqual(sorted(documents.values()), list(range(10)))
+        self.assertTrue(max(concurrency) <= 3)
+        self.assertEqual(documents["3", ""], 3)
+        # the same (relative) location in other directory is another document:
+        documents = fetch_all([("1", "a", ""), ("1", "b", ""), ("1", "a", "")], load,
+                              workers=2)
+        self.assertEqual(sorted(documents), [("1", "a"), ("1", "b")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import signal
+import threading
+import time
+import unittest
+
+from pysimplesoap.client import SoapClient
+from pysimplesoap.server import SoapDispatcher
+from pysimplesoap.prefork import PreforkServer
+
+
+def get_pid():
+    "Return the worker process id"
+    return {'pid': os.getpid()}
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), "fork is not available")
+class TestPreforkServer(unittest.TestCase):
+
+    def start(self, **kwargs):
+        dispatcher = SoapDispatcher(
+            "Sample", namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True,
+            compiled=True)
+        dispatcher.register_function('GetPid', get_pid, returns={'pid': int}, args={})
+        self.server = server = PreforkServer(dispatcher, ('127.0.0.1', 0), **kwargs)
+        server.poll_interval = 0.05
+        server.restart_delay = 0
+        server.bind()
+        location = dispatcher.location = dispatcher.action = \
+            "http://127.0.0.1:%d/" % server.server_address[1]
+        self.thread = threading.Thread(target=server.serve_forever, args=(False, ))
+        self.thread.start()
+        self.wait(lambda: len(server.workers) == server.count)
+        return SoapClient(location=location, action=location,
+                          namespace="http://example.com/sample.wsdl", ns="ns0")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.assertEqual(self.server.workers, {})
+
+    def wait(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition():
+            self.assertTrue(time.time() < deadline, "timeout")
+            time.sleep(0.01)
+
+    def pids(self, client, count=20):
+        return set([int(client.GetPid().pid) for i in range(count)])
+
+    def test_workers(self):
+        client = self.start(workers=2)
+        workers = set(self.server.workers)
+        self.assertTrue(self.pids(client) <= workers)
+        self.assertFalse(os.getpid() in workers)
+        # the documents were generated before forking:
+        self.assertEqual(len(self.server.dispatcher.documents), 3)
+        # and the response writers compiled:
+        self.assertEqual(list(self.server.dispatcher.templates), ['GetPid'])
+
+    def test_restart(self):
+        client = self.start(workers=2)
+        crashed = list(self.server.workers)[0]
+        os.kill(crashed, signal.SIGKILL)
+        self.wait(lambda: crashed not in self.server.workers and
+                  len(self.server.workers) == 2)
+        self.assertTrue(self.pids(client) <= set(self.server.workers))
+
+    def test_reload(self):
+        reloads = []
+        client = self.start(workers=2, on_reload=reloads.append)
+        old = set(self.server.workers)
+        self.server.reload()
+        self.wait(lambda: not old & set(self.server.workers) and
+                  len(self.server.workers) == 2)
+        self.assertEqual(reloads, [self.server])
+        self.assertTrue(self.pids(client) <= set(self.server.workers))
+
+    def test_reuse_port(self):
+        client = self.start(workers=2, reuse_port=True)
+        self.assertTrue(self.pids(client) <= set(self.server.workers))
+
+
+if __name__ == '__main__':
+    unittest.main()
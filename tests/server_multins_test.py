@@ -196,5 +196,33 @@ class TestServerMultiNS(unittest.TestCase):
         self.assertEqual(dispatcher.dispatch(REQ), MULTI_NS_RESP)
         self.assertEqual(dispatcher.dispatch(REQ1), MULTI_NS_RESP1)
 
+    def test_compiled(self):
+        responses = []
+        for compiled in (False, True):
+            dispatcher = SoapDispatcher(
+                name="MTClientWS",
+                location="http://localhost:8008/ws/MTClientWS",
+                action='http://localhost:8008/ws/MTClientWS',  # SOAPAction
+                namespace="http://external.mt.moboperator", prefix="external",
+                namespaces={
+                    'external': 'http://external.mt.moboperator',
+                    'model': 'http://model.common.mt.moboperator'
+                },
+                ns=True,
+                compiled=compiled)
+            dispatcher.register_function('activateSubscriptions',
+                self._multi_ns_func,
+                returns=self._multi_ns_func.returns,
+                args=self._multi_ns_func.args)
+            dispatcher.register_function('updateDeliveryStatus',
+                self._updateDeliveryStatus,
+                returns=self._updateDeliveryStatus.returns,
+                args=self._updateDeliveryStatus.args)
+            # the client prefixes (ext/mod or p727/p924) are kept:
+            responses.append([dispatcher.dispatch(xml) for xml in (REQ, REQ1, REQ, REQ1)])
+        self.assertEqual(responses[1], responses[0])
+        self.assertTrue(b'<p924:code>0</p924:code>' in responses[1][1])
+        self.assertEqual(len(dispatcher.templates), 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,9 +2,20 @@
 from __future__ import unicode_literals
 
 import datetime
+import gzip
+import io
+import threading
 import unittest
-from pysimplesoap.server import SoapDispatcher
+try:
+    from BaseHTTPServer import HTTPServer
+    from httplib import HTTPConnection
+except ImportError:
+    from http.server import HTTPServer
+    from http.client import HTTPConnection
+from pysimplesoap.server import SoapDispatcher, SOAPHandler, WSGISOAPHandler, route_request, \
+    route_stream, RequestBody, RequestEntityTooLarge
 from pysimplesoap.simplexml import Date, Decimal
+from pysimplesoap.transport import compress
 
 
 def adder(p, c, dt=None):
@@ -23,6 +34,17 @@ def echo(request):
     return request.value
 
 
+class LimitedSOAPHandler(SOAPHandler):
+    "Request size limited by the server (see test_http_post_charset)"
+
+    @property
+    def max_body_size(self):
+        return self.server.max_body_size
+
+    def log_message(self, *args):
+        pass
+
+
 class TestSoapDispatcher(unittest.TestCase):
     def eq(self, value, expectation, msg=None):
         if msg is not None:
@@ -96,5 +118,284 @@ class TestSoapDispatcher(unittest.TestCase):
     </soap:Envelope>"""
         self.eq(self.dispatcher.dispatch(xml), resp)
 
+    def simple_dispatcher(self):
+        "Return a dispatcher which wsdl can be generated"
+        dispatcher = SoapDispatcher(
+            name="PySimpleSoapSample",
+            location="http://localhost:8008/",
+            action='http://localhost:8008/',
+            namespace="http://example.com/pysimplesoapsamle/", prefix="ns0", ns=True)
+        dispatcher.register_function('Dummy', dummy, returns={'out0': str},
+                                     args={'in0': str})
+        return dispatcher
+
+    def test_documents(self):
+        dispatcher = self.simple_dispatcher()
+        wsdl = dispatcher.get_document()
+        self.assertTrue(dispatcher.get_document() is wsdl)
+        self.assertEqual(wsdl.content, dispatcher.wsdl())
+        request = dispatcher.get_document('Dummy')
+        self.assertEqual(request.content, dispatcher.help('Dummy')[0])
+        self.assertNotEqual(request.etag, dispatcher.get_document('Dummy', 'response').etag)
+        # registering a function invalidates the generated documents:
+        dispatcher.register_function('Dummy2', dummy, returns={'out0': str},
+                                     args={'in0': str})
+        self.assertFalse(dispatcher.get_document() is wsdl)
+        self.assertTrue(b'Dummy2' in dispatcher.get_document().content)
+
+    def test_document_response(self):
+        dispatcher = self.simple_dispatcher()
+        status, headers, content = dispatcher.document_response('')
+        headers = dict(headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(content, dispatcher.wsdl())
+        self.assertEqual(headers['Content-Length'], str(len(content)))
+        etag = headers['ETag']
+        self.assertEqual(dispatcher.document_response('', None, etag)[::2], (304, b''))
+        self.assertEqual(dispatcher.document_response('', None, 'W/' + etag)[0], 304)
+        self.assertEqual(dispatcher.document_response('', None, '"other"')[0], 200)
+        # compressed:
+        status, headers, content = dispatcher.document_response(
+            '', None, None, 'deflate, gzip;q=0.8')
+        headers = dict(headers)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertNotEqual(headers['ETag'], etag)
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(content)).read(),
+                         dispatcher.wsdl())
+        self.assertEqual(dispatcher.document_response('', None, None, 'gzip;q=0')[1],
+                         dispatcher.document_response('')[1])
+        # malformed quality values are not acceptable:
+        self.assertEqual(dispatcher.document_response('', None, None, 'gzip;q=x')[1:],
+                         dispatcher.document_response('')[1:])
+        self.assertEqual(dispatcher.document_response('Missing')[0], 404)
+        status, headers, content = dispatcher.document_response('Dummy', 'response')
+        self.assertTrue(b'DummyResponse' in content)
+
+    def test_wsgi_get(self):
+        dispatcher = self.simple_dispatcher()
+        handler = WSGISOAPHandler(dispatcher)
+        started = []
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/Dummy', 'QUERY_STRING': ''}
+        content = handler(environ, lambda status, headers: started.append((status, dict(headers))))
+        self.assertEqual(content, [dispatcher.help('Dummy')[0]])
+        status, headers = started[-1]
+        self.assertEqual(status, '200 OK')
+        environ['HTTP_IF_NONE_MATCH'] = headers['ETag']
+        self.assertEqual(handler(environ, lambda *args: started.append(args)), [b''])
+        self.assertEqual(started[-1][0], '304 Not Modified')
+    def test_route(self):
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+    <env:Envelope xmlns:env="http://www.w3.org/2003/05/soap-envelope"
+                  xmlns:ns0="http://example.com/pysimplesoapsamle/">
+       <env:Header><ns0:Token>1</ns0:Token></env:Header>
+       <env:Body><ns0:Dummy><in0>Hello</in0></ns0:Dummy></env:Body>
+    </env:Envelope>"""
+        declarations, soap_uri, name, prefix = route_request(
+            xml, "http://schemas.xmlsoap.org/soap/envelope/")
+        self.assertEqual(soap_uri, "http://www.w3.org/2003/05/soap-envelope")
+        self.assertEqual((name, prefix), ("Dummy", "ns0"))
+        self.assertEqual(declarations[0], ("xmlns:env", soap_uri))
+        # not found (let the regular parsing report the error):
+        self.assertEqual(route_request("<Envelope><Body/></Envelope>", soap_uri), None)
+        self.assertEqual(route_request("<a><b>", soap_uri), None)
+
+        dispatcher = self.simple_dispatcher()
+        response = dispatcher.dispatch(xml)
+        self.assertTrue(b'<out0>Hello</out0></DummyResponse>' in response)
+        self.assertTrue(b'<env:Body>' in response)
+        # unknown methods are rejected before parsing the whole request:
+        fault = {}
+        dispatcher.dispatch(xml.replace("ns0:Dummy>", "ns0:Missing>", 1), fault=fault)
+        self.assertEqual(fault['faultcode'], "Client.KeyError")
+        fault = {}
+        dispatcher.dispatch(xml.replace("</ns0:Dummy>", "</ns0:Dummy2>"), fault=fault)
+        self.assertEqual(fault['faultcode'], "VersionMismatch.ExpatError")
+
+    def test_compiled(self):
+        xml = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><Adder xmlns="http://example.com/sample.wsdl">
+         <p><a>1</a><b>2</b></p><dt>2010-07-24</dt><c><d>1.20</d><d>2.01</d></c>
+       </Adder></soap:Body></soap:Envelope>"""
+        calls = []
+        self.dispatcher.register_function(
+            'Adder', lambda **kwargs: calls.append(kwargs),
+            returns={}, args={'p': {'a': int, 'b': int}, 'dt': Date, 'c': [{'d': Decimal}]})
+        responses = []
+        for compiled in (False, True):
+            self.dispatcher.compiled = compiled
+            responses.append(self.dispatcher.dispatch(xml))
+        self.assertEqual(responses[0], responses[1])
+        self.assertEqual(calls[0], calls[1])
+        self.assertEqual(calls[1]['p'], {'a': 1, 'b': 2})
+        self.assertTrue(self.dispatcher.plans['Adder'] is
+                        self.dispatcher.get_unmarshall_plan('Adder'))
+
+    def test_compiled_response(self):
+        results = [{'out0': 'Hello & <bye>'}, {'out0': ''}, 'scalar', {},
+                   {'out0': [{'a': 1, 'b': datetime.date(2020, 1, 2)}, {'a': 2}]},
+                   {'out0': {'x': None, 'y': Decimal('1.50')}}]
+        dummy_xml = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><ns0:Dummy xmlns:ns0="http://example.com/pysimplesoapsamle/"><in0>1</in0>
+       </ns0:Dummy></soap:Body></soap:Envelope>"""
+        echo_xml = dummy_xml.replace("ns0:Dummy", "Echo").replace('xmlns:ns0', 'xmlns').replace(
+            "<in0>1</in0>", "<value>1</value>")
+        for result in results:
+            self.dispatcher.register_function('Dummy', lambda in0: result,
+                                              returns={'out0': str}, args={'in0': str})
+            responses = []
+            for compiled in (False, True, True):
+                self.dispatcher.compiled = compiled
+                responses.append((self.dispatcher.dispatch(dummy_xml),
+                                  self.dispatcher.dispatch(echo_xml)))
+            self.assertEqual(responses[1], responses[0])
+            self.assertEqual(responses[2], responses[0])
+        # writers compiled for the returns types (once per registration):
+        returns = {'out0': {'items': [{'a': int, 'b': datetime.date}], 'total': Decimal,
+                            'ok': bool}}
+        outputs = []
+        for result in ({'out0': {'ok': True, 'items': [{'b': datetime.date(2020, 1, 2),
+                                                        'a': 1}, {'a': 2}],
+                                 'total': Decimal('1.5'), 'extra': 'x'}},
+                       {'out0': {'items': 'not a list', 'total': None}}):
+            self.dispatcher.register_function('Dummy', lambda in0: result,
+                                              returns=returns, args={'in0': str})
+            responses = []
+            for compiled in (False, True, True):
+                self.dispatcher.compiled = compiled
+                responses.append(self.dispatcher.dispatch(dummy_xml))
+            self.assertEqual(responses[1], responses[0])
+            self.assertEqual(responses[2], responses[0])
+            template = self.dispatcher.get_response_template('Dummy')
+            self.assertTrue(template.plan.returns is returns)
+            self.assertTrue(self.dispatcher.get_response_template('Dummy') is template)
+            outputs.append(responses[0])
+        self.assertTrue(b"<a>1</a><b>2020-01-02</b></items><items><a>2</a>" in outputs[0]
+                        or b"<b>2020-01-02</b><a>1</a></items><items><a>2</a>" in outputs[0])
+
+    def test_request_body(self):
+        body = RequestBody(io.BytesIO(b"5;ext=1\r\nHello\r\n6\r\n World\r\n"
+                                      b"0\r\nTrailer: x\r\n\r\nnext"), chunked=True)
+        self.assertEqual(body.read(3), b"Hel")
+        self.assertEqual(body.read(), b"lo World")
+        self.assertEqual(body.read(), b"")
+        body = RequestBody(io.BytesIO(b"Hello World"), 5)
+        self.assertEqual((body.read(), body.read()), (b"Hello", b""))
+        body = RequestBody(io.BytesIO(b"Hello World"), None, max_size=5)
+        self.assertRaises(RequestEntityTooLarge, body.read)
+        body = RequestBody(io.BytesIO(b"6\r\nHello \r\n5\r\nWorld\r\n0\r\n\r\n"),
+                           chunked=True, max_size=8)
+        self.assertRaises(RequestEntityTooLarge, body.read)
+
+    def test_stream(self):
+        xml = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><ns0:Dummy xmlns:ns0="http://example.com/pysimplesoapsamle/"><in0>Hello</in0>
+       </ns0:Dummy></soap:Body></soap:Envelope>"""
+        routed, stream = route_stream(io.BytesIO(xml.encode("utf-8")),
+                                      "http://schemas.xmlsoap.org/soap/envelope/", size=16)
+        self.assertEqual(routed[2:], ("Dummy", "ns0"))
+        # the bytes read to route the request are read again:
+        self.assertEqual(stream.read(10), xml[:10].encode("utf-8"))
+        self.assertEqual(stream.read(), xml[10:].encode("utf-8"))
+
+        dispatcher = self.simple_dispatcher()
+        expected = dispatcher.dispatch(xml)
+        for compiled in (False, True):
+            dispatcher.compiled = compiled
+            chunked = b"".join([b"10\r\n" + xml.encode("utf-8")[i:i + 16] + b"\r\n"
+                                for i in range(0, len(xml) - len(xml) % 16, 16)])
+            rest = xml.encode("utf-8")[len(xml) - len(xml) % 16:]
+            chunked += ("%x\r\n" % len(rest)).encode("ascii") + rest + b"\r\n0\r\n\r\n"
+            body = RequestBody(io.BytesIO(chunked), chunked=True)
+            self.assertEqual(dispatcher.dispatch(body), expected)
+        # too large (raised, the handlers answer 413):
+        body = RequestBody(io.BytesIO(xml.encode("utf-8")), max_size=100)
+        self.assertRaises(RequestEntityTooLarge, dispatcher.dispatch, body)
+
+    def test_wsgi_post(self):
+        xml = ("""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><ns0:Dummy xmlns:ns0="http://example.com/pysimplesoapsamle/"><in0>Hello</in0>
+       </ns0:Dummy></soap:Body></soap:Envelope>""").encode("utf-8")
+        handler = WSGISOAPHandler(self.simple_dispatcher(), max_body_size=1000)
+        started = []
+        start_response = lambda status, headers: started.append(status)
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': str(len(xml)),
+                   'wsgi.input': io.BytesIO(xml)}
+        self.assertTrue(b'<out0>Hello</out0>' in handler(environ, start_response)[0])
+        self.assertEqual(started[-1], "200 OK")
+        # rejected before reading the body:
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': '1001',
+                   'wsgi.input': io.BytesIO(xml)}
+        handler(environ, start_response)
+        self.assertEqual(started[-1], "413 Request Entity Too Large")
+        self.assertEqual(environ['wsgi.input'].tell(), 0)
+        # no length (i.e. chunked request, decoded by the server):
+        environ = {'REQUEST_METHOD': 'POST', 'wsgi.input_terminated': True,
+                   'wsgi.input': io.BytesIO(xml * 5)}
+        handler(environ, start_response)
+        self.assertEqual(started[-1], "413 Request Entity Too Large")
+
+    def test_http_post_charset(self):
+        xml = ("""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><ns0:Dummy xmlns:ns0="http://example.com/pysimplesoapsamle/"><in0>%s</in0>
+       </ns0:Dummy></soap:Body></soap:Envelope>""" % ("Olá " * 300)).encode("latin-1")
+        server = HTTPServer(("127.0.0.1", 0), LimitedSOAPHandler)
+        server.dispatcher = self.simple_dispatcher()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        headers = {'Content-Type': 'text/xml; charset=iso-8859-1'}
+        for max_body_size, status in ((len(xml), 200), (len(xml) - 1, 413)):
+            server.max_body_size = max_body_size
+            for body, encoding in ((xml, None), (compress(xml), 'gzip')):
+                conn = HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+                # chunked (the size is checked while decoding):
+                conn.putrequest("POST", "/")
+                for name, value in headers.items():
+                    conn.putheader(name, value)
+                if encoding:
+                    conn.putheader("Content-Encoding", encoding)
+                conn.putheader("Transfer-Encoding", "chunked")
+                conn.endheaders()
+                conn.send(("%x\r\n" % len(body)).encode("ascii") + body + b"\r\n0\r\n\r\n")
+                response = conn.getresponse()
+                self.assertEqual(response.status, status)
+                if status == 200:
+                    self.assertTrue("<out0>Olá Olá ".encode("utf-8") in response.read())
+                conn.close()
+
+    def test_wsgi_compression(self):
+        xml = ("""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+       <soap:Body><ns0:Dummy xmlns:ns0="http://example.com/pysimplesoapsamle/"><in0>%s</in0>
+       </ns0:Dummy></soap:Body></soap:Envelope>""" % ("Hello " * 300)).encode("utf-8")
+        handler = WSGISOAPHandler(self.simple_dispatcher())
+        started = []
+        start_response = lambda status, headers: started.append((status, dict(headers)))
+        body = compress(xml)
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': str(len(body)),
+                   'HTTP_CONTENT_ENCODING': 'gzip', 'HTTP_ACCEPT_ENCODING': 'deflate, gzip',
+                   'wsgi.input': io.BytesIO(body)}
+        response = handler(environ, start_response)[0]
+        status, headers = started[-1]
+        self.assertEqual(headers['Content-Encoding'], "gzip")
+        self.assertEqual(headers['Content-Length'], str(len(response)))
+        self.assertTrue(b"<out0>Hello Hello " in gzip.GzipFile(fileobj=io.BytesIO(response)).read())
+        # the decompressed size is limited too:
+        handler.max_body_size = len(xml) - 1
+        environ['wsgi.input'] = io.BytesIO(body)
+        handler(environ, start_response)
+        self.assertEqual(started[-1][0], "413 Request Entity Too Large")
+        # small responses (or clients not accepting compression):
+        handler.max_body_size = len(xml)
+        handler.compress_size = None
+        environ['wsgi.input'] = io.BytesIO(body)
+        self.assertTrue(b"<out0>Hello " in handler(environ, start_response)[0])
+        self.assertFalse('Content-Encoding' in started[-1][1])
+        environ.update({'HTTP_CONTENT_ENCODING': 'br', 'wsgi.input': io.BytesIO(body)})
+        handler(environ, start_response)
+        self.assertEqual(started[-1][0], "415 Unsupported Media Type")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import types
+import unittest
+from pysimplesoap.client import SoapClient, SoapFault
+from pysimplesoap.simplexml import SimpleXMLElement
+from pysimplesoap.stream import StreamUnmarshaller
+from .dummy_utils import DummyHTTP, TEST_DIR
+
+ENVELOPE = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+<soap:Body>%s</soap:Body>
+</soap:Envelope>"""
+
+
+def materialize(value):
+    "Convert the lazy arrays (generators) to lists"
+    if isinstance(value, types.GeneratorType):
+        return [materialize(v) for v in value]
+    elif isinstance(value, dict):
+        return dict([(k, materialize(v)) for k, v in value.items()])
+    elif isinstance(value, tuple):
+        return tuple([materialize(v) for v in value])
+    return value
+
+
+class TestStreamUnmarshaller(unittest.TestCase):
+
+    def check(self, xml, types):
+        "Compare the streamed values with SimpleXMLElement.unmarshall"
+        envelope = (ENVELOPE % xml).encode("utf8")
+        body = SimpleXMLElement(envelope)('Body', ns="http://schemas.xmlsoap.org/soap/envelope/")
+        expected = body.children().unmarshall(types)
+        value = StreamUnmarshaller(envelope, types).unmarshall()
+        self.assertEqual(materialize(value), expected)
+
+    def test_simple(self):
+        self.check('<span><name>foo</name><value>3</value></span>',
+                   {'span': {'name': str, 'value': int}})
+        self.check('<span><name>foo</name><name>bar</name></span>',
+                   {'span': [{'name': str}]})
+        self.check('<results><foo>bar</foo><foo>baz</foo></results>',
+                   {'results': {'foo': [str]}})
+        self.check('<results><foo>bar</foo></results>',
+                   {'results': {'foo': [str]}})
+
+    def test_arrays(self):
+        xml = """
+        <activations>
+            <items>
+                <number>01234</number>
+                <status>1</status>
+                <properties><name>foo</name><value>3</value></properties>
+                <properties><name>bar</name><value>4</value></properties>
+            </items>
+            <items>
+                <number>04321</number>
+                <status>0</status>
+            </items>
+        </activations>
+        """
+        self.check(xml, {'activations': [
+                {'items': {
+                    'number': str,
+                    'status': int,
+                    'properties': ({'name': str, 'value': int}, )
+                }}
+            ]})
+
+    def test_lazy_array(self):
+        xml = """<response>
+            <total>2</total>
+            <item><id>1</id></item>
+            <item><id>2</id></item>
+            <next>3</next>
+        </response>"""
+        envelope = (ENVELOPE % xml).encode("utf8")
+        output = {'response': {'total': int, 'item': [{'id': int}], 'next': int}}
+        value = StreamUnmarshaller(envelope, output).unmarshall()['response']
+        self.assertEqual(value['total'], 2)
+        # values after the array are not available until it is consumed:
+        self.assertFalse('next' in value)
+        self.assertTrue(isinstance(value['item'], types.GeneratorType))
+        self.assertEqual([v['id'] for v in value['item']], [1, 2])
+        self.assertEqual(value['next'], 3)
+
+    def test_fault(self):
+        xml = """<soap:Fault>
+            <faultcode>soap:Server</faultcode>
+            <faultstring>Error!</faultstring>
+        </soap:Fault>"""
+        faults = []
+        envelope = (ENVELOPE % xml).encode("utf8")
+        unmarshaller = StreamUnmarshaller(envelope, {}, strict=False,
+                                          on_fault=faults.append)
+        unmarshaller.unmarshall()
+        self.assertEqual(len(faults), 1)
+        self.assertTrue(b"Error!" in faults[0])
+
+    def test_wsdl_call_stream(self):
+        client = SoapClient(wsdl="file:" + os.path.join(TEST_DIR, "data", "vco.wsdl"))
+        xml = ("<findResponse xmlns=\"http://webservice.vso.dunes.ch\"><findReturn>"
+               "<totalCount>2</totalCount><elements>%s</elements>"
+               "</findReturn></findResponse>")
+        items = "".join(["<item><type>t</type><id>%d</id><dunesUri>u</dunesUri></item>"
+                         % i for i in range(2)])
+        client.http = DummyHTTP((ENVELOPE % (xml % items)).encode("utf8"))
+        result = client.wsdl_call_stream("find", type="t", query="q")['findReturn']
+        self.assertEqual(result['totalCount'], 2)
+        records = result['elements']['item']
+        self.assertTrue(isinstance(records, types.GeneratorType))
+        self.assertEqual([r['id'] for r in records], ['0', '1'])
+
+        client.http = DummyHTTP((ENVELOPE % """<soap:Fault>
+            <faultcode>soap:Server</faultcode><faultstring>Error!</faultstring>
+            </soap:Fault>""").encode("utf8"))
+        self.assertRaises(SoapFault, client.wsdl_call_stream, "find", type="t", query="q")
+
+
+if __name__ == '__main__':
+    unittest.main()
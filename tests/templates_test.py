@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import unittest
+from decimal import Decimal
+from pysimplesoap.client import SoapClient
+from pysimplesoap.helpers import Struct
+from .dummy_utils import DummyHTTP
+
+RESPONSE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+<soap:Body><AdderResponse xmlns="urn:sample"><AddResult>3</AddResult></AdderResponse></soap:Body>
+</soap:Envelope>"""
+
+
+class TestEnvelopeTemplates(unittest.TestCase):
+
+    def requests(self, method, **client_kwargs):
+        "Return the xml requests serialized using the DOM and the template"
+        def call(compiled, *args, **kwargs):
+            client = SoapClient(location="http://localhost/", action="urn:sample/",
+                                namespace="urn:sample", compiled=compiled,
+                                **client_kwargs)
+            client.http = DummyHTTP(RESPONSE)
+            response = client.call(method, *args, **kwargs)
+            return client, client.xml_request, response
+        return call
+
+    def check(self, call, *args, **kwargs):
+        client1, dom_xml, dom_response = call(False, *args, **kwargs)
+        client2, xml, response = call(True, *args, **kwargs)
+        self.assertEqual(xml, dom_xml)
+        self.assertEqual(int(response.AddResult), int(dom_response.AddResult))
+        return client2
+
+    def test_simple_types(self):
+        call = self.requests('Adder')
+        self.check(call, a=1, b=2.5, c=Decimal("1.01"), d=datetime.date(2015, 1, 2),
+                   e=True, f="<escaped> & \"quoted\"", g=None, h="")
+
+    def test_complex_types(self):
+        call = self.requests('Adder')
+        self.check(call, p={'a': 1, 'b': {'c': None}},
+                   c=[{'d': Decimal("1.2")}, {'d': Decimal("2.1")}],
+                   j=[{'x': 1, 'y': 2}, {'x': 3, 'y': 4}])
+
+    def test_namespaces(self):
+        value = Struct()
+        value['a'] = 1
+        value['b'] = {'c': 2}
+        value.namespaces[None] = "urn:root"
+        value.namespaces['a'] = "urn:child"
+        for client_kwargs in ({'ns': False}, {'ns': 'ns1'}, {'soap_ns': 'soapenv', 'ns': 'p'},
+                              {'soap_server': 'jetty'}):
+            call = self.requests('Adder', **client_kwargs)
+            self.check(call, p=value)
+            self.check(call)
+
+    def test_template_cache(self):
+        call = self.requests('Adder')
+        client = self.check(call, a=1)
+        template = client.get_template('Adder')
+        self.assertTrue(template is client.get_template('Adder'))
+        self.assertFalse(template is client.get_template('Dummy'))
+
+    def test_fallback(self):
+        # tuples are not supported by the writer, the DOM is used instead
+        call = self.requests('Adder')
+        self.check(call, t=(('a', 1), ('b', 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
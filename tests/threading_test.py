@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+import threading
+import time
+import unittest
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = None
+
+from pysimplesoap.client import SoapClient, SoapFault
+from pysimplesoap.server import SoapDispatcher, SOAPHandler
+from pysimplesoap.transport import set_http_wrapper
+from .transport_test import ThreadingServer
+
+
+def adder(a, b):
+    "Add two values"
+    time.sleep(0.001)
+    if a < 0:
+        raise ValueError("negative")
+    return {'ab': a + b}
+
+
+def echo(text):
+    "Return the text"
+    return {'text': text}
+
+
+class SlowTransport(object):
+    """Not thread safe transport (checks it is not used concurrently)"""
+
+    def __init__(self, xml_response):
+        self.xml_response = xml_response
+        self.running = 0
+        self.concurrency = 0
+
+    def request(self, location, method, body, headers):
+        self.running += 1
+        self.concurrency = max(self.concurrency, self.running)
+        time.sleep(0.005)
+        self.running -= 1
+        return {}, self.xml_response
+
+
+class FailingTransport(object):
+    """Return the response, fail (socket error) from the request number fail"""
+
+    def __init__(self, xml_response, fail):
+        self.xml_response = xml_response
+        self.fail = fail
+        self.requests = 0
+
+    def request(self, location, method, body, headers):
+        self.requests += 1
+        if self.requests >= self.fail:
+            raise IOError("connection refused")
+        return {}, self.xml_response
+
+
+class SlowFailingTransport(object):
+    """Fail (socket error) at once for the value given, slow responses otherwise"""
+
+    def __init__(self, xml_response, value):
+        self.xml_response = xml_response
+        self.value = value
+
+    def supports_feature(self, name):
+        return name == 'threadsafe'
+
+    def request(self, location, method, body, headers):
+        if re.search(br"a>%d</" % self.value, body):
+            raise IOError("connection reset")
+        time.sleep(0.05)
+        return {}, self.xml_response
+
+
+class DeferredCheck(object):
+    """Plugin returning its checks as futures (see call_many)"""
+
+    def preprocess(self, *args):
+        pass
+
+    def postprocess(self, *args):
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+class TestThreadSafeClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(("127.0.0.1", 0), SOAPHandler)
+        self.location = location = "http://127.0.0.1:%d/" % self.server.server_address[1]
+        dispatcher = self.server.dispatcher = SoapDispatcher(
+            "Sample", location=location, action=location,
+            namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True)
+        dispatcher.register_function('Adder', adder, returns={'ab': int},
+                                     args={'a': int, 'b': int})
+        dispatcher.register_function('Echo', echo, returns={'text': str},
+                                     args={'text': str})
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        set_http_wrapper()
+
+    def run_threads(self, target, count=8):
+        errors = []
+
+        def run(i):
+            try:
+                target(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i, )) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_shared_client(self):
+        set_http_wrapper('urllib2')
+        for compiled in (False, True):
+            client = SoapClient(wsdl=self.location, compiled=compiled)
+            results = {}
+
+            def calls(i):
+                for j in range(10):
+                    if (i + j) % 2:
+                        result = client.Adder(a=i, b=j)['ab']
+                        expected = i + j
+                        tag = b"Adder>"
+                    else:
+                        result = client.Echo(text="%s-%s" % (i, j))['text']
+                        expected = "%s-%s" % (i, j)
+                        tag = b"Echo>"
+                    # the call state is the one of this thread:
+                    self.assertEqual(result, expected)
+                    self.assertTrue(tag in client.xml_request)
+                    self.assertTrue(client.action.endswith(tag[:-1].decode("ascii")))
+                results[i] = True
+
+            self.run_threads(calls)
+            self.assertEqual(len(results), 8)
+
+    def test_configuration(self):
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0")
+        client.namespace = "urn:other"
+
+        def check(i):
+            # values set before the calls are shared by all the threads:
+            self.assertEqual(client.namespace, "urn:other")
+            self.assertEqual(client.xml_request, '')
+
+        self.run_threads(check)
+        self.assertEqual(client.response, None)
+
+    def test_configuration_change(self):
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0")
+        called, changed = threading.Event(), threading.Event()
+        values = []
+
+        def call():
+            client.Echo(text="hello")
+            values.append(client.xml_response)
+            called.set()
+            changed.wait(10)
+            # the value set for the client replaces the one of the last call:
+            values.append(client.xml_response)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        called.wait(10)
+        client.xml_response = ''
+        changed.set()
+        thread.join()
+        self.assertTrue(b"hello" in values[0])
+        self.assertEqual(values[1], '')
+
+    def test_not_thread_safe_transport(self):
+        client = SoapClient(wsdl=self.location)
+        client.http = SlowTransport(b"""<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns0:AdderResponse xmlns:ns0="http://example.com/sample.wsdl"><ab>3</ab></ns0:AdderResponse>
+</soap:Body></soap:Envelope>""")
+
+        def calls(i):
+            for j in range(3):
+                self.assertEqual(client.Adder(a=1, b=2)['ab'], 3)
+
+        self.run_threads(calls)
+        self.assertEqual(client.http.concurrency, 1)
+
+    def test_call_many(self):
+        set_http_wrapper('pooled')
+        client = SoapClient(wsdl=self.location)
+        calls = [{'a': i, 'b': 1} for i in range(-2, 30)]
+        progress = []
+        results = list(client.call_many('Adder', calls, concurrency=4,
+                                        progress=lambda *args: progress.append(args)))
+        self.assertEqual(len(results), 32)
+        self.assertTrue(isinstance(results[0], SoapFault))
+        self.assertTrue(isinstance(results[1], SoapFault))
+        self.assertEqual([r['ab'] for r in results[2:]], list(range(1, 31)))
+        self.assertEqual(progress[-1], (32, 32))
+        # the caller arguments are not changed:
+        self.assertEqual(calls[2], {'a': 0, 'b': 1})
+        # in completion order, with the input index:
+        results = client.call_many('Echo', [{'text': "%s" % i} for i in range(20)],
+                                   concurrency=3, ordered=False)
+        self.assertEqual(sorted((i, r['text']) for i, r in results),
+                         [(i, "%s" % i) for i in range(20)])
+
+    def test_call_many_back_pressure(self):
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0")
+        pulled = []
+
+        def calls():
+            for i in range(100):
+                pulled.append(i)
+                yield {'a': i, 'b': i}
+
+        results = client.call_many('Adder', calls(), concurrency=2, max_pending=4)
+        self.assertEqual(int(next(results).ab), 0)
+        time.sleep(0.05)
+        # the calls are not consumed ahead of the results:
+        self.assertTrue(len(pulled) <= 6)
+        self.assertEqual([int(r.ab) for r in results], [i * 2 for i in range(1, 100)])
+        # sequential (no threads):
+        results = client.call_many('Adder', [{'a': 1, 'b': 2}], concurrency=1)
+        self.assertEqual([int(r.ab) for r in results], [3])
+
+    @unittest.skipIf(Future is None, "concurrent.futures is not available")
+    def test_call_many_deferred_checks(self):
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0",
+                            plugins=[DeferredCheck()])
+        client.http = FailingTransport(b"""<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns0:AdderResponse xmlns:ns0="http://example.com/sample.wsdl"><ab>3</ab></ns0:AdderResponse>
+</soap:Body></soap:Envelope>""", fail=2)
+        calls = [{'a': 1, 'b': 2}] * 3
+        # sequential: the next call is not sent before the result is consumed
+        results = client.call_many('Adder', calls, concurrency=1)
+        self.assertEqual(int(next(results).ab), 3)
+        self.assertEqual(client.http.requests, 1)
+        self.assertRaises(IOError, next, results)
+        # one call ahead: the checked result is yielded before the error
+        client.http.requests = 0
+        results = client.call_many('Adder', calls, concurrency=1, max_pending=2)
+        self.assertEqual(int(next(results).ab), 3)
+        self.assertEqual(client.http.requests, 2)
+        self.assertRaises(IOError, next, results)
+
+    def test_call_many_error_order(self):
+        client = SoapClient(location=self.location, action=self.location,
+                            namespace="http://example.com/sample.wsdl", ns="ns0")
+        client.http = SlowFailingTransport(b"""<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns0:AdderResponse xmlns:ns0="http://example.com/sample.wsdl"><ab>3</ab></ns0:AdderResponse>
+</soap:Body></soap:Envelope>""", 3)
+        # the error (first to complete) is raised after the previous results:
+        results = client.call_many('Adder', [{'a': i, 'b': 0} for i in range(8)],
+                                   concurrency=4)
+        self.assertEqual([int(next(results).ab) for i in range(3)], [3] * 3)
+        self.assertRaises(IOError, next, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import threading
+import time
+import unittest
+import zlib
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urllib2 import HTTPError
+    from httplib import HTTPException
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.error import HTTPError
+    from http.client import HTTPException
+
+from pysimplesoap.client import SoapClient
+from pysimplesoap.server import SoapDispatcher, SOAPHandler
+from pysimplesoap.transport import get_http_wrapper, set_http_wrapper, PooledTransport, \
+    urllib2Transport, ConnectionPool, compress, decompress, DecompressingStream
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.clients.append(self.client_address)
+        if self.path in ('/partial', '/drop'):
+            # close the connection after (or without) a partial response
+            if self.path == '/partial':
+                self.wfile.write(b"HTTP/1.1 2")
+            self.close_connection = True
+            return
+        if self.path == '/missing':
+            status = 404
+        elif self.path == '/fault':
+            status = 500
+        else:
+            status = 200
+        if self.path == '/slow':
+            time.sleep(0.05)
+        content = b"<echo>" + body + b"</echo>"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(content)))
+        if self.path == '/close':
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestPooledTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(("127.0.0.1", 0), KeepAliveHandler)
+        self.server.clients = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        # each test uses its own pools (different port):
+        self.timeout = 10
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, path, body=b"<a/>", http=None):
+        http = http or PooledTransport(timeout=self.timeout)
+        return http.request(self.url + path, "POST", body, {"Content-Type": "text/xml"})
+
+    def test_keep_alive(self):
+        self.assertTrue(get_http_wrapper(features=['keepalive']) is PooledTransport)
+        for i in range(3):
+            response, content = self.request("/", b"<a>%d</a>" % i)
+            self.assertEqual(content, b"<echo><a>%d</a></echo>" % i)
+            self.assertEqual(response['status'], "200")
+            self.assertEqual(response['content-type'], "text/xml")
+        # the same connection (client port) is used by all the instances:
+        self.assertEqual(len(set(self.server.clients)), 1)
+
+    def test_stream(self):
+        response, f = PooledTransport(timeout=self.timeout).request_stream(
+            self.url + "/", "POST", b"<a/>", {})
+        self.assertEqual(f.read(3), b"<ec")
+        self.assertEqual(f.read(), b"ho><a/></echo>")
+        self.request("/")
+        self.assertEqual(len(set(self.server.clients)), 1)
+
+    def test_errors(self):
+        response, content = self.request("/fault")
+        self.assertEqual(response['status'], "500")
+        self.assertRaises(HTTPError, self.request, "/missing")
+        self.request("/")
+        self.assertEqual(len(set(self.server.clients)), 1)
+
+    def test_stream_fault(self):
+        for http in (PooledTransport(timeout=self.timeout), urllib2Transport()):
+            response, f = http.request_stream(self.url + "/fault", "POST", b"<a/>",
+                                              {"Content-Type": "text/xml"})
+            self.assertEqual(f.read(), b"<echo><a/></echo>")
+            f.close()
+            self.assertRaises(HTTPError, http.request_stream, self.url + "/missing",
+                              "POST", b"<a/>", {"Content-Type": "text/xml"})
+
+    def test_closed_connections(self):
+        # closed by the server (after the response):
+        self.request("/close")
+        self.request("/")
+        self.assertEqual(len(set(self.server.clients)), 2)
+        # idle connection closed by the server, detected or retried:
+        http = PooledTransport(timeout=self.timeout)
+        pool = http.get_pool("http", self.url[7:])
+        conn, used = pool.idle[-1]
+        conn.sock.shutdown(2)
+        self.request("/", http=http)
+        self.assertEqual(len(set(self.server.clients)), 3)
+        self.assertEqual(pool.count, 1)
+
+    def test_retry(self):
+        http = PooledTransport(timeout=self.timeout)
+        self.request("/", http=http)
+        # a response began: the request is not sent again
+        self.assertRaises(HTTPException, self.request, "/partial", http=http)
+        self.assertEqual(len(self.server.clients), 2)
+        # closed without response (i.e. idle connection closed by the server
+        # while sending): retried once with a new connection
+        self.request("/", http=http)
+        self.assertRaises(HTTPException, self.request, "/drop", http=http)
+        self.assertEqual(len(self.server.clients), 5)
+
+    def test_idle_timeout(self):
+        http = PooledTransport(timeout=self.timeout)
+        pool = http.get_pool("http", self.url[7:])
+        pool.idle_timeout = 0.01
+        self.request("/")
+        time.sleep(0.02)
+        self.request("/")
+        self.assertEqual(len(set(self.server.clients)), 2)
+        self.assertEqual(pool.count, 1)
+
+    def test_pool_size(self):
+        http = PooledTransport(timeout=self.timeout)
+        pool = http.get_pool("http", self.url[7:])
+        pool.maxsize = 2
+        threads = [threading.Thread(target=self.request, args=("/slow", ))
+                   for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.clients), 6)
+        self.assertTrue(len(set(self.server.clients)) <= 2)
+        self.assertEqual(pool.count, len(pool.idle))
+
+    def test_pool_exhausted(self):
+        pool = ConnectionPool("http", self.url[7:], timeout=0.05, maxsize=1)
+        conn, reused = pool.get()
+        self.assertRaises(RuntimeError, pool.get)
+        pool.discard(conn)
+        conn, reused = pool.get()
+        self.assertEqual(pool.count, 1)
+
+
+class RecordingSOAPHandler(SOAPHandler):
+    "Keep the request and response headers (to check the content encodings)"
+
+    def do_POST(self):
+        self.server.requests.append(dict(self.headers.items()))
+        SOAPHandler.do_POST(self)
+
+    def send_header(self, keyword, value):
+        if keyword == 'Content-Encoding':
+            self.server.encodings.append(value)
+        SOAPHandler.send_header(self, keyword, value)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_compress(self):
+        data = b"<a>" + b"<b>compressible</b>" * 100 + b"</a>"
+        for encoding in ('gzip', 'deflate'):
+            compressed = compress(data, encoding)
+            self.assertTrue(len(compressed) < len(data) / 10)
+            self.assertEqual(decompress(compressed, encoding), data)
+        self.assertEqual(compress(data, 'gzip')[:2], b"\x1f\x8b")
+        # raw deflate (without zlib header) is also accepted:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(data) + compressor.flush()
+        self.assertEqual(decompress(raw, 'deflate'), data)
+        self.assertRaises(ValueError, DecompressingStream, io.BytesIO(raw), 'br')
+
+    def test_stream(self):
+        data = b"".join([b"<b>%d</b>" % i for i in range(1000)])
+        stream = DecompressingStream(io.BytesIO(compress(data)), 'gzip', chunk_size=64)
+        self.assertEqual(stream.read(10), data[:10])
+        self.assertEqual(stream.read(), data[10:])
+        self.assertEqual(stream.read(), b"")
+
+    def test_client_server(self):
+        dispatcher = SoapDispatcher(
+            "Sample", namespace="http://example.com/sample.wsdl", prefix="ns0", ns=True)
+        dispatcher.register_function('Echo', lambda value: {'value': value},
+                                     returns={'value': str}, args={'value': str})
+        server = HTTPServer(("127.0.0.1", 0), RecordingSOAPHandler)
+        server.dispatcher = dispatcher
+        server.requests, server.encodings = [], []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        location = "http://127.0.0.1:%d/" % server.server_address[1]
+        try:
+            for wrapper in ('urllib2', 'pooled'):
+                set_http_wrapper(wrapper)
+                client = SoapClient(location=location, action=location, ns="ns0",
+                                    namespace="http://example.com/sample.wsdl",
+                                    compress=True, accept_encoding=True)
+                value = "compressible " * 200
+                self.assertEqual(str(client.Echo(value=value).value), value)
+                self.assertEqual(server.requests[-1]['Content-Encoding'], "gzip")
+                self.assertEqual(server.encodings[-1], "gzip")
+                # small responses are not compressed:
+                self.assertEqual(str(client.Echo(value="x").value), "x")
+                self.assertEqual(len(server.encodings), len(server.requests) - 1)
+                server.requests, server.encodings = [], []
+        finally:
+            set_http_wrapper()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import datetime
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from pysimplesoap import xmlsec
+from pysimplesoap.client import SoapClient
+from pysimplesoap.crypto import get_crypto_provider, set_crypto_provider, bytes_to_int, \
+    _crypto_providers
+from pysimplesoap.simplexml import SimpleXMLElement
+from pysimplesoap.wsse import BinaryTokenSignature
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+except ImportError:
+    x509 = None
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+SOAP_URI = "http://schemas.xmlsoap.org/soap/envelope/"
+
+REQUEST = ('<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+           '<soap:Header/><soap:Body><ns0:Echo xmlns:ns0="urn:echo">'
+           '<value>1 &lt; 2</value></ns0:Echo></soap:Body></soap:Envelope>')
+
+ECHO_RESPONSE = ('<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+                 '<soap:Header/><soap:Body><ns0:EchoResponse xmlns:ns0="urn:echo">'
+                 '<value>%s</value></ns0:EchoResponse></soap:Body></soap:Envelope>')
+
+
+class SignedTransport(object):
+    """Return the response (already signed) for the value of the request"""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def request(self, location, method, body, headers):
+        value = re.search(br"value>(\d+)</", body).group(1)
+        return {}, self.responses[int(value)]
+
+
+def create_key(key_type):
+    if key_type == 'ec':
+        return ec.generate_private_key(ec.SECP256R1(), default_backend())
+    return rsa.generate_private_key(65537, 2048, default_backend())
+
+
+def create_cert(key, issuer_key=None, name="test"):
+    "Return a certificate (PEM) for the key, signed by the issuer key"
+    subject = x509.Name([x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, name)])
+    issuer = x509.Name([x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, "ca")])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(subject).issuer_name(
+        issuer if issuer_key else subject).public_key(key.public_key()).serial_number(
+        1234).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)).sign(
+        issuer_key or key, hashes.SHA256(), default_backend())
+    return cert.public_bytes(serialization.Encoding.PEM).decode("ascii")
+
+
+def pem(key, password=None):
+    encryption = serialization.BestAvailableEncryption(password) if password else \
+        serialization.NoEncryption()
+    return key.private_bytes(serialization.Encoding.PEM,
+                             serialization.PrivateFormat.PKCS8, encryption).decode("ascii")
+
+
+class TestTemplates(unittest.TestCase):
+
+    def test_algorithms(self):
+        self.assertEqual(xmlsec.algorithm_name(
+            "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256"), 'ecdsa-sha256')
+        self.assertEqual(xmlsec.algorithm_name(
+            "http://www.w3.org/2001/04/xmlenc#sha512", xmlsec.DIGEST_ALGORITHMS), 'sha512')
+        self.assertEqual(xmlsec.algorithm_name("urn:unknown"), None)
+        signed_info = xmlsec.SIGN_REF_TMPL % {
+            'ref_uri': "#id", 'digest_value': "",
+            'signature_method': xmlsec.SIGNATURE_ALGORITHMS['rsa-sha512'][0],
+            'digest_method': xmlsec.DIGEST_ALGORITHMS['sha512']}
+        self.assertTrue('Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha512"'
+                        in signed_info)
+
+
+@unittest.skipIf(x509 is None, "cryptography is not installed")
+class TestSignature(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ca_key = create_key('rsa')
+        cls.keys = {'rsa': create_key('rsa'), 'ec': create_key('ec')}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        xmlsec.clear_caches()
+        # ECDSA keys are not supported by M2Crypto (the default if installed)
+        set_crypto_provider('cryptography')
+
+    def tearDown(self):
+        set_crypto_provider()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w") as f:
+            f.write(content)
+        return filename
+
+    def test_sign_verify(self):
+        for algorithm, (uri, key_type, hash_name) in xmlsec.SIGNATURE_ALGORITHMS.items():
+            key = self.keys[key_type]
+            public_key = xmlsec.x509_extract_public_key(create_cert(key))
+            xml = '<Object xmlns="http://www.w3.org/2000/09/xmldsig#" Id="object">data</Object>'
+            vars = xmlsec.sign(xml, "#object", pem(key), algorithm=algorithm)
+            self.assertTrue(uri in vars['signed_info'])
+            self.assertTrue(xmlsec.DIGEST_ALGORITHMS[hash_name] in vars['signed_info'])
+            self.assertTrue(xmlsec.verify(vars['signed_info'], vars['signature_value'],
+                                          public_key, algorithm=algorithm))
+            # tampered signed info:
+            self.assertFalse(xmlsec.verify(vars['signed_info'].replace("#object", "#other"),
+                                           vars['signature_value'], public_key,
+                                           algorithm=algorithm))
+            # the digest of the node is the digest of the document:
+            node = SimpleXMLElement(xml)
+            digest_value = xmlsec.canonical_digest(node, algorithm=hash_name)
+            self.assertTrue(digest_value in vars['signed_info'])
+            node_vars = xmlsec.sign(node, "#object", pem(key), algorithm=algorithm)
+            self.assertTrue(digest_value in node_vars['signed_info'])
+            self.assertFalse('ref_xml' in node_vars)
+
+    def test_rsa_sha1(self):
+        key = self.keys['rsa']
+        filename = self.write("key.pem", pem(key, b"secret"))
+        vars = xmlsec.rsa_sign("<a>data</a>", "", filename, "secret",
+                               sign_template=xmlsec.SIGN_ENV_TMPL, c14n_exc=False)
+        self.assertTrue(xmlsec.DIGEST_ALGORITHMS['sha1'] in vars['signed_info'])
+        public_key = self.write("key.pub", xmlsec.x509_extract_rsa_public_key(
+            create_cert(key)).decode("ascii"))
+        self.assertTrue(xmlsec.rsa_verify(vars['signed_info'], vars['signature_value'],
+                                          public_key, c14n_exc=False))
+        # ECDSA keys can not be used for RSA signatures:
+        self.assertRaises(Exception, xmlsec.rsa_sign, "<a/>", "", pem(self.keys['ec']))
+
+    def test_key_info(self):
+        key = self.keys['rsa']
+        cert = create_cert(key, self.ca_key)
+        vars = xmlsec.sign("<a/>", "", pem(key), cert=cert,
+                           key_info_template=xmlsec.KEY_INFO_RSA_TMPL + xmlsec.KEY_INFO_X509_TMPL)
+        info = SimpleXMLElement("<i>%s</i>" % vars['key_info'])
+        numbers = key.public_key().public_numbers()
+        modulus = bytes_to_int(base64.b64decode(str(info("Modulus"))))
+        self.assertEqual((modulus, str(info("Exponent"))), (numbers.n, "AQAB"))
+        self.assertEqual((str(info("X509IssuerName")), str(info("X509SerialNumber"))),
+                         ("CN=ca", "1234"))
+
+        # EC keys: no RSAKeyValue (unless it is requested explicitly)
+        vars = xmlsec.sign("<a/>", "", pem(self.keys['ec']), algorithm='ecdsa-sha256')
+        self.assertEqual(vars['key_info'], "")
+        self.assertRaises(ValueError, xmlsec.sign, "<a/>", "", pem(self.keys['ec']),
+                          key_info_template=xmlsec.KEY_INFO_RSA_TMPL,
+                          algorithm='ecdsa-sha256')
+
+    def test_load_once(self):
+        filename = self.write("key.pem", pem(self.keys['ec'], b"secret"))
+        key = xmlsec.load_private_key(filename, "secret")
+        self.assertTrue(xmlsec.load_private_key(filename, "secret") is key)
+        self.assertRaises(ValueError, xmlsec.load_private_key, filename, "wrong")
+
+    def test_x509_verify(self):
+        ca = create_cert(self.ca_key, name="ca")
+        for key in self.keys.values():
+            cert = create_cert(key, self.ca_key)
+            self.assertTrue(xmlsec.x509_verify(ca, cert))
+            self.assertFalse(xmlsec.x509_verify(create_cert(key), cert))
+        self.assertEqual(len(xmlsec.verify_cache), 4)
+
+    def test_wsse(self):
+        for algorithm, key_type in (('ecdsa-sha256', 'ec'), ('rsa-sha512', 'rsa')):
+            key = self.keys[key_type]
+            cacert = self.write("ca.crt", create_cert(self.ca_key, name="ca"))
+            plugin = BinaryTokenSignature(
+                self.write("cert.crt", create_cert(key, self.ca_key)),
+                self.write("key.pem", pem(key)), cacert=cacert, algorithm=algorithm)
+            request = SimpleXMLElement(REQUEST)
+            plugin.preprocess(None, request, "Echo", (), {}, {}, SOAP_URI)
+            # the signed message is verified (as a response):
+            response = SimpleXMLElement(request.as_xml())
+            plugin.postprocess(None, response, "Echo", (), {}, {}, SOAP_URI)
+            response = SimpleXMLElement(request.as_xml().replace(b"1 &lt; 2", b"2 &lt; 1"))
+            self.assertRaises(RuntimeError, plugin.postprocess,
+                              None, response, "Echo", (), {}, {}, SOAP_URI)
+            plugin.algorithms = ('rsa-sha256', )
+            response = SimpleXMLElement(request.as_xml())
+            self.assertRaises(RuntimeError, plugin.postprocess,
+                              None, response, "Echo", (), {}, {}, SOAP_URI)
+
+    def test_wsse_rsa_only_provider(self):
+        class RSAOnlyProvider(_crypto_providers['cryptography']):
+            "RSA keys only (as M2Crypto, get_rsa fails with other keys)"
+            name = 'rsa-only'
+            key_types = ('rsa', )
+
+            def public_key(self, cert):
+                key = cert.public_key()
+                if not isinstance(key, rsa.RSAPublicKey):
+                    raise ValueError("not a RSA key")
+                return key
+
+        _crypto_providers['rsa-only'] = RSAOnlyProvider
+        self.addCleanup(_crypto_providers.pop, 'rsa-only')
+        cacert = self.write("ca.crt", create_cert(self.ca_key, name="ca"))
+        responses = {}
+        for algorithm, key_type in (('ecdsa-sha256', 'ec'), ('rsa-sha256', 'rsa')):
+            key = self.keys[key_type]
+            plugin = BinaryTokenSignature(
+                self.write("cert.crt", create_cert(key, self.ca_key)),
+                self.write("key.pem", pem(key)), cacert=cacert, algorithm=algorithm)
+            request = SimpleXMLElement(REQUEST)
+            plugin.preprocess(None, request, "Echo", (), {}, {}, SOAP_URI)
+            responses[algorithm] = request.as_xml()
+        set_crypto_provider('rsa-only')
+        plugin.postprocess(None, SimpleXMLElement(responses['rsa-sha256']),
+                           "Echo", (), {}, {}, SOAP_URI)
+        # provider errors are verification errors:
+        ecdsa = responses['ecdsa-sha256']
+        rsa_uri = xmlsec.SIGNATURE_ALGORITHMS['rsa-sha256'][0].encode("ascii")
+        for response in (ecdsa, ecdsa.replace(
+                xmlsec.SIGNATURE_ALGORITHMS['ecdsa-sha256'][0].encode("ascii"), rsa_uri)):
+            self.assertRaises(RuntimeError, plugin.postprocess,
+                              None, SimpleXMLElement(response), "Echo", (), {}, {}, SOAP_URI)
+
+    @unittest.skipIf(ProcessPoolExecutor is None, "concurrent.futures is not available")
+    def test_call_many(self):
+        key = self.keys['ec']
+        executor = ProcessPoolExecutor(2)
+        self.addCleanup(executor.shutdown)
+        plugin = BinaryTokenSignature(
+            self.write("cert.crt", create_cert(key, self.ca_key)),
+            self.write("key.pem", pem(key)), algorithm='ecdsa-sha256',
+            cacert=self.write("ca.crt", create_cert(self.ca_key, name="ca")),
+            executor=executor)
+        responses = []
+        for i in range(8):
+            response = SimpleXMLElement(ECHO_RESPONSE % i)
+            plugin.preprocess(None, response, "Echo", (), {}, {}, SOAP_URI)
+            responses.append(response.as_xml())
+        # tampered response (the signature verification fails):
+        responses[5] = responses[5].replace(b"<value>5<", b"<value>6<")
+        client = SoapClient(location="http://localhost/", action="http://localhost/",
+                            namespace="urn:echo", ns="ns0", plugins=[plugin])
+        client.http = SignedTransport(responses)
+        self.assertEqual(int(client.Echo(value=1).value), 1)
+        self.assertRaises(RuntimeError, client.Echo, value=5)
+        for concurrency in (1, 3):
+            results = client.call_many('Echo', [{'value': i} for i in range(8)],
+                                       concurrency=concurrency)
+            # the results are verified and returned in order, until the error:
+            self.assertEqual([int(next(results).value) for i in range(5)], list(range(5)))
+            self.assertRaises(RuntimeError, next, results)
+        results = client.call_many('Echo', [{'value': i} for i in range(5)], ordered=False)
+        self.assertEqual(sorted((i, int(r.value)) for i, r in results),
+                         [(i, i) for i in range(5)])
+
+    def test_provider(self):
+        self.assertEqual(get_crypto_provider().name, 'cryptography')
+        set_crypto_provider()
+        # M2Crypto is preferred (compatibility of the legacy helpers):
+        expected = 'm2crypto' if 'm2crypto' in _crypto_providers else 'cryptography'
+        self.assertEqual(get_crypto_provider().name, expected)
+        self.assertRaises(RuntimeError, get_crypto_provider, 'missing')
+
+
+if __name__ == '__main__':
+    unittest.main()